@@ -0,0 +1,93 @@
+# Loop acceleration: replaces simple counting loops by a single instruction
+#
+# A loop is accelerated if its body only consists of assignments of the form
+# var := var + c or var := var - c (with a constant c) and its condition compares a
+# variable with a bound that doesn't change in the loop, e.g.
+#
+#     WHILE a < x DO
+#         a := a + 1
+#         s := s + 2
+#     END WHILE
+#
+# Such a loop is replaced by an ACCELERATED_LOOP instruction with a LoopSummary,
+# which computes the number of iterations and the values after the loop in closed
+# form. The interpreter, the unroller and the SMT encoding then need a single step
+# for the whole loop, no matter how often it runs. Outer loops that contain an
+# accelerated loop are not accelerated themselves.
+
+from collections.abc import Sequence
+
+from while_parsing import Instruction, InstructionType, Operator, LoopSummary, OPERATORS
+import optimizer
+
+# operators with the arguments swapped, i.e. a op b == b FLIPPED_GUARDS[op] a
+FLIPPED_GUARDS = {"<": ">", "<=": ">=", ">": "<", ">=": "<=", "!=": "!="}
+
+
+def get_update(instruction: Instruction) -> tuple[str, int] | None:
+    # returns (var, delta) if the instruction is var := var + delta
+    match instruction:
+        case (InstructionType.SET_VAR, (str(var), Operator(name="+"), str(arg), int(delta))) if arg == var:
+            return var, delta
+        case (InstructionType.SET_VAR, (str(var), Operator(name="+"), int(delta), str(arg))) if arg == var:
+            return var, delta
+        case (InstructionType.SET_VAR, (str(var), Operator(name="-"), str(arg), int(delta))) if arg == var:
+            return var, -delta
+    return None
+
+
+def summarize_loop(
+    guard: Operator, guard_args: Sequence, body: Sequence[Instruction]
+) -> LoopSummary[str] | None:
+    """Returns the summary of the loop, None if it can't be accelerated."""
+
+    updates: dict[str, int] = {}
+    for instruction in body:
+        update = get_update(instruction)
+        if update is None:
+            return None
+        var, delta = update
+        updates[var] = updates.get(var, 0) + delta
+
+    match guard, guard_args:
+        case Operator(name="ID"), (str(counter),):
+            op_name, bound = "!=", 0
+        case Operator(name=op_name), (str(counter), bound) if (
+            op_name in FLIPPED_GUARDS and bound not in updates
+        ):
+            pass
+        case Operator(name=op_name), (bound, str(counter)) if (
+            op_name in FLIPPED_GUARDS and bound not in updates
+        ):
+            op_name = FLIPPED_GUARDS[op_name]
+        case _:
+            return None
+
+    return LoopSummary[str](OPERATORS[op_name], counter, bound, tuple(updates.items()))
+
+
+def accelerate_loops(program: list[Instruction]) -> tuple[list[Instruction], int]:
+    """Optimization pass that replaces loops with a closed form by ACCELERATED_LOOP instructions."""
+
+    new_program = list(program)
+    removed = []
+    rewritten = 0
+    for location, instruction in enumerate(program):
+        match instruction:
+            case (InstructionType.JUMP_IF_NOT, (Operator() as guard, *guard_args, int(exit_distance))):
+                end = location + exit_distance - 1  # the JUMP back to the loop header
+                if (
+                    exit_distance < 2
+                    or end >= len(program)
+                    or program[end] != Instruction(InstructionType.JUMP, (location - end,))
+                ):
+                    continue  # not a loop
+                summary = summarize_loop(guard, guard_args, program[location + 1 : end])
+                if summary is None:
+                    continue
+                new_program[location] = Instruction(
+                    InstructionType.ACCELERATED_LOOP, (summary, exit_distance)
+                )
+                removed.extend(range(location + 1, end + 1))
+                rewritten += 1
+    return optimizer.remove_instructions(new_program, removed), rewritten
@@ -0,0 +1,147 @@
+# Runs one WHILE program on many inputs at once using NumPy
+#
+# Every variable is a NumPy column with one lane per input row. All lanes have their
+# own program counter, in every step the instruction with the lowest program
+# counter is executed for all lanes that are currently at that instruction. This
+# makes lanes that took different branches converge again as soon as possible.
+#
+# Unlike the interpreter, values are fixed size integers (int64 by default), so
+# large values overflow silently. Pass dtype=object to get python integers.
+
+from collections.abc import Callable, Iterable
+from typing import NamedTuple, Any
+import functools as fun
+
+import numpy as np
+
+from while_parsing import Instruction, InstructionType, Operator, OPERATORS
+
+
+def _checked_divisor(b):
+    if np.any(np.asarray(b) == 0):
+        raise ZeroDivisionError("integer division or modulo by zero")
+    return b
+
+
+NUMPY_OPERATORS: dict[str, Callable[..., Any]] = {
+    "FALSE": lambda: 0,
+    "TRUE": lambda: 1,
+    "NOT": lambda n: n == 0,
+    "--": np.negative,
+    "ID": lambda n: n,
+    "<": np.less,
+    "<=": np.less_equal,
+    "==": np.equal,
+    ">=": np.greater_equal,
+    ">": np.greater,
+    "!=": np.not_equal,
+    "AND": np.multiply,
+    "OR": lambda a, b: np.where(np.not_equal(a, 0), a, b),
+    "+": np.add,
+    "-": np.subtract,
+    "*": np.multiply,
+    "/": lambda a, b: np.floor_divide(a, _checked_divisor(b)),
+    "%": lambda a, b: np.mod(a, _checked_divisor(b)),
+    "^": np.power,
+    "ALL": lambda *args: fun.reduce(np.logical_and, (np.not_equal(a, 0) for a in args), True),
+    "ANY": lambda *args: fun.reduce(np.logical_or, (np.not_equal(a, 0) for a in args), False),
+    "SUM": lambda *args: fun.reduce(np.add, args, 0),
+    "PRODUCT": lambda *args: fun.reduce(np.multiply, args, 1),
+}
+
+
+class BatchResult(NamedTuple):
+    variables: dict[str, np.ndarray]  # final value of every variable, one entry per lane
+    # one entry per executed OUTPUT instruction: the lanes that executed it and their values
+    outputs: list[tuple[np.ndarray, np.ndarray]]
+    # the outputs grouped by lane, lane i made output_values[output_offsets[i]:output_offsets[i + 1]]
+    output_offsets: np.ndarray
+    output_values: np.ndarray
+
+    def lane_outputs(self, lane: int) -> list[int]:
+        return self.output_values[self.output_offsets[lane] : self.output_offsets[lane + 1]].tolist()
+
+    def all_lane_outputs(self) -> list[list[int]]:
+        offsets = self.output_offsets.tolist()
+        return [self.output_values[start:end].tolist() for start, end in zip(offsets, offsets[1:])]
+
+
+def _group_by_lane(
+    outputs: list[tuple[np.ndarray, np.ndarray]], num_lanes: int, dtype
+) -> tuple[np.ndarray, np.ndarray]:
+    # the events are in the order they happened, the stable sort keeps it within every lane
+    lanes = np.concatenate([lanes for lanes, _ in outputs]) if outputs else np.zeros(0, np.int64)
+    values = np.concatenate([values for _, values in outputs]) if outputs else np.zeros(0, dtype)
+    offsets = np.zeros(num_lanes + 1, np.int64)
+    np.cumsum(np.bincount(lanes, minlength=num_lanes), out=offsets[1:])
+    return offsets, values[np.argsort(lanes, kind="stable")]
+
+
+def run_batched(program: Iterable[Instruction], inputs, dtype=np.int64) -> BatchResult:
+    """Executes the program once for every row of inputs.
+
+    The k-th INPUT statement that is executed in a lane reads column k of the
+    corresponding row."""
+
+    program = list(program)
+    inputs = np.asarray(inputs, dtype=dtype)
+    if inputs.ndim != 2:
+        raise ValueError(f"Expected a 2-D array of inputs, got shape {inputs.shape}")
+    num_lanes, num_inputs = inputs.shape
+
+    variables: dict[str, np.ndarray] = {}
+    for _, args in program:
+        for arg in args:
+            if isinstance(arg, str) and arg not in variables:
+                variables[arg] = np.zeros(num_lanes, dtype=dtype)
+
+    outputs: list[tuple[np.ndarray, np.ndarray]] = []
+    program_counters = np.zeros(num_lanes, dtype=np.int64)
+    inputs_read = np.zeros(num_lanes, dtype=np.int64)
+    end = len(program)
+
+    def evaluate(op: Operator, args, lanes) -> np.ndarray:
+        if op.name not in NUMPY_OPERATORS:
+            raise ValueError(f"{op.name} is not supported for batched execution")
+        values = [variables[arg][lanes] if isinstance(arg, str) else arg for arg in args]
+        result = NUMPY_OPERATORS[op.name](*values)
+        return np.broadcast_to(np.asarray(result).astype(dtype), (len(lanes),))
+
+    while True:
+        running = program_counters < end
+        if not running.any():
+            break
+        location = program_counters[running].min()
+        lanes = np.flatnonzero(program_counters == location)
+        instruction = program[location]
+
+        match instruction:
+            case (InstructionType.SET_VAR, (str(x), Operator() as op, *args)):
+                variables[x][lanes] = evaluate(op, args, lanes)
+                program_counters[lanes] += 1
+            case (InstructionType.JUMP_IF_NOT, (Operator() as op, *args, int(jump_distance))):
+                condition = evaluate(op, args, lanes)
+                program_counters[lanes] = np.where(condition != 0, location + 1, location + jump_distance)
+            case (InstructionType.JUMP, (int(jump_distance),)):
+                program_counters[lanes] += jump_distance
+            case (InstructionType.INPUT, (str(x),)):
+                columns = inputs_read[lanes]
+                if columns.max() >= num_inputs:
+                    raise ValueError(f"Not enough inputs for INPUT {x}, only {num_inputs} columns were given")
+                variables[x][lanes] = inputs[lanes, columns]
+                inputs_read[lanes] += 1
+                program_counters[lanes] += 1
+            case (InstructionType.OUTPUT, (x,)):
+                outputs.append((lanes, evaluate(OPERATORS["ID"], (x,), lanes).copy()))
+                program_counters[lanes] += 1
+            case (InstructionType.ASSERT, (Operator() as op, *args)):
+                failed = lanes[evaluate(op, args, lanes) == 0]
+                if len(failed):
+                    raise AssertionError(
+                        f"Assertion at instruction {location} failed for the rows {failed.tolist()}"
+                    )
+                program_counters[lanes] += 1
+            case _:
+                raise ValueError(f"Invalid instruction: {instruction}")
+
+    return BatchResult(variables, outputs, *_group_by_lane(outputs, num_lanes, dtype))
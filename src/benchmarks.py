@@ -0,0 +1,857 @@
+# Benchmarks for the different parts of the project. Run with -h to see the
+# available benchmarks.
+
+from collections.abc import Callable, Iterator
+import argparse
+import collections
+import contextlib
+import dataclasses
+import io
+import itertools
+import os
+import pathlib
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import typing
+
+import numpy as np
+
+import while_parsing
+import compiler
+import batch
+import acceleration
+import optimizer
+import program_cache
+import transition_system
+import reachability
+import state_store
+import bitstate
+import ts_export
+from transition_system import State, VariableSet
+from while_parsing import InstructionType
+
+PROGRAM_DIR = pathlib.Path(__file__).parent.parent / "while_programs"
+
+# Inputs that make the example programs run for a while (and terminate)
+PROGRAM_INPUTS: dict[str, tuple[int, ...]] = {
+    "simple_abs.while": (),
+    "abs.while": (-12345,),
+    "fib.while": (10**2000,),
+    "prime_factors.while": (2 * 3 * 1009,),
+    "2_nested_loops.while": (50_000, 50_000),
+    "3_nested_loops.while": (50_000, 50_000, 50_000),
+    "4_nested_loops.while": (20_000, 20_000, 20_000, 20_000),
+}
+
+
+def load_program(name: str) -> list[while_parsing.Instruction]:
+    with open(PROGRAM_DIR / name) as file:
+        return list(while_parsing.parse_program(file.read().splitlines()))
+
+
+def best_time(f: Callable[[], object], repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        f()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def benchmark_interpreter(repeat: int):
+    print(f"{'program':<24}{'run_program':>14}{'compile':>12}{'compiled':>12}{'speedup':>10}")
+    for name, inputs in PROGRAM_INPUTS.items():
+        program = load_program(name)
+
+        def interpret():
+            input_it = iter(map(str, inputs))
+            return while_parsing.run_program(program, lambda _: next(input_it), lambda _: None)
+
+        compiled = compiler.compile_program(program)
+
+        def run_compiled():
+            input_it = iter(map(str, inputs))
+            return compiled.run(lambda _: next(input_it), lambda _: None)
+
+        interpreted_result = interpret()
+        compiled_result = run_compiled()
+        assert interpreted_result == compiled_result
+
+        interpreted_time = best_time(interpret, repeat)
+        compile_time = best_time(lambda: compiler.compile_program(program), repeat)
+        compiled_time = best_time(run_compiled, repeat)
+        print(
+            f"{name:<24}{interpreted_time:>13.4f}s{compile_time:>11.4f}s{compiled_time:>11.4f}s"
+            f"{interpreted_time / compiled_time:>9.1f}x"
+        )
+
+
+def benchmark_batch(repeat: int, num_rows: int):
+    rng = np.random.default_rng(0)
+    sweeps = {
+        "abs.while": rng.integers(-1000, 1000, (num_rows, 1)),
+        "prime_factors.while": rng.integers(2, 200, (num_rows, 1)),
+        "2_nested_loops.while": rng.integers(0, 100, (num_rows, 2)),
+    }
+    print(f"{'program':<24}{'rows':>10}{'run_program':>14}{'batched':>12}{'speedup':>10}")
+    for name, rows in sweeps.items():
+        program = load_program(name)
+        # running every row through the interpreter takes too long, so only a sample is timed
+        sample = rows[: min(len(rows), 1000)]
+
+        def interpret():
+            for row in sample:
+                input_it = iter(map(str, row))
+                while_parsing.run_program(program, lambda _: next(input_it), lambda _: None)
+
+        interpreted_time = best_time(interpret, repeat) * len(rows) / len(sample)
+        batched_time = best_time(lambda: batch.run_batched(program, rows), repeat)
+        print(
+            f"{name:<24}{len(rows):>10}{interpreted_time:>13.4f}s{batched_time:>11.4f}s"
+            f"{interpreted_time / batched_time:>9.1f}x"
+        )
+
+
+def benchmark_acceleration(repeat: int):
+    print(
+        f"{'program':<24}{'input':>8}{'run_program':>14}{'accelerated':>14}{'steps':>12}{'accelerated':>14}"
+    )
+    for name in ["2_nested_loops.while", "3_nested_loops.while", "4_nested_loops.while"]:
+        program = load_program(name)
+        accelerated, _ = acceleration.accelerate_loops(program)
+        input_vars = [
+            typing.cast(str, args[0])
+            for instruction_type, args in program
+            if instruction_type == InstructionType.INPUT
+        ]
+        for magnitude in [10, 100, 1000]:
+
+            def interpret(program=program):
+                input_it = iter([str(magnitude)] * len(input_vars))
+                return while_parsing.run_program(program, lambda _: next(input_it), lambda _: None)
+
+            def count_steps(program) -> int:
+                # number of unrolling steps from known inputs until the program terminates
+                state = State(len(input_vars), VariableSet(_DATA=dict.fromkeys(input_vars, magnitude)))
+                steps = 0
+                while successors := transition_system.get_next_states(program, state):
+                    (state,) = successors
+                    steps += 1
+                return steps
+
+            assert interpret() == interpret(accelerated)
+            print(
+                f"{name:<24}{magnitude:>8}{best_time(interpret, repeat):>13.4f}s"
+                f"{best_time(lambda: interpret(accelerated), repeat):>13.4f}s"
+                f"{count_steps(program):>12}{count_steps(accelerated):>14}"
+            )
+
+
+def generate_source(num_lines: int) -> Iterator[str]:
+    # a machine generated looking program with mostly straight line code and some branches
+    rng = random.Random(0)
+    variables = [f"v{i}" for i in range(100)]
+    lines = 0
+    while lines < num_lines:
+        a, b, c = rng.sample(variables, 3)
+        match rng.randrange(10):
+            case 0:
+                yield from (f"IF {a} < {b} THEN", f"  {c} := {a} + 1", "ELSE", f"  {c} := {b} - 1", "END IF")
+                lines += 5
+            case 1:
+                yield from (f"WHILE {a} > 0 DO", f"  {a} := {a} - 1", "END WHILE")
+                lines += 3
+            case 2:
+                yield f"OUTPUT {a}"
+                lines += 1
+            case 3:
+                yield f"{a} := SUM {b} {c} {rng.randrange(1000)}"
+                lines += 1
+            case _:
+                yield f"{a} := {b} {rng.choice('+-*')} {rng.randrange(1000)}"
+                lines += 1
+
+
+def benchmark_parse(repeat: int, num_lines: int):
+    source = list(generate_source(num_lines))
+    parse_time = best_time(lambda: collections.deque(while_parsing.parse_program(source), maxlen=0), repeat)
+    print(f"parsed {len(source)} lines in {parse_time:.4f}s ({len(source) / parse_time:,.0f} lines/s)")
+
+
+def benchmark_cache(repeat: int, num_lines: int):
+    source = list(generate_source(num_lines))
+    print(f"{'passes':<12}{'lines':>10}{'uncached':>12}{'cached':>12}{'speedup':>10}")
+    for name, passes in [("none", []), ("default", optimizer.DEFAULT_PASSES)]:
+        # redirect_stderr hides the optimizer reports
+        with tempfile.TemporaryDirectory() as directory, contextlib.redirect_stderr(io.StringIO()):
+            cache = program_cache.ProgramCache(pathlib.Path(directory))
+            uncached_time = best_time(lambda: program_cache.load_program(source, passes), repeat)
+            program = program_cache.load_program(source, passes, cache)
+            cached_time = best_time(lambda: program_cache.load_program(source, passes, cache), repeat)
+            assert program_cache.load_program(source, passes, cache) == program
+        print(
+            f"{name:<12}{len(source):>10}{uncached_time:>11.4f}s{cached_time:>11.4f}s{uncached_time / cached_time:>9.1f}x"
+        )
+
+
+def benchmark_streaming(max_lines: int):
+    # memory used by run_program on a straight line program that is parsed while it runs,
+    # every line has a distinct constant
+    print(f"{'lines':>10}{'time':>12}{'peak memory':>16}")
+    num_lines = 1000
+    while num_lines <= max_lines:
+        rng = random.Random(0)
+        source = (f"v{rng.randrange(100)} := v{rng.randrange(100)} + {i}" for i in range(num_lines))
+        tracemalloc.start()
+        start = time.perf_counter()
+        while_parsing.run_program(while_parsing.parse_program(source))
+        run_time = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"{num_lines:>10}{run_time:>11.4f}s{peak / 1024:>13.1f}KiB")
+        num_lines *= 10
+
+
+@dataclasses.dataclass(slots=True, kw_only=True, frozen=True)
+class DictVariableSet:
+    # the previous implementation of transition_system.VariableSet, for comparison
+    _DATA: dict[str, int | None] = dataclasses.field(default_factory=dict)
+
+    def get(self, arg: str | int) -> int | None:
+        if isinstance(arg, int):
+            return arg
+        return self._DATA.get(arg, 0)
+
+    def set(self, var, value) -> "DictVariableSet":
+        new_data = self._DATA.copy()
+        if value == 0:
+            new_data.pop(var, None)
+        else:
+            new_data[var] = value
+        return DictVariableSet(_DATA=new_data)
+
+    def __hash__(self):
+        return hash(frozenset(self._DATA.items()))
+
+
+def benchmark_variable_set(repeat: int, max_depth: int):
+    print(
+        f"{'program':<24}{'depth':>8}{'states':>10}{'dict':>10}{'interned':>10}{'dict mem':>12}{'interned mem':>14}"
+    )
+    for name in ["3_nested_loops.while", "4_nested_loops.while"]:
+        program = load_program(name)
+        depth = 10
+        while depth <= max_depth:
+            results = []
+            for variable_set in DictVariableSet, VariableSet:
+                # DictVariableSet has the interface of VariableSet
+                initial_state = State(0, typing.cast(VariableSet, variable_set()))
+
+                def unroll():
+                    return transition_system.unroll_while_program(program, depth, initial_state)
+
+                unroll_time = best_time(unroll, repeat)
+                tracemalloc.start()
+                ts = unroll()
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                results.append((unroll_time, peak, len(ts.transitions)))
+
+            (dict_time, dict_peak, num_states), (interned_time, interned_peak, _) = results
+            print(
+                f"{name:<24}{depth:>8}{num_states:>10}{dict_time:>9.3f}s{interned_time:>9.3f}s"
+                f"{dict_peak / 2**20:>9.1f}MiB{interned_peak / 2**20:>11.1f}MiB"
+            )
+            depth *= 2
+
+
+def benchmark_unroll(max_depth: int):
+    # shows how the number of states grows with the depth
+    print(
+        f"{'program':<24}{'depth':>8}{'states':>10}{'expanded':>10}{'duplicates':>12}{'frontier':>10}{'time':>10}"
+    )
+    for name in [
+        "2_nested_loops.while",
+        "3_nested_loops.while",
+        "4_nested_loops.while",
+        "prime_factors.while",
+    ]:
+        program = load_program(name)
+        depth = 10
+        while depth <= max_depth:
+            start = time.perf_counter()
+            ts = transition_system.unroll_while_program(program, depth)
+            unroll_time = time.perf_counter() - start
+            stats = ts.stats
+            print(
+                f"{name:<24}{depth:>8}{len(ts.transitions):>10}{stats.expanded:>10}{stats.duplicates:>12}"
+                f"{max(stats.frontier_sizes):>10}{unroll_time:>9.3f}s"
+            )
+            depth *= 2
+
+
+def benchmark_reduction(repeat: int, max_depth: int):
+    # compares the number of states and the time with the state space reductions
+    configurations = {
+        "plain": {},
+        "projected": {"project": True},
+        "intervals": {"use_intervals": True},
+        "both": {"project": True, "use_intervals": True},
+    }
+    print(f"{'program':<24}{'depth':>8}" + "".join(f"{name:>20}" for name in configurations))
+    for name in [
+        "abs.while",
+        "2_nested_loops.while",
+        "3_nested_loops.while",
+        "4_nested_loops.while",
+        "fib.while",
+        "prime_factors.while",
+    ]:
+        program = load_program(name)
+        depth = 10
+        while depth <= max_depth:
+            results = []
+            for options in configurations.values():
+
+                def unroll():
+                    return transition_system.unroll_while_program(program, depth, **options)
+
+                ts = unroll()
+                states = {ts.initial_state, *itertools.chain.from_iterable(ts.transitions.values())}
+                results.append(f"{len(states):>10}{best_time(unroll, repeat):>9.3f}s")
+            print(f"{name:<24}{depth:>8}{''.join(results)}")
+            depth *= 2
+
+
+def benchmark_sweep(max_depth: int, step: int):
+    # a sweep over the depths, unrolling every depth from scratch vs extending the last one
+    print(f"{'program':<24}{'depths':>12}{'from scratch':>14}{'extend':>10}{'speedup':>10}")
+    for name in ["2_nested_loops.while", "3_nested_loops.while", "4_nested_loops.while"]:
+        program = load_program(name)
+        depths = range(step, max_depth + 1, step)
+
+        start = time.perf_counter()
+        scratch = [
+            len(transition_system.unroll_while_program(program, depth).transitions) for depth in depths
+        ]
+        scratch_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        ts = transition_system.unroll_while_program(program, 0)
+        extended = [len(ts.extend(program, step).transitions) for _ in depths]
+        extend_time = time.perf_counter() - start
+
+        assert scratch == extended
+        print(
+            f"{name:<24}{f'{step}..{max_depth}':>12}{scratch_time:>13.3f}s{extend_time:>9.3f}s"
+            f"{scratch_time / extend_time:>9.2f}x"
+        )
+
+
+def benchmark_store(depth: int):
+    # unrolling with the transitions in memory vs in a DiskStateStore, the python heap
+    # doesn't include the memory mapped files
+    print(f"{'program':<24}{'depth':>8}{'states':>10}{'store':>8}{'time':>10}{'heap':>12}{'files':>12}")
+    for name in ["3_nested_loops.while", "4_nested_loops.while"]:
+        program = load_program(name)
+        for store_name in ["memory", "disk"]:
+            with contextlib.ExitStack() as stack:
+
+                def unroll():
+                    store = None
+                    if store_name == "disk":
+                        variables = state_store.state_variables(program)
+                        store = stack.enter_context(state_store.DiskStateStore(variables))
+                    return transition_system.unroll_while_program(program, depth, store=store)
+
+                start = time.perf_counter()
+                ts = unroll()
+                unroll_time = time.perf_counter() - start
+                num_states = len(ts.visited)
+                del ts
+
+                tracemalloc.start()
+                ts = unroll()
+                heap = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                files = 0
+                if isinstance(ts.visited, state_store.StoredStates):
+                    files = sum(path.stat().st_size for path in ts.visited.store.directory.iterdir())
+            print(
+                f"{name:<24}{depth:>8}{num_states:>10}{store_name:>8}{unroll_time:>9.3f}s"
+                f"{heap / 2**20:>10.1f}MiB{files / 2**20:>10.1f}MiB"
+            )
+
+
+def benchmark_bitstate(depth: int):
+    # exact visited states vs bitstate hashing with different amounts of memory
+    print(
+        f"{'program':<24}{'depth':>8}{'memory':>10}{'states':>10}{'coverage':>10}{'estimate':>10}"
+        f"{'time':>10}{'heap':>12}"
+    )
+    for name in ["3_nested_loops.while", "4_nested_loops.while"]:
+        program = load_program(name)
+        num_states = None
+        for memory in [None, 2**10, 2**14, 2**18, 2**22]:
+            store = None if memory is None else bitstate.BitstateStore.with_memory(memory)
+            tracemalloc.start()
+            start = time.perf_counter()
+            ts = transition_system.unroll_while_program(program, depth, store=store)
+            unroll_time = time.perf_counter() - start
+            heap = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+            states = len(ts.visited)
+            num_states = num_states or states
+            estimate = 1.0 if store is None else store.visited.estimated_coverage()
+            print(
+                f"{name:<24}{depth:>8}{memory or 'exact':>10}{states:>10}{states / num_states:>10.2%}"
+                f"{estimate:>10.2%}{unroll_time:>9.3f}s{heap / 2**20:>10.1f}MiB"
+            )
+            del ts, store
+
+
+def benchmark_export(depth: int):
+    # str(ts) vs the streaming exporters, the heap is the peak while writing or loading
+    print(
+        f"{'program':<24}{'depth':>8}{'states':>10}{'format':>8}{'write':>10}{'heap':>12}{'size':>12}{'load':>10}"
+    )
+    for name in ["3_nested_loops.while", "4_nested_loops.while"]:
+        program = load_program(name)
+        ts = transition_system.unroll_while_program(program, depth)
+        with tempfile.TemporaryDirectory() as directory:
+
+            def measure(function: Callable[[], object]) -> tuple[float, int]:
+                tracemalloc.start()
+                start = time.perf_counter()
+                function()
+                elapsed = time.perf_counter() - start
+                heap = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                return elapsed, heap
+
+            def write_str(path: pathlib.Path):
+                path.write_text(str(ts))
+
+            def write_text(path: pathlib.Path, write: Callable):
+                with open(path, "w") as file:
+                    write(ts, file)
+
+            def load_jsonl(path: pathlib.Path):
+                with open(path) as file:
+                    ts_export.read_jsonl(file)
+
+            formats = {
+                "str": (write_str, None),
+                "text": (lambda path: write_text(path, transition_system.TransitionSystem.write), None),
+                "jsonl": (lambda path: write_text(path, ts_export.write_jsonl), load_jsonl),
+                "dot": (lambda path: write_text(path, ts_export.write_dot), None),
+                "csr": (lambda path: ts_export.write_csr(ts, path), ts_export.load_csr),
+            }
+            for format_name, (write, load) in formats.items():
+                path = pathlib.Path(directory) / f"ts.{'npz' if format_name == 'csr' else format_name}"
+                write_time, heap = measure(lambda: write(path))
+                load_time = f"{measure(lambda: load(path))[0]:>9.3f}s" if load else f"{'-':>10}"
+                print(
+                    f"{name:<24}{depth:>8}{len(ts.visited):>10}{format_name:>8}{write_time:>9.3f}s"
+                    f"{heap / 2**20:>10.1f}MiB{path.stat().st_size / 2**20:>10.1f}MiB{load_time}"
+                )
+
+
+BMC_SOURCE = """
+INPUT x
+WHILE a < x DO
+  a := a + 1
+  b := b + 2
+  c := a + a
+  ASSERT b == c
+END WHILE
+"""
+
+
+def benchmark_variables():
+    # AST nodes of T(0, 1) with all 26 letters, the variables of the program and its cone of influence
+    import transition_relation  # imported here, it loads z3
+    import compare_encodings
+    import smt
+    import sat
+
+    print(f"{'program':<24}{'encoding':>10}{'letters':>10}{'program':>10}{'cone':>10}{'reduction':>12}")
+    encodings = {
+        "SMT": (smt.Z3Int, smt.get_operator_restriction),
+        "SAT": (sat.BitVector, sat.get_operator_restriction),
+    }
+    programs = {
+        "abs.while": ["SMT"],
+        "simple_abs.while": ["SMT"],
+        "fib.while": ["SMT", "SAT"],
+        "2_nested_loops.while": ["SMT", "SAT"],
+        "4_nested_loops.while": ["SMT", "SAT"],
+    }
+    for name, encoding_names in programs.items():
+        program = load_program(name)
+        for encoding_name in encoding_names:
+            nodes = []
+            for variables in [
+                transition_relation.WhileIdentifiers,
+                optimizer.program_variables(program),
+                optimizer.cone_of_influence(program),
+            ]:
+                T = transition_relation.get_transition_relation(
+                    program, *encodings[encoding_name], variables=variables
+                )
+                nodes.append(compare_encodings.count_ast_nodes(T(0, 1)))
+            print(
+                f"{name:<24}{encoding_name:>10}{nodes[0]:>10}{nodes[1]:>10}{nodes[2]:>10}"
+                f"{nodes[0] / nodes[2]:>11.1f}x"
+            )
+
+
+def benchmark_relation(depths: list[int]):
+    # building T(i, i + 1) for all steps with get_transition_relation vs substituting a template
+    import transition_relation  # imported here, it loads z3
+    import smt
+    import sat
+
+    program = load_program("4_nested_loops.while")
+    print(f"{'encoding':<12}{'steps':>8}{'rebuild':>12}{'template':>12}{'speedup':>10}")
+    encodings = {
+        "SMT": (smt.Z3Int, smt.get_operator_restriction),
+        "SAT": (sat.BitVector, sat.get_operator_restriction),
+    }
+    for name, encoding in encodings.items():
+        for depth in depths:
+            times = []
+            for template in [False, True]:
+                start = time.perf_counter()
+                T = transition_relation.get_transition_relation(program, *encoding, template=template)
+                for i in range(depth):
+                    T(i, i + 1)
+                times.append(time.perf_counter() - start)
+            print(f"{name:<12}{depth:>8}{times[0]:>11.3f}s{times[1]:>11.3f}s{times[0] / times[1]:>9.2f}x")
+
+
+def benchmark_bmc(depth: int):
+    # one incremental solver vs a new solver for every bound, the assertion holds, so
+    # all bounds are checked. The total includes building the formulas.
+    import bmc  # imported here, it loads z3
+    import smt
+    import sat
+
+    program = list(while_parsing.parse_program(BMC_SOURCE.splitlines()))
+    print(f"{'encoding':<12}{'depth':>8}{'solver':>16}{'check time':>12}{'last bound':>12}{'total':>10}")
+    encodings = {
+        "SMT": (smt.Z3Int, smt.get_operator_restriction),
+        "SAT": (sat.BitVector, sat.get_operator_restriction),
+    }
+    for name, encoding in encodings.items():
+        for incremental in [True, False]:
+            start = time.perf_counter()
+            result = bmc.check_assertions(program, depth, *encoding, incremental=incremental)
+            total = time.perf_counter() - start
+            assert not result.violated
+            print(
+                f"{name:<12}{depth:>8}{'incremental' if incremental else 'new per bound':>16}"
+                f"{sum(result.check_times):>11.3f}s{result.check_times[-1]:>11.3f}s{total:>9.3f}s"
+            )
+
+
+def benchmark_locations(steps: int):
+    # size of T(0, 1) and solve time of reaching the end of the program per encoding of the program counter
+    import compare_encodings  # imported here, it loads z3
+    import smt
+    import sat
+
+    print(f"{'program':<24}{'encoding':>10}{'location':>12}{'AST nodes':>12}{'solve time':>12}")
+    encodings = {
+        "SMT": (smt.Z3Int, smt.get_operator_restriction),
+        "SAT": (sat.BitVector, sat.get_operator_restriction),
+    }
+    for name in ["fib.while", "4_nested_loops.while"]:
+        program = load_program(name)
+        for encoding_name, encoding in encodings.items():
+            for location in ["arithmetic", *sat.LOCATION_ENCODINGS]:
+                nodes, seconds, _ = compare_encodings.compare_location_encoding(
+                    program, *encoding, location_name=location, steps=steps
+                )
+                print(f"{name:<24}{encoding_name:>10}{location:>12}{nodes:>12}{seconds:>11.3f}s")
+
+
+def benchmark_cnf(depths: list[int]):
+    # writing the SAT encoding of an unrolling as DIMACS (clause template) vs building the z3
+    # formulas of all steps and writing them as SMT-LIB
+    import cnf  # imported here, it loads z3
+    import compare_encodings
+    import transition_relation
+    import bmc
+    import sat
+    import z3
+
+    program = list(while_parsing.parse_program(BMC_SOURCE.splitlines()))
+    encoding = (sat.BitVector, sat.get_operator_restriction)
+    print(f"{'steps':>8}{'DIMACS':>12}{'size':>10}{'SMT-LIB':>12}{'size':>10}{'speedup':>10}")
+    with tempfile.TemporaryDirectory() as directory:
+        path = pathlib.Path(directory) / "unrolling.cnf"
+        for depth in depths:
+            start = time.perf_counter()
+            cnf.write_unrolling(program, depth, path, location="binary")
+            dimacs_time = time.perf_counter() - start
+            dimacs_size = path.stat().st_size
+
+            start = time.perf_counter()
+            location_encoding = sat.BinaryLocation(len(program) + 1)
+            T = transition_relation.get_transition_relation(
+                program, *encoding, template=True, location_encoding=location_encoding
+            )
+            state = transition_relation.StateVariable.init(
+                "0",
+                sat.BitVector.create_variable,
+                sorted(optimizer.program_variables(program)),
+                location_encoding.create_variable,
+            )
+            formula = z3.And(
+                bmc.initial_state_formula(state, sat.BitVector, location_encoding),
+                *(T(i, i + 1) for i in range(depth)),
+            )
+            smtlib_size = len(compare_encodings.to_smt2_benchmark(formula))
+            smtlib_time = time.perf_counter() - start
+            print(
+                f"{depth:>8}{dimacs_time:>11.3f}s{dimacs_size / 1e6:>8.1f}MB"
+                f"{smtlib_time:>11.3f}s{smtlib_size / 1e6:>8.1f}MB{smtlib_time / dimacs_time:>9.2f}x"
+            )
+
+
+def benchmark_reachability(repeat: int, max_depth: int):
+    # searching for a state with a depth limit vs unrolling to that limit
+    queries = [
+        ("3_nested_loops.while", "c", 5),
+        ("4_nested_loops.while", "d", 5),
+        ("4_nested_loops.while", "b", 4),
+        ("prime_factors.while", "prime", 7),
+    ]
+    print(f"{'program':<24}{'query':>10}{'found at':>10}{'strategy':>10}{'expanded':>10}{'time':>10}")
+    for name, var, value in queries:
+        program = load_program(name)
+        predicate = reachability.has_value(var, value)
+        trace = reachability.find_state(program, predicate).trace
+        assert trace is not None, f"{var}={value} is not reachable in {name}"
+        depth = len(trace) - 1
+        query = f"{var}={value}"
+
+        def unroll():
+            return transition_system.unroll_while_program(program, max_depth)
+
+        unroll_time = best_time(unroll, repeat)
+        print(
+            f"{name:<24}{query:>10}{depth:>10}{'unroll':>10}{unroll().stats.expanded:>10}{unroll_time:>9.3f}s"
+        )
+        for strategy in reachability.STRATEGIES:
+
+            def search(strategy: reachability.Strategy = strategy):
+                return reachability.find_state(program, predicate, max_depth, strategy)
+
+            search_time = best_time(search, repeat)
+            print(
+                f"{name:<24}{query:>10}{depth:>10}{strategy:>10}{search().expanded:>10}{search_time:>9.3f}s"
+            )
+
+
+def benchmark_parallel(repeat: int, depth: int):
+    print(f"os.cpu_count() = {os.cpu_count()}")
+    print(f"{'program':<24}{'depth':>8}{'states':>10}{'workers':>10}{'time':>10}{'speedup':>10}")
+    for name in ["3_nested_loops.while", "4_nested_loops.while"]:
+        program = load_program(name)
+        serial = transition_system.unroll_while_program(program, depth)
+        serial_time = None
+        for workers in [1, 2, 4, 8]:
+
+            def unroll():
+                return transition_system.unroll_while_program(program, depth, workers=workers)
+
+            assert unroll() == serial
+            unroll_time = best_time(unroll, repeat)
+            serial_time = serial_time or unroll_time
+            print(
+                f"{name:<24}{depth:>8}{len(serial.transitions):>10}{workers:>10}{unroll_time:>9.3f}s"
+                f"{serial_time / unroll_time:>9.2f}x"
+            )
+
+
+# modules that must be importable without loading z3, see util.py
+Z3_FREE_MODULES = ["while_parsing", "compiler", "optimizer", "acceleration", "transition_system"]
+SRC_DIR = pathlib.Path(__file__).parent
+
+
+def import_times(module: str) -> dict[str, int]:
+    # cumulative import time in microseconds of every module loaded by importing module
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=SRC_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines()[1:]:  # the first line is the header
+        _, cumulative, name = line.removeprefix("import time:").split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def benchmark_startup(repeat: int):
+    print(f"{'module':<24}{'import time':>14}{'z3':>6}")
+    for module in [*Z3_FREE_MODULES, "smt", "compare_encodings"]:
+        times = min((import_times(module) for _ in range(repeat)), key=lambda times: times[module])
+        print(f"{module:<24}{times[module] / 1e6:>13.4f}s{str('z3' in times):>6}")
+        if module in Z3_FREE_MODULES and "z3" in times:
+            sys.exit(f"{module} imports z3, this slows down the interpreter startup")
+
+    command = [sys.executable, SRC_DIR / "while_parsing.py", PROGRAM_DIR / "simple_abs.while"]
+    interpreter_time = best_time(lambda: subprocess.run(command, check=True, capture_output=True), repeat)
+    print(f"{'while_parsing.py run':<24}{interpreter_time:>13.4f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run benchmarks.")
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="Report the best of this many runs.")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+    subparsers.add_parser(
+        "interpreter", help="Compare run_program with the compiled programs on the example programs."
+    )
+    batch_parser = subparsers.add_parser(
+        "batch", help="Compare run_program with run_batched on sweeps over random inputs."
+    )
+    batch_parser.add_argument("--rows", type=int, default=100_000, help="Number of input rows per program.")
+    subparsers.add_parser(
+        "acceleration", help="Compare the nested loop programs with and without loop acceleration."
+    )
+
+    parse_parser = subparsers.add_parser(
+        "parse", help="Measure the parser throughput on a generated program."
+    )
+    parse_parser.add_argument("--lines", type=int, default=1_000_000, help="Number of lines of the program.")
+    cache_parser = subparsers.add_parser(
+        "cache", help="Compare parsing and optimizing a generated program with loading it from the cache."
+    )
+    cache_parser.add_argument("--lines", type=int, default=20_000, help="Number of lines of the program.")
+    streaming_parser = subparsers.add_parser(
+        "streaming", help="Measure the memory used by run_program on growing streamed programs."
+    )
+    streaming_parser.add_argument("--lines", type=int, default=100_000, help="Maximum number of lines.")
+    variable_set_parser = subparsers.add_parser(
+        "variable-set", help="Compare the interned VariableSet with the previous dict based one."
+    )
+    variable_set_parser.add_argument("--depth", type=int, default=80, help="Maximum unrolling depth.")
+    unroll_parser = subparsers.add_parser(
+        "unroll", help="Show the unrolling statistics of the example programs at growing depths."
+    )
+    unroll_parser.add_argument("--depth", type=int, default=80, help="Maximum unrolling depth.")
+    reduction_parser = subparsers.add_parser(
+        "reduction",
+        help="Compare the number of states with dead variable projection and the interval domain.",
+    )
+    reduction_parser.add_argument("--depth", type=int, default=80, help="Maximum unrolling depth.")
+    sweep_parser = subparsers.add_parser(
+        "sweep", help="Compare a depth sweep that unrolls every depth from scratch to extending."
+    )
+    sweep_parser.add_argument("--depth", type=int, default=80, help="Maximum unrolling depth.")
+    sweep_parser.add_argument("--step", type=int, default=10, help="Difference between the depths.")
+    store_parser = subparsers.add_parser(
+        "store", help="Compare unrolling with the states in memory and in memory mapped files."
+    )
+    store_parser.add_argument("--depth", type=int, default=80, help="Unrolling depth.")
+    bitstate_parser = subparsers.add_parser(
+        "bitstate", help="Compare exact visited states with bitstate hashing."
+    )
+    bitstate_parser.add_argument("--depth", type=int, default=80, help="Unrolling depth.")
+    export_parser = subparsers.add_parser(
+        "export", help="Compare str() of a transition system with the streaming exporters."
+    )
+    export_parser.add_argument("--depth", type=int, default=80, help="Unrolling depth.")
+    subparsers.add_parser(
+        "variables", help="Compare the encoding size with all letters, the program variables and the cone."
+    )
+    relation_parser = subparsers.add_parser(
+        "relation", help="Compare rebuilding the transition relation for every step with a template."
+    )
+    relation_parser.add_argument(
+        "--depths", type=int, nargs="+", default=[10, 50, 100], help="Numbers of steps."
+    )
+    bmc_parser = subparsers.add_parser(
+        "bmc", help="Compare incremental bounded model checking with a new solver for every bound."
+    )
+    bmc_parser.add_argument("--depth", type=int, default=50, help="Maximum bound.")
+    locations_parser = subparsers.add_parser(
+        "locations", help="Compare the encodings of the program counter (arithmetic, one-hot, binary, unary)."
+    )
+    locations_parser.add_argument("--steps", type=int, default=30, help="Number of steps.")
+    cnf_parser = subparsers.add_parser(
+        "cnf", help="Compare writing an unrolling as DIMACS CNF with building it in z3 and writing SMT-LIB."
+    )
+    cnf_parser.add_argument("--depths", type=int, nargs="+", default=[10, 50, 100], help="Numbers of steps.")
+    reachability_parser = subparsers.add_parser(
+        "reachability", help="Compare searching for a state to unrolling the program."
+    )
+    reachability_parser.add_argument(
+        "--depth", type=int, default=80, help="Unrolling depth and search limit."
+    )
+    parallel_parser = subparsers.add_parser(
+        "parallel", help="Compare unrolling the nested loop programs with 1, 2, 4 and 8 worker processes."
+    )
+    parallel_parser.add_argument("--depth", type=int, default=100, help="Unrolling depth.")
+    subparsers.add_parser(
+        "startup", help="Measure the import times (-X importtime) and fail if the interpreter imports z3."
+    )
+
+    args = parser.parse_args()
+    match args.benchmark:
+        case "interpreter":
+            benchmark_interpreter(args.repeat)
+        case "batch":
+            benchmark_batch(args.repeat, args.rows)
+        case "acceleration":
+            benchmark_acceleration(args.repeat)
+        case "parse":
+            benchmark_parse(args.repeat, args.lines)
+        case "cache":
+            benchmark_cache(args.repeat, args.lines)
+        case "streaming":
+            benchmark_streaming(args.lines)
+        case "variable-set":
+            benchmark_variable_set(args.repeat, args.depth)
+        case "unroll":
+            benchmark_unroll(args.depth)
+        case "reduction":
+            benchmark_reduction(args.repeat, args.depth)
+        case "sweep":
+            benchmark_sweep(args.depth, args.step)
+        case "store":
+            benchmark_store(args.depth)
+        case "bitstate":
+            benchmark_bitstate(args.depth)
+        case "export":
+            benchmark_export(args.depth)
+        case "variables":
+            benchmark_variables()
+        case "relation":
+            benchmark_relation(args.depths)
+        case "bmc":
+            benchmark_bmc(args.depth)
+        case "locations":
+            benchmark_locations(args.steps)
+        case "cnf":
+            benchmark_cnf(args.depths)
+        case "reachability":
+            benchmark_reachability(args.repeat, args.depth)
+        case "parallel":
+            benchmark_parallel(args.repeat, args.depth)
+        case "startup":
+            benchmark_startup(args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+# Bitstate hashing (supertrace) for the unroller
+#
+# Instead of the visited states, only k bits per state are set in a preallocated bit
+# array, like in SPIN's bitstate mode. A state counts as visited if all of its bits are
+# set, so a new state whose bits were already set by other states is wrongly skipped
+# (a hash collision). The exploration can miss states, but needs a fixed amount of
+# memory no matter how many states there are. The transitions are not kept either,
+# only counted.
+#
+#     store = BitstateStore.with_memory(2**20)
+#     ts = unroll_while_program(program, depth, store=store)
+#     print(store.visited.report())
+
+from collections.abc import Iterable, Iterator, Set
+import dataclasses
+import math
+
+from transition_system import State, TransitionSystem
+
+
+class BitstateSet(Set[State]):
+    """An approximate set of states that uses hash_functions bits per state in a bit
+    array of the given size in bytes. Contains can be wrong for states that weren't
+    added, with the probability false_positive_rate(). States can only be added."""
+
+    def __init__(self, memory: int = 2**24, hash_functions: int = 3):
+        if memory <= 0 or hash_functions <= 0:
+            raise ValueError("The memory and the number of hash functions have to be positive")
+        self.bits = bytearray(memory)
+        self.num_bits = 8 * memory
+        self.hash_functions = hash_functions
+        self.num_states = 0  # states that were added and not found before
+
+    def _indices(self, state: State) -> Iterator[int]:
+        # double hashing, index i is h1 + i * h2 (Kirsch and Mitzenmacher)
+        h1 = hash(state)
+        h2 = hash((h1, self.hash_functions)) | 1
+        for i in range(self.hash_functions):
+            yield (h1 + i * h2) % self.num_bits
+
+    def __contains__(self, state) -> bool:
+        bits = self.bits
+        return all(bits[i >> 3] >> (i & 7) & 1 for i in self._indices(state))
+
+    def add(self, state: State):
+        bits = self.bits
+        new = False
+        for i in self._indices(state):
+            if not bits[i >> 3] >> (i & 7) & 1:
+                bits[i >> 3] |= 1 << (i & 7)
+                new = True
+        self.num_states += new
+
+    def __iter__(self) -> Iterator[State]:
+        raise TypeError("A BitstateSet doesn't store its states, so it can't be iterated")
+
+    def __len__(self) -> int:
+        return self.num_states
+
+    def fill_ratio(self) -> float:
+        return int.from_bytes(self.bits).bit_count() / self.num_bits
+
+    def false_positive_rate(self) -> float:
+        """Probability that a state that was not added is contained, i.e. that a new state is skipped."""
+
+        return self.fill_ratio() ** self.hash_functions
+
+    def estimated_coverage(self, steps: int = 1000) -> float:
+        """Estimates the fraction of the new states that were not skipped.
+
+        The i-th new state is skipped with probability (1 - exp(-k * i / m))^k, the
+        coverage is one minus the average of this over all stored states. The states
+        that are only reachable through skipped states are missed as well, so the
+        coverage of the whole state space can be lower, check the hash factor too
+        (SPIN recommends at least 100)."""
+
+        n, k, m = self.num_states, self.hash_functions, self.num_bits
+        if n == 0:
+            return 1.0
+        # midpoint rule, the integrand is smooth
+        omitted = sum((1 - math.exp(-k * n * (j + 0.5) / steps / m)) ** k for j in range(steps)) / steps
+        return 1 - omitted
+
+    def report(self) -> str:
+        hash_factor = self.num_bits / self.num_states if self.num_states else math.inf
+        return (
+            f"Bitstate: {len(self.bits)} bytes, {self.hash_functions} hash functions,"
+            f" {self.num_states} states, hash factor {hash_factor:.1f}\n"
+            f"Bits set: {self.fill_ratio():.2%}, false positive rate: {self.false_positive_rate():.2e},"
+            f" estimated coverage: {self.estimated_coverage():.4%}"
+        )
+
+
+class CountedTransitions:
+    # The transitions of a TransitionSystem (see transition_system.Transitions) that are
+    # only counted. The length is the number of transitions that were set, but they
+    # can't be looked up or iterated, every state leads to the sink state.
+
+    def __init__(self):
+        self.count = 0
+
+    def __getitem__(self, state: State) -> tuple[State, ...]:
+        return (TransitionSystem.SINK_STATE,)
+
+    def __setitem__(self, state: State, successors: tuple[State, ...]):
+        self.count += 1
+
+    def __contains__(self, state) -> bool:
+        return False
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __iter__(self) -> Iterator[State]:
+        return iter(())
+
+    def items(self) -> Iterable[tuple[State, tuple[State, ...]]]:
+        return ()
+
+    def values(self) -> Iterable[tuple[State, ...]]:
+        return ()
+
+
+@dataclasses.dataclass(slots=True)
+class BitstateStore:
+    """A StateStore (see state_store.py) that only keeps the bits of the visited states."""
+
+    visited: BitstateSet = dataclasses.field(default_factory=BitstateSet)
+    transitions: CountedTransitions = dataclasses.field(default_factory=CountedTransitions)
+
+    @classmethod
+    def with_memory(cls, memory: int, hash_functions: int = 3) -> "BitstateStore":
+        return cls(BitstateSet(memory, hash_functions))
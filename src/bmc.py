@@ -0,0 +1,252 @@
+# Bounded model checking of the ASSERT statements of a WHILE program
+#
+# The transition relation of transition_relation.py is unrolled one step at a time
+# into a single incremental z3 solver:
+#
+#     I(s_0)                              the initial state, added once
+#     T(s_0, s_1), T(s_1, s_2), ...       T(s_k, s_k+1) is added after bound k
+#     Bad(s_k)                            only for bound k, between push and pop
+#
+# Bad(s) holds if s is at an ASSERT that fails, or whose arguments are unknown (they
+# depend on an input, so the assertion may fail). The solver keeps what it learned
+# about the transitions from one bound to the next, a new solver for every bound
+# would have to learn it again. A model is decoded into a trace of
+# transition_system States.
+
+from collections.abc import Sequence
+from typing import NamedTuple, Type
+import argparse
+import functools
+import time
+import typing
+
+import z3
+
+from util import Z3BoolExpression
+from while_parsing import Instruction, InstructionType, Operator
+from transition_relation import IntEncoding, LocationEncoding, OperatorRestrictionGetter, StateVariable
+from transition_system import State, VariableSet
+import transition_relation
+import optimizer
+import acceleration
+import program_cache
+import smt
+import sat
+
+
+class BMCResult(NamedTuple):
+    trace: list[State] | None  # from the initial state to a state at a failing ASSERT
+    bound: int  # the last bound that was checked
+    check_times: list[float]  # seconds the solver needed for every bound
+
+    @property
+    def violated(self) -> bool:
+        return self.trace is not None
+
+
+def assertion_locations(program: Sequence[Instruction]) -> list[int]:
+    return [
+        location
+        for location, (instruction_type, _) in enumerate(program)
+        if instruction_type == InstructionType.ASSERT
+    ]
+
+
+def initial_state_formula[
+    T: IntEncoding
+](state: StateVariable[T], Encoding: Type[T], location_encoding: LocationEncoding) -> Z3BoolExpression:
+    # like transition_system, all variables start known and 0
+    zero = Encoding.create_literal(0)
+    return z3.And(
+        location_encoding.at(state.location, 0),
+        location_encoding.valid(state.location),
+        *(z3.And(variable.is_known, variable.value == zero) for variable in state.variables.values()),
+    )
+
+
+def assertion_fails_formula[
+    T: IntEncoding
+](
+    program: Sequence[Instruction],
+    state: StateVariable[T],
+    Encoding: Type[T],
+    get_operator_restriction: OperatorRestrictionGetter[T],
+    location_encoding: LocationEncoding,
+) -> Z3BoolExpression:
+    failures = []
+    for location, instruction in enumerate(program):
+        match instruction:
+            case (InstructionType.ASSERT, (Operator(name=op_name), *args)):
+                values = [state.get(typing.cast(int | str, arg), Encoding.create_literal) for arg in args]
+                holds = get_operator_restriction(op_name, *(v.value for v in values))
+                failures.append(
+                    z3.And(
+                        location_encoding.at(state.location, location),
+                        z3.Not(z3.And(*(v.is_known for v in values), holds)),
+                    )
+                )
+    return z3.Or(failures)
+
+
+def decode_state[
+    T: IntEncoding
+](
+    model: z3.ModelRef,
+    state: StateVariable[T],
+    Encoding: Type[T],
+    location_encoding: LocationEncoding,
+) -> State:
+    data = {
+        name: (
+            Encoding.evaluate(model, value)
+            if z3.is_true(model.eval(is_known, model_completion=True))
+            else None
+        )
+        for name, (value, is_known) in state.variables.items()
+    }
+    return State(location_encoding.evaluate(model, state.location), VariableSet(_DATA=data))
+
+
+def check_assertions[
+    T: IntEncoding
+](
+    program: Sequence[Instruction],
+    max_depth: int,
+    Encoding: Type[T] = smt.Z3Int,
+    get_operator_restriction: OperatorRestrictionGetter[T] = smt.get_operator_restriction,
+    incremental: bool = True,
+    template: bool = True,
+    cone: bool = False,
+    location: str = "arithmetic",
+) -> BMCResult:
+    """Searches for a trace of at most max_depth steps to an ASSERT that may fail.
+
+    The bounds are checked in increasing order, so the trace is a shortest one. With
+    incremental=False, every bound is checked by a new solver, with template=False,
+    the transition relation is built again for every step (both for comparison).
+
+    With cone, only the variables in the cone of influence of the ASSERTs and branches
+    are encoded (see optimizer.cone_of_influence), the others are missing in the trace.
+
+    location is the name of the encoding of the program counter, see
+    sat.get_location_encoding."""
+
+    if not assertion_locations(program):
+        raise ValueError("The program has no ASSERT statements")
+
+    variables = sorted(optimizer.cone_of_influence(program) if cone else optimizer.program_variables(program))
+    location_encoding = sat.get_location_encoding(
+        location, len(program) + 1, Encoding, get_operator_restriction
+    )
+    T = transition_relation.get_transition_relation(
+        program, Encoding, get_operator_restriction, template, variables, location_encoding
+    )
+    create_location = location_encoding.create_variable
+    states = [StateVariable.init("0", Encoding.create_variable, variables, create_location)]
+    transitions: list[Z3BoolExpression] = []
+    solver = z3.Solver()
+    solver.add(initial_state_formula(states[0], Encoding, location_encoding))
+    check_times = []
+
+    for bound in range(max_depth + 1):
+        if bound > 0:
+            states.append(
+                StateVariable.init(str(bound), Encoding.create_variable, variables, create_location)
+            )
+            transitions.append(T(bound - 1, bound))
+            if incremental:
+                solver.add(transitions[-1])
+            else:
+                solver = z3.Solver()
+                solver.add(initial_state_formula(states[0], Encoding, location_encoding), *transitions)
+
+        solver.push()
+        solver.add(
+            assertion_fails_formula(
+                program, states[-1], Encoding, get_operator_restriction, location_encoding
+            )
+        )
+        start = time.perf_counter()
+        result = solver.check()
+        check_times.append(time.perf_counter() - start)
+        if result == z3.sat:
+            model = solver.model()
+            trace = [decode_state(model, state, Encoding, location_encoding) for state in states]
+            return BMCResult(trace, bound, check_times)
+        if result != z3.unsat:
+            raise ValueError(f"z3 couldn't decide bound {bound}: {solver.reason_unknown()}")
+        solver.pop()
+
+    return BMCResult(None, max_depth, check_times)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Check with bounded model checking if an ASSERT of a WHILE program can fail."
+    )
+    parser.add_argument("input_file", help="The input file containing the WHILE program.")
+    parser.add_argument("max_depth", type=int, help="The maximum number of steps.")
+    parser.add_argument(
+        "--sat", action="store_true", help="Use the SAT encoding instead of the SMT encoding."
+    )
+    parser.add_argument(
+        "--non-incremental", action="store_true", help="Use a new solver for every bound (slower)."
+    )
+    parser.add_argument(
+        "--cone",
+        action="store_true",
+        help="Only encode the variables that influence the ASSERTs and branches (cone of influence).",
+    )
+    parser.add_argument(
+        "--location",
+        choices=["arithmetic", *sat.LOCATION_ENCODINGS],
+        default="arithmetic",
+        help="The encoding of the program counter (default: arithmetic, like the values).",
+    )
+    parser.add_argument(
+        "-O", "--optimize", action="store_true", help="Optimize the program before encoding it."
+    )
+    parser.add_argument(
+        "--accelerate",
+        action="store_true",
+        help="Encode simple counting loops as a single transition (not supported for SAT).",
+    )
+    parser.add_argument(
+        "--cache", action="store_true", help="Cache the parsed and optimized program on disk."
+    )
+
+    args = parser.parse_args()
+
+    with open(args.input_file) as file:
+        source = file.read().splitlines()
+
+    passes = [
+        *(optimizer.DEFAULT_PASSES if args.optimize else ()),
+        *([acceleration.accelerate_loops] if args.accelerate else ()),
+    ]
+    cache = program_cache.ProgramCache() if args.cache else None
+    program = program_cache.load_program(source, passes, cache)
+
+    check = functools.partial(
+        check_assertions,
+        program,
+        args.max_depth,
+        incremental=not args.non_incremental,
+        cone=args.cone,
+        location=args.location,
+    )
+    if args.sat:
+        result = check(sat.BitVector, sat.get_operator_restriction)
+    else:
+        result = check(smt.Z3Int, smt.get_operator_restriction)
+    if result.trace is None:
+        print(f"No ASSERT fails in {args.max_depth} steps.")
+    else:
+        print(f"The ASSERT at instruction {result.trace[-1].location} may fail after {result.bound} steps:")
+        for state in result.trace:
+            print(f"    {state}")
+    print(f"Solver time: {sum(result.check_times):.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,402 @@
+# DIMACS CNF backend for the SAT encoding
+#
+# The Boolean formulas of sat.py are converted to clauses with the Tseitin
+# transformation: every And/Or/==/Xor/If gets an auxiliary variable that is
+# equivalent to it, Not only negates the literal, shared subexpressions get one
+# variable and constants are simplified away. The clauses are written to the file
+# as they are created, the header with their number follows at the end.
+#
+# write_unrolling never builds the z3 formulas of the steps: the template of
+# transition_relation.TemplateRelation is converted once (a ClauseTemplate) and every
+# step only renumbers its variables. The output can be given to any SAT solver, the
+# variable map in the comments ("c var 12 3_a_value_b0") leads back to the bits of
+# the StateVariables, decode_trace reads the solution:
+#
+#     python3 src/cnf.py program.while 20 program.cnf
+#     kissat program.cnf > solution.txt
+#     python3 src/cnf.py program.while 20 program.cnf --solution solution.txt
+
+from collections.abc import Callable, Iterable, Sequence
+import argparse
+import os
+import pathlib
+import shutil
+import tempfile
+import typing
+
+import z3
+
+from util import Z3BoolExpression
+from while_parsing import Instruction
+from transition_relation import StateVariable, TemplateRelation
+from transition_system import State
+import transition_relation
+import optimizer
+import program_cache
+import bmc
+import sat
+
+type Literal = int | bool  # DIMACS literal or a constant
+
+
+class TseitinEncoder:
+    """Converts z3 Boolean formulas to clauses.
+
+    new_variable gets the name of an uninterpreted constant, or None for an
+    auxiliary variable, and returns a new DIMACS variable."""
+
+    def __init__(self, new_variable: Callable[[str | None], int], add_clause: Callable[[list[int]], None]):
+        self.new_variable = new_variable
+        self.add_clause = add_clause
+        self._constants: dict[str, int] = {}
+        self._cache: dict[int, tuple[z3.ExprRef, Literal]] = {}  # keeps the expressions alive for the ids
+
+    def add(self, formula: Z3BoolExpression | z3.ExprRef):
+        """Adds clauses that are satisfiable iff the formula is."""
+
+        # the encodings create no probes
+        expr = z3.BoolVal(formula) if isinstance(formula, bool) else typing.cast(z3.ExprRef, formula)
+        match expr.decl().kind() if z3.is_app(expr) else None:
+            case z3.Z3_OP_AND:
+                for child in expr.children():
+                    self.add(child)
+                return
+            case z3.Z3_OP_OR:
+                literals = [self.literal(child) for child in expr.children()]
+                if not any(literal is True for literal in literals):  # 1 == True
+                    self.add_clause([literal for literal in literals if literal is not False])
+                return
+        literal = self.literal(expr)
+        if literal is not True:
+            self.add_clause([] if literal is False else [literal])
+
+    def literal(self, expr: z3.ExprRef) -> Literal:
+        cached = self._cache.get(expr.get_id())
+        if cached is not None:
+            return cached[1]
+        literal = self._encode(expr)
+        self._cache[expr.get_id()] = (expr, literal)
+        return literal
+
+    def clear_cache(self):
+        # the literals of the named constants are kept
+        self._cache.clear()
+
+    def _encode(self, expr: z3.ExprRef) -> Literal:
+        if z3.is_true(expr):
+            return True
+        if z3.is_false(expr):
+            return False
+        if not z3.is_bool(expr):
+            raise ValueError(f"Only Boolean formulas can be converted to CNF, not {expr.sort()}")
+
+        children = [self.literal(child) for child in expr.children()]
+        match expr.decl().kind():
+            case z3.Z3_OP_UNINTERPRETED if not children:
+                name = expr.decl().name()
+                if name not in self._constants:
+                    self._constants[name] = self.new_variable(name)
+                return self._constants[name]
+            case z3.Z3_OP_NOT:
+                return _negate(children[0])
+            case z3.Z3_OP_AND:
+                return self._and(children)
+            case z3.Z3_OP_OR:
+                return _negate(self._and([_negate(child) for child in children]))
+            case z3.Z3_OP_IMPLIES:
+                return _negate(self._and([children[0], _negate(children[1])]))
+            case z3.Z3_OP_EQ if len(children) == 2:
+                return self._equal(*children)
+            case z3.Z3_OP_DISTINCT | z3.Z3_OP_XOR if len(children) == 2:
+                return _negate(self._equal(*children))
+            case z3.Z3_OP_ITE:
+                condition, then_literal, else_literal = children
+                return _negate(
+                    self._and(
+                        [
+                            _negate(self._and([condition, then_literal])),
+                            _negate(self._and([_negate(condition), else_literal])),
+                        ]
+                    )
+                )
+        raise ValueError(f"{expr.decl()} can't be converted to CNF")
+
+    def _and(self, literals: list[Literal]) -> Literal:
+        if any(literal is False for literal in literals):
+            return False
+        unique = list(dict.fromkeys(literal for literal in literals if literal is not True))
+        if any(-literal in unique for literal in set(unique)):
+            return False
+        if len(unique) <= 1:
+            return unique[0] if unique else True
+        variable = self.new_variable(None)
+        for literal in unique:
+            self.add_clause([-variable, literal])
+        self.add_clause([variable, *(-literal for literal in unique)])
+        return variable
+
+    def _equal(self, a: Literal, b: Literal) -> Literal:
+        if isinstance(a, bool):
+            return b if a else _negate(b)
+        if isinstance(b, bool):
+            return a if b else _negate(a)
+        if a == b or a == -b:
+            return a == b
+        variable = self.new_variable(None)
+        self.add_clause([-variable, -a, b])
+        self.add_clause([-variable, a, -b])
+        self.add_clause([variable, a, b])
+        self.add_clause([variable, -a, -b])
+        return variable
+
+
+def _negate(literal: Literal) -> Literal:
+    return not literal if isinstance(literal, bool) else -literal
+
+
+class DimacsWriter:
+    """Writes a CNF to a DIMACS file. The clauses are streamed to a temporary file
+    next to it, close writes the variable map, the header and copies them."""
+
+    def __init__(self, path: str | os.PathLike):
+        self.path = pathlib.Path(path)
+        self.variables: dict[str, int] = {}  # the named variables, for the variable map
+        self.num_variables = 0
+        self.num_clauses = 0
+        self._clauses = tempfile.TemporaryFile("w+", dir=self.path.parent, prefix=".clauses-")
+        self.encoder = TseitinEncoder(self.new_variable, self.add_clause)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def new_variable(self, name: str | None = None) -> int:
+        if name is not None and name in self.variables:
+            return self.variables[name]
+        self.num_variables += 1
+        if name is not None:
+            self.variables[name] = self.num_variables
+        return self.num_variables
+
+    def add_clause(self, literals: Iterable[int]):
+        self._clauses.write(" ".join(map(str, [*literals, 0])) + "\n")
+        self.num_clauses += 1
+
+    def add(self, formula: Z3BoolExpression):
+        self.encoder.add(formula)
+        self.encoder.clear_cache()
+
+    def close(self):
+        if self._clauses.closed:
+            return
+        with open(self.path, "w") as file:
+            for name, variable in self.variables.items():
+                file.write(f"c var {variable} {name}\n")
+            file.write(f"p cnf {self.num_variables} {self.num_clauses}\n")
+            self._clauses.seek(0)
+            shutil.copyfileobj(self._clauses, file)
+        self._clauses.close()
+
+
+class ClauseTemplate:
+    """The clauses of a TemplateRelation, the variables of the placeholder states are
+    renamed like TemplateRelation does, all other variables are new in every step."""
+
+    def __init__(self, relation: TemplateRelation):
+        self.names: list[str | None] = [None]  # of the variables 1, 2, ..., None for the helpers
+        self.clauses: list[list[int]] = []
+
+        def new_variable(name: str | None) -> int:
+            prefixes = (f"{TemplateRelation.PREFIX_A}_", f"{TemplateRelation.PREFIX_B}_")
+            self.names.append(name if name is not None and name.startswith(prefixes) else None)
+            return len(self.names) - 1
+
+        TseitinEncoder(new_variable, self.clauses.append).add(relation.formula)
+
+    def add_to(self, writer: DimacsWriter, state_a_index: int, state_b_index: int):
+        renames = {
+            f"{TemplateRelation.PREFIX_A}_": f"{state_a_index}_",
+            f"{TemplateRelation.PREFIX_B}_": f"{state_b_index}_",
+        }
+        variables = [0]
+        for name in self.names[1:]:
+            if name is not None:
+                prefix = next(p for p in renames if name.startswith(p))
+                name = renames[prefix] + name.removeprefix(prefix)
+            variables.append(writer.new_variable(name))
+        for clause in self.clauses:
+            writer.add_clause(
+                [variables[literal] if literal > 0 else -variables[-literal] for literal in clause]
+            )
+
+
+def _state(
+    index: int, variables: Sequence[str], location_encoding: transition_relation.LocationEncoding
+) -> StateVariable:
+    return StateVariable.init(
+        str(index), sat.BitVector.create_variable, variables, location_encoding.create_variable
+    )
+
+
+def write_unrolling(
+    program: Sequence[Instruction],
+    steps: int,
+    path: str | os.PathLike,
+    location: str = "binary",
+    cone: bool = False,
+) -> DimacsWriter:
+    """Writes I(s_0) and T(s_i, s_i+1) for all i < steps, like bmc.check_assertions for
+    the bound steps. If the program has ASSERTs, one of them has to fail in s_steps.
+
+    The formula is satisfiable iff a run of exactly steps steps (that ends at a failing
+    ASSERT) exists. Returns the closed writer, for the number of clauses."""
+
+    program = list(program)
+    variables = sorted(optimizer.cone_of_influence(program) if cone else optimizer.program_variables(program))
+    location_encoding = sat.get_location_encoding(
+        location, len(program) + 1, sat.BitVector, sat.get_operator_restriction
+    )
+    relation = transition_relation.get_transition_relation(
+        program, sat.BitVector, sat.get_operator_restriction, True, variables, location_encoding
+    )
+    template = ClauseTemplate(typing.cast(TemplateRelation, relation))
+
+    with DimacsWriter(path) as writer:
+        writer.add(
+            bmc.initial_state_formula(
+                _state(0, variables, location_encoding), sat.BitVector, location_encoding
+            )
+        )
+        for step in range(steps):
+            template.add_to(writer, step, step + 1)
+        if bmc.assertion_locations(program):
+            last_state = _state(steps, variables, location_encoding)
+            writer.add(
+                bmc.assertion_fails_formula(
+                    program, last_state, sat.BitVector, sat.get_operator_restriction, location_encoding
+                )
+            )
+    return writer
+
+
+def read_variable_map(file: Iterable[str]) -> dict[str, int]:
+    """Reads the variable map from the comments of a file written by DimacsWriter."""
+
+    variables = {}
+    for line in file:
+        if line.startswith("p "):
+            break
+        if line.startswith("c var "):
+            _, _, variable, name = line.split()
+            variables[name] = int(variable)
+    return variables
+
+
+def read_solution(file: Iterable[str]) -> set[int] | None:
+    """Reads the output of a SAT solver in the format of the SAT competition ("s" and
+    "v" lines), returns the variables that are true, or None if it is unsatisfiable."""
+
+    true_variables = set()
+    for line in file:
+        match line.split():
+            case ["s", "UNSATISFIABLE"]:
+                return None
+            case ["v", *literals]:
+                true_variables.update(int(literal) for literal in literals if int(literal) > 0)
+    return true_variables
+
+
+class _SolutionModel:
+    # evaluates the named variables like a z3.ModelRef, so bmc.decode_state can be used
+
+    def __init__(self, variables: dict[str, int], true_variables: set[int]):
+        self.variables = variables
+        self.true_variables = true_variables
+
+    def eval(self, expr: z3.BoolRef, model_completion: bool = False) -> z3.BoolRef:
+        return z3.BoolVal(self.variables.get(expr.decl().name()) in self.true_variables)
+
+
+def decode_trace(
+    program: Sequence[Instruction],
+    steps: int,
+    variables: dict[str, int],
+    true_variables: set[int],
+    location: str = "binary",
+    cone: bool = False,
+) -> list[State]:
+    """Decodes the solution of a formula of write_unrolling (with the same arguments)
+    into the states s_0, ..., s_steps."""
+
+    program = list(program)
+    state_variables = sorted(
+        optimizer.cone_of_influence(program) if cone else optimizer.program_variables(program)
+    )
+    location_encoding = sat.get_location_encoding(
+        location, len(program) + 1, sat.BitVector, sat.get_operator_restriction
+    )
+    model = typing.cast(z3.ModelRef, _SolutionModel(variables, true_variables))
+    return [
+        bmc.decode_state(
+            model, _state(i, state_variables, location_encoding), sat.BitVector, location_encoding
+        )
+        for i in range(steps + 1)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Write the SAT encoding of a WHILE program unrolled for a number of steps as DIMACS CNF."
+    )
+    parser.add_argument("input_file", help="The input file containing the WHILE program.")
+    parser.add_argument("steps", type=int, help="The number of steps.")
+    parser.add_argument("output_file", help="The DIMACS file.")
+    parser.add_argument(
+        "--solution",
+        help="Don't write the file, decode the output of a SAT solver for it into a trace instead.",
+    )
+    parser.add_argument(
+        "--location",
+        choices=["arithmetic", *sat.LOCATION_ENCODINGS],
+        default="binary",
+        help="The encoding of the program counter (default: binary).",
+    )
+    parser.add_argument(
+        "--cone",
+        action="store_true",
+        help="Only encode the variables that influence the ASSERTs and branches (cone of influence).",
+    )
+    parser.add_argument(
+        "-O", "--optimize", action="store_true", help="Optimize the program before encoding it."
+    )
+    parser.add_argument(
+        "--cache", action="store_true", help="Cache the parsed and optimized program on disk."
+    )
+
+    args = parser.parse_args()
+
+    with open(args.input_file) as file:
+        source = file.read().splitlines()
+    cache = program_cache.ProgramCache() if args.cache else None
+    program = program_cache.load_program(source, optimizer.DEFAULT_PASSES if args.optimize else (), cache)
+
+    if args.solution is None:
+        writer = write_unrolling(program, args.steps, args.output_file, args.location, args.cone)
+        print(f"Wrote {writer.num_variables} variables and {writer.num_clauses} clauses.")
+        return
+
+    with open(args.output_file) as file:
+        variables = read_variable_map(file)
+    with open(args.solution) as file:
+        true_variables = read_solution(file)
+    if true_variables is None:
+        print("The formula is unsatisfiable.")
+        return
+    for state in decode_trace(program, args.steps, variables, true_variables, args.location, args.cone):
+        print(f"    {state}")
+
+
+if __name__ == "__main__":
+    main()
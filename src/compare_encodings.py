@@ -1,14 +1,22 @@
 import z3
 import argparse
+import time
 from transition_relation import OperatorRestrictionGetter, IntEncoding
-from typing import Type
+from typing import Iterable, Type
+from while_parsing import Instruction
+from util import Z3BoolExpression
 import transition_relation
-import while_parsing
+import optimizer
+import acceleration
+import program_cache
 import smt
 import sat
+import bmc
 
 
-def count_ast_nodes(expr: z3.ExprRef) -> int:
+def count_ast_nodes(expr: Z3BoolExpression | z3.ExprRef) -> int:
+    if not isinstance(expr, z3.ExprRef):
+        return 1  # a python bool
     return 1 + sum(map(count_ast_nodes, expr.children()))
 
 
@@ -25,15 +33,40 @@ def handle_encoding[
     operater_func: OperatorRestrictionGetter[T],
     while_filename: str,
     smtlib_filename: str | None = None,
+    optimize: bool = False,
+    accelerate: bool = False,
+    cache: program_cache.ProgramCache | None = None,
+    cone: bool = False,
+    location: str = "arithmetic",
+    compare_steps: int | None = None,
 ):
 
     with open(while_filename) as file:
         source = file.read().splitlines()
-    program = list(while_parsing.parse_program(source))
+    passes = [
+        *(optimizer.DEFAULT_PASSES if optimize else ()),
+        *([acceleration.accelerate_loops] if accelerate else ()),
+    ]
+    program = program_cache.load_program(source, passes, cache)
+
+    variables = optimizer.cone_of_influence(program) if cone else None
+    if compare_steps is not None:
+        print(f"Comparing the location encodings for {name} with {compare_steps} steps.")
+        print("=" * 80)
+        print(f"{'location':<12}{'AST nodes':>12}{'solve time':>12}  result")
+        for location_name in ["arithmetic", *sat.LOCATION_ENCODINGS]:
+            nodes, seconds, result = compare_location_encoding(
+                program, int_encoding, operater_func, location_name, compare_steps, variables
+            )
+            print(f"{location_name:<12}{nodes:>12}{seconds:>11.3f}s  {result}")
+        return
 
     print(f"Generating {name} encoding for 1 step.")
     print("=" * 80)
-    T = transition_relation.get_transition_relation(program, int_encoding, operater_func)
+    location_encoding = sat.get_location_encoding(location, len(program) + 1, int_encoding, operater_func)
+    T = transition_relation.get_transition_relation(
+        program, int_encoding, operater_func, variables=variables, location_encoding=location_encoding
+    )
     one_step = T(0, 1)
     print(one_step)
     print(f"AST nodes: {count_ast_nodes(one_step)}")
@@ -43,6 +76,40 @@ def handle_encoding[
             smtlib_file.write(to_smt2_benchmark(one_step))
 
 
+def compare_location_encoding[
+    T: IntEncoding
+](
+    program: list[Instruction],
+    int_encoding: Type[T],
+    operater_func: OperatorRestrictionGetter[T],
+    location_name: str,
+    steps: int,
+    variables: Iterable[str] | None = None,
+) -> tuple[int, float, z3.CheckSatResult]:
+    # The size of one step and the time z3 needs to decide if the end of the program can be
+    # reached in at most the given number of steps.
+    variables = sorted(optimizer.program_variables(program) if variables is None else variables)
+    location_encoding = sat.get_location_encoding(
+        location_name, len(program) + 1, int_encoding, operater_func
+    )
+    T = transition_relation.get_transition_relation(
+        program, int_encoding, operater_func, True, variables, location_encoding
+    )
+    states = [
+        transition_relation.StateVariable.init(
+            str(i), int_encoding.create_variable, variables, location_encoding.create_variable
+        )
+        for i in range(steps + 1)
+    ]
+    solver = z3.Solver()
+    solver.add(bmc.initial_state_formula(states[0], int_encoding, location_encoding))
+    solver.add(*(T(i, i + 1) for i in range(steps)))
+    solver.add(z3.Or([location_encoding.at(state.location, len(program)) for state in states]))
+    start = time.perf_counter()
+    result = solver.check()
+    return count_ast_nodes(T(0, 1)), time.perf_counter() - start, result
+
+
 def main():
     parser = argparse.ArgumentParser(description="Generate encodings for a given WHILE program.")
     parser.add_argument("input_file", help="The input file containing the WHILE program.")
@@ -52,12 +119,52 @@ def main():
     parser.add_argument(
         "--smtlib", type=str, help="Write the resulting formula in SMT-LIB2 format to a file."
     )
+    parser.add_argument(
+        "-O", "--optimize", action="store_true", help="Optimize the program before encoding it."
+    )
+    parser.add_argument(
+        "--accelerate",
+        action="store_true",
+        help="Encode simple counting loops as a single transition (not supported for SAT).",
+    )
+    parser.add_argument(
+        "--cache", action="store_true", help="Cache the parsed and optimized program on disk."
+    )
+    parser.add_argument(
+        "--cone",
+        action="store_true",
+        help="Only encode the variables that influence the control flow (cone of influence).",
+    )
+
+    parser.add_argument(
+        "--location",
+        choices=["arithmetic", *sat.LOCATION_ENCODINGS],
+        default="arithmetic",
+        help="The encoding of the program counter (default: arithmetic, like the values).",
+    )
+    parser.add_argument(
+        "--compare-locations",
+        type=int,
+        metavar="STEPS",
+        help="Compare the size and solve time of all location encodings for the given number of steps.",
+    )
 
     args = parser.parse_args()
+    cache = program_cache.ProgramCache() if args.cache else None
+    encoding_args = (
+        args.input_file,
+        args.smtlib,
+        args.optimize,
+        args.accelerate,
+        cache,
+        args.cone,
+        args.location,
+        args.compare_locations,
+    )
     if args.smt:
-        handle_encoding("SMT", smt.Z3Int, smt.get_operator_restriction, args.input_file, args.smtlib)
+        handle_encoding("SMT", smt.Z3Int, smt.get_operator_restriction, *encoding_args)
     if args.sat:
-        handle_encoding("SAT", sat.BitVector, sat.get_operator_restriction, args.input_file, args.smtlib)
+        handle_encoding("SAT", sat.BitVector, sat.get_operator_restriction, *encoding_args)
 
 
 if __name__ == "__main__":
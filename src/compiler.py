@@ -0,0 +1,168 @@
+# Compiles parsed WHILE programs into threaded python code
+#
+# Every instruction is turned into a small generated python function that already
+# knows the register index of its variables, its constants and the absolute
+# address of its successor. Running the program is then a tight loop of
+#
+#     program_counter = code[program_counter](registers, io)
+#
+# without any pattern matching or name lookups. The results are the same as with
+# while_parsing.run_program, but the whole program has to be known in advance, so
+# this can't be used for the interactive shell.
+
+from collections.abc import Callable, Iterable
+from typing import NamedTuple
+import operator
+import typing
+
+from while_parsing import Instruction, InstructionType, Operator, ResolvedInstruction, SlotTable, LoopSummary
+import while_parsing
+from profiler import Profile
+
+
+class IO(NamedTuple):
+    get_input: Callable[[str], int]
+    output: Callable[[str], None]
+
+
+type Step = Callable[[list[int], IO], int]
+
+
+# Builtin equivalents of the operator lambdas in while_parsing.OPERATORS, calling them
+# skips a python stack frame. Operators that are not listed here use their lambda.
+NATIVE_OPERATORS: dict[str, Callable[..., typing.Any]] = {
+    "--": operator.neg,
+    "<": operator.lt,
+    "<=": operator.le,
+    "==": operator.eq,
+    ">=": operator.ge,
+    ">": operator.gt,
+    "!=": operator.ne,
+    "AND": operator.mul,
+    "+": operator.add,
+    "-": operator.sub,
+    "*": operator.mul,
+    "/": operator.floordiv,
+    "%": operator.mod,
+    "^": operator.pow,
+}
+
+
+class CompiledProgram(NamedTuple):
+    code: tuple[Step, ...]
+    slots: SlotTable
+
+    def run(
+        self, input_function=input, output_function=print, profile: Profile | None = None
+    ) -> dict[str, int]:
+        """Executes the compiled program and returns the variables that were assigned.
+
+        If profile is given, the executed instructions and jumps are counted in it."""
+
+        def get_input(var: str) -> int:
+            while True:
+                try:
+                    return int(input_function(f"Please enter the value of {var}: "))
+                except ValueError:
+                    output_function("Invalid input.")
+
+        io = IO(get_input, output_function)
+        code = self.code
+        end = len(code)
+        num_slots = len(self.slots.operands)
+        # registers[i] is the value of slot i, registers[num_slots + i] is set once
+        # slot i was assigned
+        registers = self.slots.initial_registers() + [0] * num_slots
+
+        program_counter = 0
+        if profile is None:
+            while program_counter < end:
+                program_counter = code[program_counter](registers, io)
+        else:
+            executions, jumps = profile.resize(end)
+            while program_counter < end:
+                executions[program_counter] += 1
+                next_counter = code[program_counter](registers, io)
+                if next_counter != program_counter + 1:
+                    jumps[program_counter] += 1
+                program_counter = next_counter
+
+        return {
+            typing.cast(str, operand): registers[i]
+            for i, operand in enumerate(self.slots.operands)
+            if registers[num_slots + i]
+        }
+
+
+def compile_program(program: Iterable[Instruction]) -> CompiledProgram:
+    """Translates the instructions into one python function each.
+
+    The functions take the register file and the IO callbacks and return the
+    absolute address of the next instruction."""
+
+    slots = SlotTable()
+    resolved_program = list(while_parsing.resolve_program(program, slots))
+
+    namespace: dict[str, object] = {}
+    source = "\n".join(
+        _compile_instruction(instruction, location, slots, namespace)
+        for location, instruction in enumerate(resolved_program)
+    )
+    exec(source, namespace)
+    code = tuple(namespace[f"step_{location}"] for location in range(len(resolved_program)))
+    return CompiledProgram(code, slots)  # type: ignore[arg-type]
+
+
+def _compile_instruction(
+    instruction: ResolvedInstruction, location: int, slots: SlotTable, namespace: dict[str, object]
+) -> str:
+    # returns the source code of the function step_{location}
+
+    def operand(slot: int) -> str:
+        # constants are inlined, that is faster than reading their register
+        return repr(slots.operands[slot]) if slots.is_constant(slot) else f"r[{slot}]"
+
+    def expression(op: Operator, args) -> str:
+        if op.name == "ID":
+            return operand(args[0])
+        op_name = f"op_{location}"
+        namespace[op_name] = NATIVE_OPERATORS.get(op.name, op.f)
+        return f"{op_name}({', '.join(map(operand, args))})"
+
+    def assign(slot: int, value: str) -> str:
+        return f"    r[{slot}] = {value}\n    r[{len(slots.operands) + slot}] = 1\n"
+
+    header = f"def step_{location}(r, io):\n"
+    match instruction:
+        case (InstructionType.SET_VAR, (int(x), Operator() as op, *args)):
+            return header + assign(x, expression(op, args)) + f"    return {location + 1}\n"
+        case (InstructionType.JUMP_IF_NOT, (Operator() as op, *args, int(jump_distance))):
+            return header + (
+                f"    return {location + 1} if {expression(op, args)} else {location + jump_distance}\n"
+            )
+        case (InstructionType.JUMP, (int(jump_distance),)):
+            return header + f"    return {location + jump_distance}\n"
+        case (InstructionType.INPUT, (int(x),)):
+            return header + assign(x, f"io.get_input({slots.operands[x]!r})") + f"    return {location + 1}\n"
+        case (InstructionType.OUTPUT, (int(x),)):
+            return header + f"    io.output(str({operand(x)}))\n    return {location + 1}\n"
+        case (InstructionType.ASSERT, (Operator() as op, *args)):
+            return header + (
+                f"    if not {expression(op, args)}:\n"
+                f"        raise AssertionError('Assertion at instruction {location} failed')\n"
+                f"    return {location + 1}\n"
+            )
+        case (InstructionType.ACCELERATED_LOOP, (LoopSummary() as summary, int(exit_distance))):
+            namespace[f"loop_{location}"] = summary
+            updates = "".join(
+                f"        r[{x}] += n * {delta}\n        r[{len(slots.operands) + x}] = 1\n"
+                for x, delta in summary.updates
+            )
+            return header + (
+                f"    n = loop_{location}.iterations({operand(summary.counter)}, {operand(summary.bound)})\n"
+                f"    if n is None:\n        return {location}\n"  # the loop never terminates
+                f"    if n:\n{updates or '        pass\n'}"
+                f"    return {location + exit_distance}\n"
+            )
+        case _:
+            raise ValueError(f"Invalid instruction: {instruction}")
@@ -0,0 +1,246 @@
+# Interval domain for the values of the unroller
+#
+# Without it, transition_system only knows concrete values and None for values that
+# depend on an input, so every condition on an input forks the state. With intervals,
+# a value is an int, an Interval or None, which is the interval of all integers.
+# Conditions are evaluated on the intervals and the branches refine them, e.g. after
+#
+#     INPUT x
+#     IF x < 0 THEN
+#
+# x is [-inf,-1] in the THEN branch and [0,inf] in the ELSE branch, and a second
+# IF x < 0 in the ELSE branch only has one successor.
+
+from collections.abc import Callable, Sequence
+from typing import NamedTuple
+import math
+
+
+class Interval(NamedTuple):
+    # the bounds are included, they are ints or -inf/inf
+    low: int | float
+    high: int | float
+
+    def __contains__(self, value) -> bool:
+        return self.low <= value <= self.high
+
+    def contains(self, other: "Interval") -> bool:
+        return self.low <= other.low and other.high <= self.high
+
+    def intersect(self, other: "Interval") -> "Interval | None":
+        low, high = max(self.low, other.low), min(self.high, other.high)
+        return Interval(low, high) if low <= high else None
+
+    def hull(self, other: "Interval") -> "Interval":
+        return Interval(min(self.low, other.low), max(self.high, other.high))
+
+    def __str__(self):
+        return f"[{self.low},{self.high}]"
+
+    @classmethod
+    def from_string(cls, interval_str: str) -> "Interval":
+        low, high = interval_str.strip()[1:-1].split(",")
+        return cls(*(int(bound) if bound.lstrip("-").isdigit() else float(bound) for bound in (low, high)))
+
+
+type Value = int | Interval | None
+type Getter = Callable[[str | int], Value]
+
+TOP = Interval(-math.inf, math.inf)
+FALSE = Interval(0, 0)
+TRUE = Interval(1, 1)
+BOOL = Interval(0, 1)
+
+
+def to_interval(value: Value) -> Interval:
+    match value:
+        case None:
+            return TOP
+        case Interval():
+            return value
+    return Interval(int(value), int(value))
+
+
+def to_value(interval: Interval) -> Value:
+    # the inverse of to_interval, so equal values have the same representation
+    if interval == TOP:
+        return None
+    if interval.low == interval.high:
+        return int(interval.low)
+    return interval
+
+
+def contains(value: Value, other: Value) -> bool:
+    return to_interval(value).contains(to_interval(other))
+
+
+def _mul(a: int | float, b: int | float) -> int | float:
+    return 0 if a == 0 or b == 0 else a * b  # 0 * inf is 0, not nan
+
+
+def _multiply(a: Interval, b: Interval) -> Interval:
+    products = [_mul(x, y) for x in a for y in b]
+    return Interval(min(products), max(products))
+
+
+def _floor_divide(a: int | float, b: int | float) -> int | float:
+    # a // b for b != 0, with the limits for infinite bounds (inf // 2 would be nan)
+    if math.isinf(a):
+        return a if b > 0 else -a
+    if math.isinf(b):
+        return 0 if a == 0 or (a > 0) == (b > 0) else -1
+    return int(a) // int(b)
+
+
+def _divide(a: Interval, b: Interval) -> Interval:
+    if 0 in b:
+        return TOP
+    # for a fixed sign of b, a // b is monotone in both arguments
+    quotients = [_floor_divide(x, y) for x in a for y in b]
+    return Interval(min(quotients), max(quotients))
+
+
+def _power(a: Interval, b: Interval) -> Interval:
+    if b.low != b.high or b.low < 0:
+        return TOP
+    k = int(b.low)
+    if k == 0:
+        return TRUE
+    if k % 2:  # monotone
+        return Interval(a.low**k, a.high**k)
+    smallest = 0 if 0 in a else min(abs(a.low), abs(a.high))
+    return Interval(smallest**k, max(abs(a.low), abs(a.high)) ** k)
+
+
+def _modulo(a: Interval, b: Interval) -> Interval:
+    # python's % has the sign of the divisor
+    if b.low > 0:
+        return a if 0 <= a.low and a.high < b.low else Interval(0, b.high - 1)
+    if b.high < 0:
+        return Interval(b.low + 1, 0)
+    return TOP
+
+
+def _truth(a: Interval) -> Interval:
+    if a == FALSE:
+        return FALSE
+    return BOOL if 0 in a else TRUE
+
+
+def _compare(always: bool, never: bool) -> Interval:
+    return TRUE if always else FALSE if never else BOOL
+
+
+INTERVAL_OPERATORS: dict[str, Callable[..., Interval]] = {
+    "NOT": lambda a: Interval(1 - _truth(a).high, 1 - _truth(a).low),
+    "--": lambda a: Interval(-a.high, -a.low),
+    "ID": lambda a: a,
+    "<": lambda a, b: _compare(a.high < b.low, a.low >= b.high),
+    "<=": lambda a, b: _compare(a.high <= b.low, a.low > b.high),
+    ">=": lambda a, b: _compare(a.low >= b.high, a.high < b.low),
+    ">": lambda a, b: _compare(a.low > b.high, a.high <= b.low),
+    "==": lambda a, b: _compare(a.low == a.high == b.low == b.high, a.intersect(b) is None),
+    "!=": lambda a, b: _compare(a.intersect(b) is None, a.low == a.high == b.low == b.high),
+    "AND": _multiply,
+    "OR": lambda a, b: a if 0 not in a else b if a == FALSE else a.hull(b),
+    "+": lambda a, b: Interval(a.low + b.low, a.high + b.high),
+    "-": lambda a, b: Interval(a.low - b.high, a.high - b.low),
+    "*": _multiply,
+    "/": _divide,
+    "%": _modulo,
+    "^": _power,
+    "ALL": lambda *args: _compare(all(0 not in a for a in args), FALSE in args),
+    "ANY": lambda *args: _compare(any(0 not in a for a in args), all(a == FALSE for a in args)),
+    "SUM": lambda *args: Interval(sum(a.low for a in args), sum(a.high for a in args)),
+}
+
+
+def evaluate(op_name: str, args: Sequence[str | int], get: Getter) -> Value:
+    """Returns the interval of the results of the operator for the values of the args.
+
+    Operators without an interval version return the interval of all integers."""
+
+    if op_name == "*" and len(args) == 2 and args[0] == args[1] and isinstance(args[0], str):
+        op_name, args = "^", [args[0], 2]  # x * x is never negative
+    if op_name not in INTERVAL_OPERATORS:
+        return None
+    return to_value(INTERVAL_OPERATORS[op_name](*(to_interval(get(arg)) for arg in args)))
+
+
+# refining conditions: for every comparison, the intervals that the arguments can
+# have if it holds
+def _refine_less(a: Interval, b: Interval, strict: bool):
+    gap = 1 if strict else 0
+    return Interval(a.low, min(a.high, b.high - gap)), Interval(max(b.low, a.low + gap), b.high)
+
+
+def _refine_greater(a: Interval, b: Interval, strict: bool):
+    b, a = _refine_less(b, a, strict)
+    return a, b
+
+
+def _refine_equal(a: Interval, b: Interval):
+    both = a.intersect(b) or Interval(1, 0)
+    return both, both
+
+
+def _refine_not_equal(a: Interval, b: Interval):
+    def exclude(a: Interval, value: int | float) -> Interval:
+        if a.low == value:
+            return Interval(a.low + 1, a.high)
+        if a.high == value:
+            return Interval(a.low, a.high - 1)
+        return a
+
+    if b.low == b.high:
+        a = exclude(a, b.low)
+    if a.low == a.high:
+        b = exclude(b, a.low)
+    return a, b
+
+
+COMPARISON_REFINEMENTS: dict[str, Callable[[Interval, Interval], tuple[Interval, Interval]]] = {
+    "<": lambda a, b: _refine_less(a, b, strict=True),
+    "<=": lambda a, b: _refine_less(a, b, strict=False),
+    ">": lambda a, b: _refine_greater(a, b, strict=True),
+    ">=": lambda a, b: _refine_greater(a, b, strict=False),
+    "==": _refine_equal,
+    "!=": _refine_not_equal,
+}
+NEGATED_COMPARISONS = {"<": ">=", "<=": ">", ">": "<=", ">=": "<", "==": "!=", "!=": "=="}
+
+
+def refine(op_name: str, args: Sequence[str | int], get: Getter, holds: bool) -> dict[str, Value] | None:
+    """Returns the new values of the variables in args if the condition holds (or not).
+
+    Returns None if that is impossible, i.e. the branch is infeasible."""
+
+    condition = to_interval(evaluate(op_name, args, get))
+    if condition == FALSE if holds else 0 not in condition:
+        return None
+
+    # the arguments that have to be nonzero (holds) or zero (not holds)
+    match op_name, holds:
+        case ("NOT", _):
+            conditions = [("!=" if not holds else "==", arg, 0) for arg in args]
+        case ("ID" | "AND" | "ALL", True) | ("ID" | "OR" | "ANY", False):
+            conditions = [("!=" if holds else "==", arg, 0) for arg in args]
+        case (op_name, _) if op_name in COMPARISON_REFINEMENTS:
+            a, b = args
+            conditions = [(op_name if holds else NEGATED_COMPARISONS[op_name], a, b)]
+        case _:
+            return {}
+
+    refined: dict[str, Interval] = {}
+
+    def current(arg: str | int) -> Interval:
+        return refined[arg] if isinstance(arg, str) and arg in refined else to_interval(get(arg))
+
+    for comparison, a, b in conditions:
+        for arg, interval in zip((a, b), COMPARISON_REFINEMENTS[comparison](current(a), current(b))):
+            interval = interval.intersect(current(arg))
+            if interval is None:
+                return None
+            if isinstance(arg, str):
+                refined[arg] = interval
+    return {var: to_value(interval) for var, interval in refined.items()}
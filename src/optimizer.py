@@ -0,0 +1,409 @@
+# Optimization passes for parsed WHILE programs
+#
+# A pass takes the instruction list and returns a new one together with the number
+# of instructions it rewrote in place. optimize runs a pipeline of passes until
+# none of them changes anything anymore and reports what each pass did.
+#
+# The passes keep the OUTPUT behaviour of a program, but not necessarily its final
+# variables: assignments to variables that are never read again are removed.
+# Instructions that may raise an error (division by zero, ASSERT) are never removed,
+# unless they can't fail.
+
+from collections.abc import Callable, Iterable, Sequence
+from typing import NamedTuple
+import collections
+import sys
+import typing
+
+from while_parsing import Instruction, InstructionType, Operator, LoopSummary, OPERATORS
+
+type Pass = Callable[[list[Instruction]], tuple[list[Instruction], int]]
+
+
+class PassReport(NamedTuple):
+    name: str
+    round: int
+    removed: int  # number of removed instructions
+    rewritten: int  # number of instructions that were changed in place
+
+    def __str__(self):
+        return f"round {self.round}, {self.name}: removed {self.removed}, rewritten {self.rewritten}"
+
+
+# these can raise errors at runtime, so they can't be removed even if their result is unused
+MAY_RAISE = frozenset(["/", "%", "^"])
+
+
+JUMP_INSTRUCTIONS = (InstructionType.JUMP_IF_NOT, InstructionType.JUMP, InstructionType.ACCELERATED_LOOP)
+
+
+def jump_target(instruction: Instruction, location: int) -> int | None:
+    # for all instructions that have a target, it is the last argument
+    if instruction.instruction_type in JUMP_INSTRUCTIONS:
+        return location + typing.cast(int, instruction.args[-1])
+    return None
+
+
+def with_jump_target(instruction: Instruction, location: int, target: int) -> Instruction:
+    instruction_type, (*args, _) = instruction
+    return Instruction(instruction_type, (*args, target - location))
+
+
+def successors(instruction: Instruction, location: int) -> tuple[int, ...]:
+    match instruction:
+        case (InstructionType.JUMP, (int(jump_distance),)):
+            return (location + jump_distance,)
+        case (InstructionType.JUMP_IF_NOT, (*_, int(jump_distance))):
+            return (location + 1, location + jump_distance)
+        case (InstructionType.ACCELERATED_LOOP, (_, int(exit_distance))):
+            # loops that never terminate stay at their location
+            return (location, location + exit_distance)
+    return (location + 1,)
+
+
+def defined_variables(instruction: Instruction) -> frozenset[str]:
+    match instruction:
+        case (InstructionType.SET_VAR | InstructionType.INPUT, (str(var), *_)):
+            return frozenset([var])
+        case (InstructionType.ACCELERATED_LOOP, (LoopSummary() as summary, _)):
+            return frozenset(var for var, _ in summary.updates)
+    return frozenset()
+
+
+def used_variables(instruction: Instruction) -> frozenset[str]:
+    match instruction:
+        case (InstructionType.SET_VAR, (_, _, *args)):
+            return frozenset(arg for arg in args if isinstance(arg, str))
+        case (InstructionType.JUMP_IF_NOT, (_, *args, _)) | (InstructionType.OUTPUT, args):
+            return frozenset(arg for arg in args if isinstance(arg, str))
+        case (InstructionType.ASSERT, (_, *args)):
+            return frozenset(arg for arg in args if isinstance(arg, str))
+        case (InstructionType.ACCELERATED_LOOP, (LoopSummary() as summary, _)):
+            args = (summary.counter, summary.bound, *(var for var, _ in summary.updates))
+            return frozenset(arg for arg in args if isinstance(arg, str))
+    return frozenset()
+
+
+def program_variables(program: Iterable[Instruction]) -> set[str]:
+    variables: set[str] = set()
+    for instruction in program:
+        variables |= defined_variables(instruction) | used_variables(instruction)
+    return variables
+
+
+def cone_of_influence(program: Iterable[Instruction], variables: Iterable[str] = ()) -> frozenset[str]:
+    """Returns the variables that the given variables or the control flow depend on.
+
+    The other variables are never used to decide a branch or an ASSERT, or to compute
+    a variable that is, so they can be left out when only the reachable locations
+    and the given variables matter."""
+
+    dependencies: dict[str, set[str]] = collections.defaultdict(set)
+    cone = set(variables)
+    for instruction in program:
+        match instruction:
+            case Instruction(InstructionType.JUMP_IF_NOT | InstructionType.ASSERT, _):
+                cone |= used_variables(instruction)
+            case Instruction(InstructionType.ACCELERATED_LOOP, (LoopSummary() as summary, _)):
+                # the number of iterations decides when the loop exits
+                cone |= {arg for arg in (summary.counter, summary.bound) if isinstance(arg, str)}
+        for var in defined_variables(instruction):
+            dependencies[var] |= used_variables(instruction)
+
+    stack = list(cone)
+    while stack:
+        for dependency in dependencies[stack.pop()] - cone:
+            cone.add(dependency)
+            stack.append(dependency)
+    return frozenset(cone)
+
+
+def live_variables(program: Sequence[Instruction]) -> list[frozenset[str]]:
+    """Returns the variables that may be read before being written, for every location.
+
+    The last entry belongs to the end of the program, where no variable is live."""
+
+    live: list[frozenset[str]] = [frozenset()] * (len(program) + 1)
+    changed = True
+    while changed:
+        changed = False
+        for location in reversed(range(len(program))):
+            instruction = program[location]
+            live_out = frozenset().union(
+                *(live[min(s, len(program))] for s in successors(instruction, location))
+            )
+            live_in = (live_out - defined_variables(instruction)) | used_variables(instruction)
+            if live_in != live[location]:
+                live[location] = live_in
+                changed = True
+    return live
+
+
+def remove_instructions(program: Sequence[Instruction], removed: Iterable[int]) -> list[Instruction]:
+    """Removes the instructions at the given locations and fixes all jump distances.
+
+    Jumps to a removed instruction go to the next instruction that is kept, so only
+    instructions that don't change the state or are never executed can be removed."""
+
+    removed = set(removed)
+    new_locations = []
+    num_kept = 0
+    for location in range(len(program) + 1):
+        new_locations.append(num_kept)
+        if location not in removed:
+            num_kept += 1
+
+    new_program = []
+    for location, instruction in enumerate(program):
+        if location in removed:
+            continue
+        if (target := jump_target(instruction, location)) is not None:
+            target = new_locations[min(max(target, 0), len(program))]
+            instruction = with_jump_target(instruction, new_locations[location], target)
+        new_program.append(instruction)
+    return new_program
+
+
+# Constant propagation: for every location, we compute which variables have a known
+# value. Missing variables are 0 and None means that the value is not known.
+type Environment = dict[str, int | None]
+
+
+def _evaluate(op: Operator, args: Sequence, environment: Environment) -> int | None:
+    values = [environment.get(arg, 0) if isinstance(arg, str) else arg for arg in args]
+    if None in values:
+        return None
+    try:
+        return op.f(*typing.cast(list[int], values))
+    except (ArithmeticError, ValueError):
+        return None  # the error has to happen at runtime
+
+
+def _assign(environment: Environment, var: str, value: int | None) -> Environment:
+    environment = environment.copy()
+    if value == 0:
+        environment.pop(var, None)
+    else:
+        environment[var] = value
+    return environment
+
+
+def _join(a: Environment, b: Environment) -> Environment:
+    joined: Environment = {}
+    for var in a.keys() | b.keys():
+        a_value, b_value = a.get(var, 0), b.get(var, 0)
+        joined[var] = a_value if a_value is not None and a_value == b_value else None
+    return {var: value for var, value in joined.items() if value != 0}
+
+
+def _transfer(instruction: Instruction, location: int, environment: Environment):
+    match instruction:
+        case (InstructionType.SET_VAR, (str(var), Operator() as op, *args)):
+            return [(location + 1, _assign(environment, var, _evaluate(op, args, environment)))]
+        case (InstructionType.JUMP_IF_NOT, (Operator() as op, *args, int(jump_distance))):
+            condition = _evaluate(op, args, environment)
+            if condition is None:
+                return [(location + 1, environment), (location + jump_distance, environment)]
+            return [(location + 1 if condition else location + jump_distance, environment)]
+        case (InstructionType.JUMP, (int(jump_distance),)):
+            return [(location + jump_distance, environment)]
+        case (InstructionType.INPUT, (str(var),)):
+            return [(location + 1, _assign(environment, var, None))]
+        case (InstructionType.ACCELERATED_LOOP, (LoopSummary() as summary, int(exit_distance))):
+            counter, bound = (
+                _evaluate(OPERATORS["ID"], (arg,), environment) for arg in (summary.counter, summary.bound)
+            )
+            iterations = None if counter is None or bound is None else summary.iterations(counter, bound)
+            if iterations is None:
+                # the values after the loop are unknown (or the loop never terminates)
+                for var, _ in summary.updates:
+                    environment = _assign(environment, var, None)
+            else:
+                for var, delta in summary.updates:
+                    value = environment.get(var, 0)
+                    environment = _assign(
+                        environment, var, None if value is None else value + iterations * delta
+                    )
+            return [(location + exit_distance, environment)]
+        case _:
+            return [(location + 1, environment)]
+
+
+def constant_environments(program: Sequence[Instruction]) -> list[Environment | None]:
+    """Returns the known variable values before every location, None for unreachable ones."""
+
+    environments: list[Environment | None] = [None] * (len(program) + 1)
+    environments[0] = {}
+    worklist = [0]
+    while worklist:
+        location = worklist.pop()
+        environment = environments[location]
+        if location >= len(program) or environment is None:
+            continue
+        for successor, new_environment in _transfer(program[location], location, environment):
+            successor = min(successor, len(program))
+            old_environment = environments[successor]
+            if old_environment is not None:
+                new_environment = _join(old_environment, new_environment)
+            if new_environment != old_environment:
+                environments[successor] = new_environment
+                worklist.append(successor)
+    return environments
+
+
+def propagate_constants(program: list[Instruction]) -> tuple[list[Instruction], int]:
+    """Replaces variables with known values by constants and folds constant expressions.
+
+    Branches with a constant condition become unconditional."""
+
+    environments = constant_environments(program)
+    new_program = list(program)
+    removed = []
+
+    def substitute(args: Sequence, environment: Environment) -> tuple:
+        return tuple(
+            environment.get(arg, 0) if isinstance(arg, str) and environment.get(arg, 0) is not None else arg
+            for arg in args
+        )
+
+    for location, instruction in enumerate(program):
+        environment = environments[location]
+        if environment is None:
+            continue  # unreachable, this is handled by remove_unreachable
+        match instruction:
+            case (InstructionType.SET_VAR, (str(var), Operator() as op, *args)):
+                value = _evaluate(op, args, environment)
+                if value is not None:
+                    new_program[location] = Instruction(
+                        InstructionType.SET_VAR, (var, OPERATORS["ID"], value)
+                    )
+                else:
+                    new_program[location] = Instruction(
+                        InstructionType.SET_VAR, (var, op, *substitute(args, environment))
+                    )
+            case (InstructionType.JUMP_IF_NOT, (Operator() as op, *args, int(jump_distance))):
+                condition = _evaluate(op, args, environment)
+                if condition is None:
+                    new_args = (op, *substitute(args, environment), jump_distance)
+                    new_program[location] = Instruction(InstructionType.JUMP_IF_NOT, new_args)
+                elif condition:
+                    removed.append(location)
+                else:
+                    new_program[location] = Instruction(InstructionType.JUMP, (jump_distance,))
+            case (InstructionType.OUTPUT, args):
+                new_program[location] = Instruction(InstructionType.OUTPUT, substitute(args, environment))
+            case (InstructionType.ASSERT, (Operator() as op, *args)):
+                if _evaluate(op, args, environment):
+                    removed.append(location)  # the assertion always holds
+                else:
+                    new_program[location] = Instruction(
+                        InstructionType.ASSERT, (op, *substitute(args, environment))
+                    )
+
+    rewritten = sum(
+        old != new for location, (old, new) in enumerate(zip(program, new_program)) if location not in removed
+    )
+    return remove_instructions(new_program, removed), rewritten
+
+
+def thread_jumps(program: list[Instruction]) -> tuple[list[Instruction], int]:
+    """Lets jumps to a JUMP go to its target directly and removes jumps to the next instruction."""
+
+    def final_target(target: int) -> int:
+        visited = set()
+        while 0 <= target < len(program) and target not in visited:
+            instruction = program[target]
+            if instruction.instruction_type != InstructionType.JUMP:
+                break
+            visited.add(target)
+            target = typing.cast(int, jump_target(instruction, target))
+        return target
+
+    new_program = list(program)
+    removed = []
+    rewritten = 0
+    for location, instruction in enumerate(program):
+        target = jump_target(instruction, location)
+        if target is None:
+            continue
+        new_target = final_target(target)
+        match instruction:
+            case Instruction(InstructionType.JUMP, _):
+                is_pure = True
+            case Instruction(InstructionType.JUMP_IF_NOT, (Operator(name=op_name), *_)):
+                is_pure = op_name not in MAY_RAISE
+            case _:
+                is_pure = False
+        if new_target == location + 1 and is_pure:
+            removed.append(location)
+        elif new_target != target:
+            new_program[location] = with_jump_target(instruction, location, new_target)
+            rewritten += 1
+    return remove_instructions(new_program, removed), rewritten
+
+
+def remove_unreachable(program: list[Instruction]) -> tuple[list[Instruction], int]:
+    """Removes instructions that can't be reached from the start of the program."""
+
+    reachable = set()
+    stack = [0]
+    while stack:
+        location = stack.pop()
+        if location in reachable or location not in range(len(program)):
+            continue
+        reachable.add(location)
+        stack.extend(successors(program[location], location))
+    return remove_instructions(program, set(range(len(program))) - reachable), 0
+
+
+def eliminate_dead_stores(program: list[Instruction]) -> tuple[list[Instruction], int]:
+    """Removes assignments to variables that are not read before being overwritten."""
+
+    live = live_variables(program)
+    removed = []
+    for location, instruction in enumerate(program):
+        match instruction:
+            case Instruction(InstructionType.SET_VAR, (str(var), Operator(name=op_name), *_)):
+                live_out = set().union(
+                    *(live[min(s, len(program))] for s in successors(instruction, location))
+                )
+                if var not in live_out and op_name not in MAY_RAISE:
+                    removed.append(location)
+    return remove_instructions(program, removed), 0
+
+
+DEFAULT_PASSES: tuple[Pass, ...] = (
+    propagate_constants,
+    thread_jumps,
+    remove_unreachable,
+    eliminate_dead_stores,
+)
+
+
+def optimize(
+    program: Iterable[Instruction], passes: Sequence[Pass] = DEFAULT_PASSES, max_rounds: int = 10
+) -> tuple[list[Instruction], list[PassReport]]:
+    """Runs the passes in order until nothing changes anymore (or max_rounds is reached)."""
+
+    program = list(program)
+    reports = []
+    for round in range(1, max_rounds + 1):
+        changed = False
+        for optimization_pass in passes:
+            new_program, rewritten = optimization_pass(program)
+            reports.append(
+                PassReport(optimization_pass.__name__, round, len(program) - len(new_program), rewritten)
+            )
+            changed |= new_program != program
+            program = new_program
+        if not changed:
+            break
+    return program, reports
+
+
+def print_reports(reports: Iterable[PassReport], file=None):
+    """Prints the reports of all passes that changed something (to stderr by default)."""
+
+    for report in reports:
+        if report.removed or report.rewritten:
+            print(report, file=sys.stderr if file is None else file)
@@ -0,0 +1,140 @@
+# Execution profiles of WHILE programs
+#
+# Pass a Profile to run_program (or CompiledProgram.run) to count how often every
+# instruction is executed and how often it jumped. The branch and loop statistics
+# are derived from these two counters afterwards, so profiling only adds a counter
+# update per step, and nothing at all when it is off.
+#
+#     profile = Profile()
+#     line_numbers = []
+#     run_program(parse_program(source, line_numbers), profile=profile)
+#     print_report(profile, program, line_numbers, source)
+
+from collections.abc import Sequence
+from typing import NamedTuple
+import dataclasses
+import sys
+
+from while_parsing import Instruction, InstructionType, Operator, LoopSummary
+
+
+class BranchProfile(NamedTuple):
+    location: int  # of the JUMP_IF_NOT instruction
+    taken: int  # the condition was false
+    not_taken: int
+
+
+class LoopProfile(NamedTuple):
+    header: int  # location of the JUMP_IF_NOT of the WHILE statement
+    end: int  # location of the JUMP back to the header
+    iterations: int
+    steps: int  # executed instructions in the loop, including the header
+
+
+@dataclasses.dataclass(slots=True)
+class Profile:
+    # executions[i] counts how often instruction i was executed, jumps[i] how often the
+    # next instruction wasn't i + 1
+    executions: list[int] = dataclasses.field(default_factory=list)
+    jumps: list[int] = dataclasses.field(default_factory=list)
+
+    def resize(self, size: int) -> tuple[list[int], list[int]]:
+        # the counters accumulate over several runs of the same program
+        for counters in self.executions, self.jumps:
+            counters.extend([0] * (size - len(counters)))
+        return self.executions, self.jumps
+
+    def steps(self) -> int:
+        return sum(self.executions)
+
+    def branches(self, program: Sequence[Instruction]) -> list[BranchProfile]:
+        return [
+            BranchProfile(location, self.jumps[location], self.executions[location] - self.jumps[location])
+            for location, (instruction_type, _) in enumerate(program)
+            if instruction_type == InstructionType.JUMP_IF_NOT
+        ]
+
+    def loops(self, program: Sequence[Instruction]) -> list[LoopProfile]:
+        """Returns the WHILE loops of the program, the ones with the most steps first."""
+
+        loops = [
+            LoopProfile(
+                header,
+                end,
+                self.executions[header] - self.jumps[header],
+                sum(self.executions[header : end + 1]),
+            )
+            for header, end in while_loops(program)
+        ]
+        return sorted(loops, key=lambda loop: loop.steps, reverse=True)
+
+
+def while_loops(program: Sequence[Instruction]) -> list[tuple[int, int]]:
+    # returns the location of the header and of the jump back for every WHILE loop
+    loops = []
+    for header, instruction in enumerate(program):
+        match instruction:
+            case (InstructionType.JUMP_IF_NOT, (*_, int(exit_distance))):
+                end = header + exit_distance - 1
+                jump_back = Instruction(InstructionType.JUMP, (header - end,))
+                if header < end < len(program) and program[end] == jump_back:
+                    loops.append((header, end))
+    return loops
+
+
+def format_instruction(instruction: Instruction) -> str:
+    def format_arg(arg) -> str:
+        match arg:
+            case Operator(name=name):
+                return name
+            case LoopSummary(guard=guard, counter=counter, bound=bound):
+                return f"({counter} {guard.name} {bound})"
+        return str(arg)
+
+    instruction_type, args = instruction
+    return " ".join([instruction_type.name, *map(format_arg, args)])
+
+
+def print_report(
+    profile: Profile,
+    program: Sequence[Instruction],
+    line_numbers: Sequence[int] | None = None,
+    source_code: Sequence[str] | None = None,
+    top: int = 10,
+    file=None,
+):
+    """Prints the hottest instructions, the branch statistics and the hottest loops.
+
+    With line_numbers (see parse_program), the instructions are shown as source lines."""
+
+    file = sys.stderr if file is None else file
+    profile.resize(len(program))  # in case the program crashed before it started
+    steps = profile.steps()
+
+    def describe(location: int) -> str:
+        if line_numbers is None:
+            return f"{location:>6}  {format_instruction(program[location])}"
+        line = line_numbers[location]
+        if source_code is None:
+            return f"{line:>6}  {format_instruction(program[location])}"
+        return f"{line:>6}  {source_code[line - 1].strip()}"
+
+    def share(count: int) -> str:
+        return f"{count / steps:>7.1%}" if steps else f"{'-':>7}"
+
+    location_label = "line" if line_numbers is not None else "instr"
+    print(f"Profile: {steps} steps", file=file)
+
+    print(f"\nHottest instructions:\n{'executions':>12}{'share':>8}{location_label:>8}", file=file)
+    hottest = sorted(range(len(program)), key=profile.executions.__getitem__, reverse=True)[:top]
+    for location in hottest:
+        count = profile.executions[location]
+        print(f"{count:>12}{share(count)}  {describe(location)}", file=file)
+
+    print(f"\nBranches:\n{'taken':>12}{'not taken':>12}{location_label:>8}", file=file)
+    for branch in profile.branches(program):
+        print(f"{branch.taken:>12}{branch.not_taken:>12}  {describe(branch.location)}", file=file)
+
+    print(f"\nHottest loops:\n{'iterations':>12}{'steps':>12}{'share':>8}{location_label:>8}", file=file)
+    for loop in profile.loops(program)[:top]:
+        print(f"{loop.iterations:>12}{loop.steps:>12}{share(loop.steps)}  {describe(loop.header)}", file=file)
@@ -0,0 +1,150 @@
+# On-disk cache for parsed and optimized WHILE programs
+#
+# The instruction lists are pickled, operators are stored by name and rebound to
+# while_parsing.OPERATORS when they are loaded (see Operator.__reduce__). Entries are
+# keyed by a hash of the source code, the optimization passes and the code of the
+# modules that produced the program (the parser, the passes and every module of the
+# project they import), so changing any of them invalidates the old entries.
+#
+# The cache lives in $XDG_CACHE_HOME/ciwyc (~/.cache/ciwyc by default). When it
+# grows beyond max_size bytes, the least recently used entries are deleted. Only
+# load caches you trust, unpickling can run arbitrary code.
+
+from collections.abc import Iterable, Sequence
+import dataclasses
+import hashlib
+import os
+import pathlib
+import pickle
+import sys
+import tempfile
+import types
+
+from while_parsing import Instruction, parse_program
+import while_parsing
+import optimizer
+
+# increase this if the pickled format changes
+FORMAT_VERSION = 1
+
+
+def default_cache_dir() -> pathlib.Path:
+    cache_home = os.environ.get("XDG_CACHE_HOME") or pathlib.Path.home() / ".cache"
+    return pathlib.Path(cache_home) / "ciwyc"
+
+
+def serialize_program(program: Sequence[Instruction]) -> bytes:
+    return pickle.dumps(list(program), protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def deserialize_program(data: bytes) -> list[Instruction]:
+    return pickle.loads(data)
+
+
+_SOURCE_DIR = pathlib.Path(__file__).resolve().parent
+
+
+def _project_module(value) -> types.ModuleType | None:
+    # the module of the project (a file in src) that value is or that defines it
+    if isinstance(value, types.ModuleType):
+        module = value
+    else:
+        module_name = getattr(value, "__module__", None)
+        module = sys.modules.get(module_name) if isinstance(module_name, str) else None
+    module_file = getattr(module, "__file__", None)
+    if module_file is None or pathlib.Path(module_file).resolve().parent != _SOURCE_DIR:
+        return None
+    return module
+
+
+def module_dependencies(modules: Iterable[types.ModuleType]) -> set[str]:
+    """Returns the files of the modules and of all project modules they import, transitively.
+
+    Imports inside of functions are not found."""
+
+    files: set[str] = set()
+    stack = list(modules)
+    while stack:
+        module = stack.pop()
+        if module.__file__ is None or module.__file__ in files:
+            continue
+        files.add(module.__file__)
+        stack.extend(filter(None, map(_project_module, vars(module).values())))
+    return files
+
+
+def cache_key(source_code: Iterable[str], passes: Sequence[optimizer.Pass] = ()) -> str:
+    key = hashlib.sha256(f"{FORMAT_VERSION}\n".encode())
+    modules = module_dependencies([while_parsing, *(sys.modules[f.__module__] for f in passes)])
+    for module_file in sorted(modules):
+        key.update(pathlib.Path(module_file).read_bytes())
+    key.update(" ".join(f"{f.__module__}.{f.__qualname__}" for f in passes).encode())
+    # same key for lines with and without line breaks (readlines vs splitlines)
+    key.update("\n".join(line.rstrip("\r\n") for line in source_code).encode())
+    return key.hexdigest()
+
+
+@dataclasses.dataclass(slots=True)
+class ProgramCache:
+    directory: pathlib.Path = dataclasses.field(default_factory=default_cache_dir)
+    max_size: int = 256 * 2**20  # in bytes
+
+    def path(self, key: str) -> pathlib.Path:
+        return self.directory / f"{key}.pickle"
+
+    def get(self, key: str) -> list[Instruction] | None:
+        path = self.path(key)
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            return None
+        os.utime(path)  # mark as recently used
+        return deserialize_program(data)
+
+    def put(self, key: str, program: Sequence[Instruction]):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # write to a temporary file first, so concurrent runs never see half written entries
+        with tempfile.NamedTemporaryFile(dir=self.directory, suffix=".tmp", delete=False) as file:
+            file.write(serialize_program(program))
+        os.replace(file.name, self.path(key))
+        self.evict()
+
+    def evict(self):
+        """Deletes the least recently used entries until the cache is smaller than max_size."""
+
+        entries = []
+        for path in self.directory.glob("*.pickle"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue  # deleted by another process
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        size = sum(entry_size for _, entry_size, _ in entries)
+        for _, entry_size, path in sorted(entries):
+            if size <= self.max_size:
+                break
+            path.unlink(missing_ok=True)
+            size -= entry_size
+
+    def clear(self):
+        for path in self.directory.glob("*.pickle"):
+            path.unlink(missing_ok=True)
+
+
+def load_program(
+    source_code: Sequence[str], passes: Sequence[optimizer.Pass] = (), cache: ProgramCache | None = None
+) -> list[Instruction]:
+    """Parses and optimizes the program, or loads the result from the cache if it is given."""
+
+    key = cache_key(source_code, passes) if cache is not None else ""
+    if cache is not None and (program := cache.get(key)) is not None:
+        return program
+
+    program = list(parse_program(source_code))
+    if passes:
+        program, reports = optimizer.optimize(program, passes)
+        optimizer.print_reports(reports)
+    if cache is not None:
+        cache.put(key, program)
+    return program
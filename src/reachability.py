@@ -0,0 +1,262 @@
+# On-the-fly reachability search for WHILE programs
+#
+# Explores the states of a program with get_next_states until one matches a
+# predicate, without building the transition system. Only the information that is
+# needed for the trace back to the initial state is kept:
+#
+#   - bfs: the parent of every visited state, the trace is a shortest one
+#   - dfs: the visited states and the current path, the trace can be longer
+#   - iddfs: depth limited dfs with increasing limits, only the current path is
+#     stored, the trace is a shortest one. States are expanded again in every
+#     iteration, so this trades time for memory.
+
+from collections.abc import Callable, Iterator
+from typing import Literal, NamedTuple
+import argparse
+import itertools as it
+import math
+import typing
+
+from while_parsing import Instruction, InstructionType, Operator
+from transition_system import State, VariableSet, get_next_states
+import intervals
+import optimizer
+import acceleration
+import program_cache
+
+type Predicate = Callable[[State], bool]
+type Successors = Callable[[State], tuple[State, ...]]
+type Strategy = Literal["bfs", "dfs", "iddfs"]
+STRATEGIES: tuple[Strategy, ...] = ("bfs", "dfs", "iddfs")
+
+
+class SearchResult(NamedTuple):
+    trace: list[State] | None  # from the initial state to the first matching state
+    expanded: int  # number of states whose successors were computed
+
+    @property
+    def found(self) -> bool:
+        return self.trace is not None
+
+
+def at_location(location: int) -> Predicate:
+    return lambda state: state.location == location
+
+
+def has_value(var: str, value: int | None) -> Predicate:
+    return lambda state: state.variables.get(var) == value
+
+
+def assertion_fails(program: list[Instruction]) -> Predicate:
+    # the state is at an ASSERT that fails, or may fail because of unknown values (like in bmc.py)
+    def predicate(state: State) -> bool:
+        if state.location not in range(len(program)):
+            return False
+        match program[state.location]:
+            case (InstructionType.ASSERT, (Operator() as op, *args)):
+                operands = typing.cast(list[str | int], args)
+                values = [state.variables.get(arg) for arg in operands]
+                if all(isinstance(value, int) for value in values):
+                    return not op.f(*typing.cast(list[int], values))
+                result = intervals.evaluate(op.name, operands, state.variables.get)
+                return 0 in intervals.to_interval(result)
+        return False
+
+    return predicate
+
+
+def _bfs(successors: Successors, initial_state: State, predicate: Predicate, max_depth: int | None):
+    parents: dict[State, State | None] = {initial_state: None}
+    current_states = [initial_state]
+    expanded = 0
+
+    def trace(state: State) -> list[State]:
+        states = []
+        current: State | None = state
+        while current is not None:
+            states.append(current)
+            current = parents[current]
+        return states[::-1]
+
+    if predicate(initial_state):
+        return SearchResult(trace(initial_state), expanded)
+    for _ in it.count() if max_depth is None else range(max_depth):
+        next_states = []
+        for state in current_states:
+            expanded += 1
+            for successor in successors(state):
+                if successor in parents:
+                    continue
+                parents[successor] = state
+                if predicate(successor):
+                    return SearchResult(trace(successor), expanded)
+                next_states.append(successor)
+        if not next_states:
+            break
+        current_states = next_states
+    return SearchResult(None, expanded)
+
+
+def _dfs(successors: Successors, initial_state: State, predicate: Predicate, max_depth: int | None):
+    # the smallest depth every state was reached in, a state is expanded again if it
+    # is reached in a smaller depth, because then it can reach more states before
+    # the depth limit
+    depths: dict[State, int] = {initial_state: 0}
+    path = [initial_state]
+    if predicate(initial_state):
+        return SearchResult(path, 0)
+    stack: list[Iterator[State]] = [iter(successors(initial_state))]
+    expanded = 1
+
+    limit = math.inf if max_depth is None else max_depth
+    while stack:
+        successor = next(stack[-1], None)
+        if successor is None:
+            stack.pop()
+            path.pop()
+            continue
+        if depths.get(successor, math.inf) <= len(path):
+            continue
+        depths[successor] = len(path)
+        path.append(successor)
+        if predicate(successor):
+            return SearchResult(path, expanded)
+        if len(path) > limit:
+            path.pop()
+            continue
+        expanded += 1
+        stack.append(iter(successors(successor)))
+    return SearchResult(None, expanded)
+
+
+def _iddfs(successors: Successors, initial_state: State, predicate: Predicate, max_depth: int | None):
+    expanded = 0
+    if predicate(initial_state):
+        return SearchResult([initial_state], expanded)
+
+    for limit in it.count(1) if max_depth is None else range(1, max_depth + 1):
+        path = [initial_state]
+        on_path = {initial_state}
+        stack: list[Iterator[State]] = [iter(successors(initial_state))]
+        expanded += 1
+        cut_off = False  # if no state was cut off by the limit, a larger one doesn't help
+        while stack:
+            successor = next(stack[-1], None)
+            if successor is None:
+                stack.pop()
+                on_path.discard(path.pop())
+                continue
+            if successor in on_path:
+                continue
+            if predicate(successor):
+                return SearchResult([*path, successor], expanded)
+            if len(path) == limit:
+                cut_off = True
+                continue
+            path.append(successor)
+            on_path.add(successor)
+            expanded += 1
+            stack.append(iter(successors(successor)))
+        if not cut_off:
+            break
+    return SearchResult(None, expanded)
+
+
+SEARCHES = {"bfs": _bfs, "dfs": _dfs, "iddfs": _iddfs}
+
+
+def find_state(
+    program: list[Instruction],
+    predicate: Predicate,
+    max_depth: int | None = None,
+    strategy: Strategy = "bfs",
+    initial_state: State | None = None,
+    use_intervals: bool = False,
+) -> SearchResult:
+    """Searches for a state that is reachable in at most max_depth steps and matches the predicate.
+
+    Stops at the first matching state. bfs and iddfs return a shortest trace. Without
+    max_depth, the search only ends when the predicate matches or all reachable states
+    were visited, which doesn't happen for programs with infinitely many states."""
+
+    if strategy not in SEARCHES:
+        raise ValueError(f"Unknown search strategy: {strategy}")
+    initial_state = State(0, VariableSet()) if initial_state is None else initial_state
+
+    def successors(state: State) -> tuple[State, ...]:
+        return get_next_states(program, state, use_intervals)
+
+    return SEARCHES[strategy](successors, initial_state, predicate, max_depth)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Search for a reachable state of a WHILE program and print the trace to it."
+    )
+    parser.add_argument("input_file", help="The input file containing the WHILE program.")
+    parser.add_argument("-l", "--location", type=int, help="Search for a state at this instruction.")
+    parser.add_argument(
+        "-v",
+        "--value",
+        action="append",
+        default=[],
+        metavar="VAR=VALUE",
+        help="Search for a state where VAR has this value (None for unknown). Can be given multiple times.",
+    )
+    parser.add_argument(
+        "-a", "--assertion", action="store_true", help="Search for a state where an ASSERT may fail."
+    )
+    parser.add_argument("-d", "--max-depth", type=int, help="Maximum number of steps.")
+    parser.add_argument("-s", "--strategy", choices=STRATEGIES, default="bfs", help="The search strategy.")
+    parser.add_argument(
+        "-O", "--optimize", action="store_true", help="Optimize the program before searching."
+    )
+    parser.add_argument(
+        "--accelerate", action="store_true", help="Replace simple counting loops by a single step."
+    )
+    parser.add_argument(
+        "--cache", action="store_true", help="Cache the parsed and optimized program on disk."
+    )
+    parser.add_argument(
+        "--intervals", action="store_true", help="Track intervals for unknown values, see intervals.py."
+    )
+
+    args = parser.parse_args()
+
+    predicates = [] if args.location is None else [at_location(args.location)]
+    for assignment in args.value:
+        var, _, value = assignment.partition("=")
+        predicates.append(has_value(var.strip(), None if value.strip() == "None" else int(value)))
+    if not predicates and not args.assertion:
+        parser.error("give at least one of --location, --value and --assertion")
+
+    with open(args.input_file) as file:
+        source = file.read().splitlines()
+
+    passes = [
+        *(optimizer.DEFAULT_PASSES if args.optimize else ()),
+        *([acceleration.accelerate_loops] if args.accelerate else ()),
+    ]
+    cache = program_cache.ProgramCache() if args.cache else None
+    program = program_cache.load_program(source, passes, cache)
+    if args.assertion:
+        predicates.append(assertion_fails(program))
+
+    result = find_state(
+        program,
+        lambda state: all(predicate(state) for predicate in predicates),
+        args.max_depth,
+        args.strategy,
+        use_intervals=args.intervals,
+    )
+    if result.trace is None:
+        print("No matching state found.")
+    else:
+        print(f"Found a matching state after {len(result.trace) - 1} steps:")
+        for state in result.trace:
+            print(f"    {state}")
+    print(f"Expanded states: {result.expanded}")
+
+
+if __name__ == "__main__":
+    main()
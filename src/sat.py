@@ -42,9 +42,17 @@ class BitVector(transition_relation.IntEncoding):
 
     @classmethod
     def create_literal(cls, value: int) -> "BitVector":
-        bits = bin(value)[2:].zfill(cls._num_bits)[::-1]
+        # negative values (e.g. the distances of backward jumps) wrap around like the additions do
+        bits = bin(value % 2**cls._num_bits)[2:].zfill(cls._num_bits)[::-1]
         return cls(tuple(z3.BoolVal(bit == "1") for bit in bits))
 
+    @classmethod
+    def evaluate(cls, model: z3.ModelRef, value: "BitVector") -> int:
+        # unsigned, like the comparisons
+        return sum(
+            1 << i for i, bit in enumerate(value._bits) if z3.is_true(model.eval(bit, model_completion=True))
+        )
+
 
 def bitvector_add(lhs: "BitVector", rhs: "BitVector", result: "BitVector") -> Z3BoolExpression:
     carry_bits = [z3.BoolVal(False)] + [z3.FreshConst(z3.BoolSort()) for _ in range(lhs._num_bits - 1)]
@@ -108,3 +116,132 @@ def get_operator_restriction(
             return BitVector.from_bool(op(*args)) == other
 
     raise ValueError(f"{op_name} is not supported for SAT encoding")
+
+
+# Encodings of the program counter (see transition_relation.LocationEncoding). The
+# location of the successor is always a constant, so it is assigned directly instead of
+# computed by an adder like ArithmeticLocation(BitVector, ...) does. Locations outside
+# of 0..num_locations - 1 can't be reached.
+Location = tuple[z3.BoolRef, ...]
+
+
+def _is_true(model: z3.ModelRef, bit: z3.BoolRef) -> bool:
+    return z3.is_true(model.eval(bit, model_completion=True))
+
+
+@dataclasses.dataclass(slots=True, frozen=True)
+class OneHotLocation:
+    # one bit per location, exactly one of them is set
+    num_locations: int
+
+    def create_variable(self, name: str) -> Location:
+        return tuple(z3.Bool(f"{name}_at{i}") for i in range(self.num_locations))
+
+    def at(self, variable: Location, location: int) -> Z3BoolExpression:
+        return variable[location] if 0 <= location < self.num_locations else z3.BoolVal(False)
+
+    def successor(
+        self, variable_a: Location, location: int, distance: int, variable_b: Location
+    ) -> Z3BoolExpression:
+        return self.at(variable_b, location + distance)
+
+    def valid(self, variable: Location) -> Z3BoolExpression:
+        # at most one bit with the sequential encoding instead of all pairs, so the
+        # constraint grows linearly with the program: seen[i] is set if one of the bits
+        # 0..i is, a bit may only be set if none before it is
+        seen = [z3.FreshBool(prefix="onehot_seen") for _ in variable[:-1]]
+        constraints = [z3.Or(variable)]
+        for i, bit in enumerate(variable):
+            if i > 0:
+                constraints.append(z3.Implies(bit, z3.Not(seen[i - 1])))
+            if i < len(seen):
+                constraints.append(z3.Implies(bit, seen[i]))
+                if i > 0:
+                    constraints.append(z3.Implies(seen[i - 1], seen[i]))
+        return z3.And(constraints)
+
+    def evaluate(self, model: z3.ModelRef, variable: Location) -> int:
+        return next(i for i, bit in enumerate(variable) if _is_true(model, bit))
+
+
+@dataclasses.dataclass(slots=True, frozen=True)
+class BinaryLocation:
+    # the location as an unsigned binary number with as few bits as possible
+    num_locations: int
+
+    @property
+    def num_bits(self) -> int:
+        return max(1, (self.num_locations - 1).bit_length())
+
+    def create_variable(self, name: str) -> Location:
+        return tuple(z3.Bool(f"{name}_b{i}") for i in range(self.num_bits))
+
+    def at(self, variable: Location, location: int) -> Z3BoolExpression:
+        if not 0 <= location < self.num_locations:
+            return z3.BoolVal(False)
+        return z3.And([bit if location >> i & 1 else z3.Not(bit) for i, bit in enumerate(variable)])
+
+    def successor(
+        self, variable_a: Location, location: int, distance: int, variable_b: Location
+    ) -> Z3BoolExpression:
+        return self.at(variable_b, location + distance)
+
+    def valid(self, variable: Location) -> Z3BoolExpression:
+        # the successors are always assigned a valid location
+        return z3.BoolVal(True)
+
+    def evaluate(self, model: z3.ModelRef, variable: Location) -> int:
+        return sum(1 << i for i, bit in enumerate(variable) if _is_true(model, bit))
+
+
+@dataclasses.dataclass(slots=True, frozen=True)
+class UnaryLocation:
+    # order encoding, bit i is set iff the location is greater than i
+    num_locations: int
+
+    def create_variable(self, name: str) -> Location:
+        return tuple(z3.Bool(f"{name}_gt{i}") for i in range(self.num_locations - 1))
+
+    def at(self, variable: Location, location: int) -> Z3BoolExpression:
+        if not 0 <= location < self.num_locations:
+            return z3.BoolVal(False)
+        conditions = []
+        if location > 0:
+            conditions.append(variable[location - 1])
+        if location < len(variable):
+            conditions.append(z3.Not(variable[location]))
+        return z3.And(conditions)
+
+    def successor(
+        self, variable_a: Location, location: int, distance: int, variable_b: Location
+    ) -> Z3BoolExpression:
+        return self.at(variable_b, location + distance)
+
+    def valid(self, variable: Location) -> Z3BoolExpression:
+        return z3.And([z3.Implies(higher, lower) for lower, higher in zip(variable, variable[1:])])
+
+    def evaluate(self, model: z3.ModelRef, variable: Location) -> int:
+        return sum(_is_true(model, bit) for bit in variable)
+
+
+# the factories get the number of locations
+LOCATION_ENCODINGS: dict[str, Any] = {
+    "onehot": OneHotLocation,
+    "binary": BinaryLocation,
+    "unary": UnaryLocation,
+}
+
+
+def get_location_encoding(
+    name: str,
+    num_locations: int,
+    Encoding: type,
+    get_operator_restriction: transition_relation.OperatorRestrictionGetter,
+) -> transition_relation.LocationEncoding:
+    """Returns the location encoding with the name, "arithmetic" or one of LOCATION_ENCODINGS."""
+
+    if name == "arithmetic":
+        return transition_relation.ArithmeticLocation(Encoding, get_operator_restriction)
+    if name not in LOCATION_ENCODINGS:
+        raise ValueError(f"Unknown location encoding {name}")
+    return LOCATION_ENCODINGS[name](num_locations)
@@ -1,9 +1,18 @@
 import z3
 import functools as fun
+import typing
 
 from util import *
 
 
+def to_z3_bool(z3_var: Z3Expression) -> Z3BoolExpression:
+    return z3_var != z3.IntVal(0)
+
+
+def to_z3_int(z3_bool: Z3BoolExpression) -> Z3Expression:
+    return z3.If(z3_bool, z3.IntVal(1), z3.IntVal(0))
+
+
 # conforms to the IntEncoding Protocol
 class Z3Int(z3.ArithRef):
     @classmethod
@@ -14,6 +23,10 @@ class Z3Int(z3.ArithRef):
     def create_literal(cls, value: int) -> z3.ArithRef:
         return z3.IntVal(value)
 
+    @classmethod
+    def evaluate(cls, model: z3.ModelRef, value: z3.ArithRef) -> int:
+        return typing.cast(z3.IntNumRef, model.eval(value, model_completion=True)).as_long()
+
 
 # In principle the WHILE language only knows integers, but to avoid conversions with z3, the operatos ar split up into
 # int and bool operators here
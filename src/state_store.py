@@ -0,0 +1,297 @@
+# State stores for the unroller
+#
+# A store provides the two containers of a TransitionSystem that grow with the number
+# of states: the transitions and the visited states. MemoryStateStore keeps them in a
+# dict and a set, like TransitionSystem does by default. DiskStateStore keeps them in
+# memory mapped files, so the unroller is only limited by the disk:
+#
+#   - states.bin: one fixed width record per state, the location and the values of
+#     all variables of the program as 64 bit integers and a bit mask of the unknown
+#     (None) values. The position of a record is the id of the state.
+#   - index.bin: open addressing hash table from the records to their ids
+#   - successors.bin: the ids of the (at most two) successors of every state and if
+#     it was visited. States that are only successors are stored, but not visited.
+#
+# The operating system pages the files in and out, only the frontier of the unrolling
+# is kept in python objects.
+#
+#     with DiskStateStore(state_variables(program)) as store:
+#         ts = unroll_while_program(program, depth, store=store)
+
+from collections.abc import Iterable, Iterator, Mapping, Set
+from typing import Protocol
+import dataclasses
+import mmap
+import os
+import pathlib
+import shutil
+import struct
+import tempfile
+import zlib
+
+from while_parsing import Instruction
+from transition_system import (
+    State,
+    VariableSet,
+    TransitionSystem,
+    Transitions,
+    VisitedStates,
+    _init_ts_successor,
+)
+import optimizer
+
+
+class StateStore(Protocol):
+    # read-only, so the stores can use their own container types
+    @property
+    def transitions(self) -> Transitions: ...
+
+    @property
+    def visited(self) -> VisitedStates: ...
+
+
+@dataclasses.dataclass(slots=True)
+class MemoryStateStore:
+    transitions: Transitions = dataclasses.field(default_factory=_init_ts_successor)
+    visited: VisitedStates = dataclasses.field(default_factory=set)
+
+
+def state_variables(program: Iterable[Instruction]) -> set[str]:
+    """Returns all variables of the program, the states of the unroller only contain these."""
+
+    return optimizer.program_variables(program)
+
+
+_INT64 = struct.Struct("<q")
+_SUCCESSORS = struct.Struct("<qqq")  # successor ids + 1 (0 if there is none), visited flag
+MAX_SUCCESSORS = 2
+
+
+class _MappedFile:
+    # a memory mapped file that grows by doubling its size
+
+    def __init__(self, path: pathlib.Path, size: int):
+        self.path = path
+        self.file = open(path, "w+b")
+        self.file.truncate(size)  # the new part of the file is zero filled
+        self.map = mmap.mmap(self.file.fileno(), size)
+
+    def ensure(self, size: int):
+        if size > len(self.map):
+            self.map.resize(max(size, 2 * len(self.map)))
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+
+class DiskStateStore:
+    """Stores the states and transitions of an unrolling in memory mapped files.
+
+    Only states with int and None values of the given variables can be stored, which
+    excludes the intervals of use_intervals. The files are created in directory, or a
+    temporary directory that is deleted by close."""
+
+    def __init__(
+        self,
+        variables: Iterable[str],
+        directory: str | os.PathLike | None = None,
+        initial_capacity: int = 1024,
+    ):
+        self.variables = sorted(set(variables))
+        self._variable_indices = {var: i for i, var in enumerate(self.variables)}
+        num_variables = len(self.variables)
+        self._mask_size = (num_variables + 7) // 8
+        self._record = struct.Struct(f"<q{num_variables}q{self._mask_size}s")
+
+        self._temporary = directory is None
+        self.directory = pathlib.Path(tempfile.mkdtemp(prefix="ciwyc-") if directory is None else directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._states = _MappedFile(self.directory / "states.bin", initial_capacity * self._record.size)
+        self._successors = _MappedFile(self.directory / "successors.bin", initial_capacity * _SUCCESSORS.size)
+        self._index_slots = 1 << (2 * initial_capacity - 1).bit_length()
+        self._index = _MappedFile(self.directory / "index.bin", self._index_slots * _INT64.size)
+        self._num_states = 0
+        self._num_transitions = 0
+        self._num_visited = 0
+
+        self.transitions = StoredTransitions(self)
+        self.visited = StoredStates(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        for mapped_file in self._states, self._successors, self._index:
+            mapped_file.close()
+        if self._temporary:
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+    def encode(self, state: State) -> bytes:
+        values = [0] * len(self.variables)
+        unknown = 0
+        for var, value in state.variables.items():
+            i = self._variable_indices.get(var)
+            if i is None:
+                raise ValueError(f"The variable {var} is not in the state store")
+            if value is None:
+                unknown |= 1 << i
+            elif isinstance(value, int):
+                values[i] = value
+            else:
+                raise ValueError(f"Only int and None values can be stored, not {value}")
+        try:
+            return self._record.pack(state.location, *values, unknown.to_bytes(self._mask_size, "little"))
+        except struct.error:
+            raise ValueError(f"A value of {state} doesn't fit into 64 bits") from None
+
+    def decode(self, record: bytes) -> State:
+        location, *values, unknown_bytes = self._record.unpack(record)
+        unknown = int.from_bytes(unknown_bytes, "little")
+        items = tuple(
+            (var, None if unknown >> i & 1 else value)
+            for i, (var, value) in enumerate(zip(self.variables, values))
+            if value != 0 or unknown >> i & 1
+        )
+        return State(location, VariableSet._intern(items))
+
+    def _record_at(self, state_id: int) -> bytes:
+        size = self._record.size
+        return self._states.map[state_id * size : (state_id + 1) * size]
+
+    def _find(self, record: bytes) -> tuple[int, int | None]:
+        # returns the index slot of the record and its id, or a free slot and None
+        index = self._index.map
+        mask = self._index_slots - 1
+        slot = zlib.crc32(record) & mask
+        while entry := _INT64.unpack_from(index, slot * _INT64.size)[0]:
+            if self._record_at(entry - 1) == record:
+                return slot, entry - 1
+            slot = (slot + 1) & mask
+        return slot, None
+
+    def find(self, state: State) -> int | None:
+        return self._find(self.encode(state))[1]
+
+    def add(self, state: State) -> int:
+        """Returns the id of the state, it is stored if it is new."""
+
+        record = self.encode(state)
+        slot, state_id = self._find(record)
+        if state_id is not None:
+            return state_id
+
+        state_id = self._num_states
+        self._states.ensure((state_id + 1) * self._record.size)
+        self._states.map[state_id * self._record.size : (state_id + 1) * self._record.size] = record
+        _INT64.pack_into(self._index.map, slot * _INT64.size, state_id + 1)
+        self._num_states += 1
+        if 2 * self._num_states > self._index_slots:
+            self._grow_index()
+        return state_id
+
+    def state(self, state_id: int) -> State:
+        return self.decode(self._record_at(state_id))
+
+    def _grow_index(self):
+        # the new index is built in a new file, the old one stays valid until it's done
+        self._index_slots *= 2
+        new_index = _MappedFile(self.directory / "index.tmp", self._index_slots * _INT64.size)
+        mask = self._index_slots - 1
+        for state_id in range(self._num_states):
+            slot = zlib.crc32(self._record_at(state_id)) & mask
+            while _INT64.unpack_from(new_index.map, slot * _INT64.size)[0]:
+                slot = (slot + 1) & mask
+            _INT64.pack_into(new_index.map, slot * _INT64.size, state_id + 1)
+        self._index.close()
+        os.replace(new_index.path, self._index.path)
+        new_index.path = self._index.path
+        self._index = new_index
+
+    def _entry(self, state_id: int) -> tuple[int, ...]:
+        if (state_id + 1) * _SUCCESSORS.size > len(self._successors.map):
+            return (0,) * (MAX_SUCCESSORS + 1)
+        return _SUCCESSORS.unpack_from(self._successors.map, state_id * _SUCCESSORS.size)
+
+    def _set_entry(self, state_id: int, *entry: int):
+        self._successors.ensure((state_id + 1) * _SUCCESSORS.size)
+        _SUCCESSORS.pack_into(self._successors.map, state_id * _SUCCESSORS.size, *entry)
+
+    def successor_ids(self, state_id: int) -> tuple[int, ...]:
+        return tuple(i - 1 for i in self._entry(state_id)[:MAX_SUCCESSORS] if i)
+
+    def set_successors(self, state_id: int, successor_ids: tuple[int, ...]):
+        if not 0 < len(successor_ids) <= MAX_SUCCESSORS:
+            raise ValueError(f"States need to have between 1 and {MAX_SUCCESSORS} successors")
+        *old_successors, visited = self._entry(state_id)
+        if not any(old_successors):
+            self._num_transitions += 1
+        padded = [i + 1 for i in successor_ids] + [0] * (MAX_SUCCESSORS - len(successor_ids))
+        self._set_entry(state_id, *padded, visited)
+
+    def is_visited(self, state_id: int) -> bool:
+        return bool(self._entry(state_id)[-1])
+
+    def set_visited(self, state_id: int):
+        *successors, visited = self._entry(state_id)
+        if not visited:
+            self._num_visited += 1
+            self._set_entry(state_id, *successors, 1)
+
+
+class StoredStates(Set[State]):
+    # the visited states of a DiskStateStore, states can be added, but not removed
+
+    def __init__(self, store: DiskStateStore):
+        self.store = store
+
+    def __contains__(self, state) -> bool:
+        state_id = self.store.find(state) if isinstance(state, State) else None
+        return state_id is not None and self.store.is_visited(state_id)
+
+    def __iter__(self) -> Iterator[State]:
+        store = self.store
+        return (store.state(i) for i in range(store._num_states) if store.is_visited(i))
+
+    def __len__(self) -> int:
+        return self.store._num_visited
+
+    def add(self, state: State):
+        self.store.set_visited(self.store.add(state))
+
+
+class StoredTransitions(Mapping[State, tuple[State, ...]]):
+    # the transitions of a DiskStateStore, in the order of the ids of the states, which
+    # is the order in which the unroller expands them. Like the defaultdict of
+    # TransitionSystem, states without transitions lead to the sink state. Transitions
+    # can be set, but not removed.
+
+    def __init__(self, store: DiskStateStore):
+        self.store = store
+
+    def _successor_ids(self, state) -> tuple[int, ...]:
+        state_id = self.store.find(state) if isinstance(state, State) else None
+        return () if state_id is None else self.store.successor_ids(state_id)
+
+    def __contains__(self, state) -> bool:
+        return bool(self._successor_ids(state))
+
+    def __getitem__(self, state: State) -> tuple[State, ...]:
+        successor_ids = self._successor_ids(state)
+        if not successor_ids:
+            return (TransitionSystem.SINK_STATE,)
+        return tuple(map(self.store.state, successor_ids))
+
+    def __setitem__(self, state: State, successors: tuple[State, ...]):
+        store = self.store
+        store.set_successors(store.add(state), tuple(map(store.add, successors)))
+
+    def __iter__(self) -> Iterator[State]:
+        store = self.store
+        return (store.state(i) for i in range(store._num_states) if store.successor_ids(i))
+
+    def __len__(self) -> int:
+        return self.store._num_transitions
@@ -1,15 +1,18 @@
 import z3
+import dataclasses
 import typing
 import string
 
 from typing import Protocol, NamedTuple, Callable, Iterable, Type
 
 from util import Z3BoolExpression
-from while_parsing import Instruction, InstructionType, Operator
+from while_parsing import Instruction, InstructionType, Operator, LoopSummary
+import optimizer
 
 
-# We only support the 26 lowercase letters as variable names in the WHILE program
-# the formulas short, but this can exteneded here:
+# The states of the formula only contain the variables of the program (see
+# get_transition_relation), every variable costs two frame conditions in every transition.
+# StateVariable.init uses these if it isn't given any variables:
 WhileIdentifiers = string.ascii_lowercase
 
 
@@ -34,6 +37,10 @@ class IntEncoding[T](Protocol):
     @classmethod
     def create_literal(cls, value: int) -> T: ...
 
+    # the value of an encoded integer in a model of the formula, for counterexamples
+    @classmethod
+    def evaluate(cls, model: z3.ModelRef, value: T) -> int: ...
+
 
 # variable in our created formula that represents a single variable in the WHILE
 # code, in the case of SMT, value is of type z3.Int
@@ -45,38 +52,45 @@ class Variable[T](NamedTuple):
 # Variable in the created formula that represents a state in the transition system.
 # The created formula should encode a relation between such states
 class StateVariable[T: IntEncoding](NamedTuple):
-    location: T  # needs to support addition with integers
+    location: typing.Any  # a T for ArithmeticLocation, see LocationEncoding
     variables: dict[str, Variable[T]]
+    prefix: str = ""  # used for the names of helper variables
 
     @classmethod
-    def init(cls, prefix: str, create_variable: Callable[[str], T]) -> "StateVariable[T]":
-        variables = {
+    def init(
+        cls,
+        prefix: str,
+        create_variable: Callable[[str], T],
+        variables: Iterable[str] = WhileIdentifiers,
+        create_location: Callable[[str], typing.Any] | None = None,
+    ) -> "StateVariable[T]":
+        state_variables = {
             name: Variable[T](create_variable(f"{prefix}_{name}_value"), z3.Bool(f"{prefix}_{name}_is_known"))
-            for name in WhileIdentifiers
+            for name in variables
         }
-        location = create_variable(f"{prefix}_location")
-        return cls(location, variables)
+        location = (create_location or create_variable)(f"{prefix}_location")
+        return cls(location, state_variables, prefix)
 
     def get(self, var: str | int, create_literal: Callable[[int], T]) -> Variable[T]:
         if isinstance(var, int):
             return Variable[T](create_literal(var), z3.BoolVal(True))
-        if var not in WhileIdentifiers:
-            raise ValueError(f"Indentifier {var} is not supported for model checking")
+        if var not in self.variables:
+            raise ValueError(f"Indentifier {var} is not part of the encoded state")
         return self.variables[var]
 
     def variables_equal(self, other: "StateVariable[T]") -> Z3BoolExpression:
         var_conditions = []
-        for indentifier in WhileIdentifiers:
+        for indentifier in self.variables:
             self_value, self_is_known = self.variables[indentifier]
             other_value, other_is_known = other.variables[indentifier]
             var_conditions.append(self_value == other_value)
             var_conditions.append(self_is_known == other_is_known)
         return z3.And(var_conditions)
 
-    def variables_equal_except(self, other: "StateVariable[T]", excluded_varname: str) -> Z3BoolExpression:
+    def variables_equal_except(self, other: "StateVariable[T]", *excluded_varnames: str) -> Z3BoolExpression:
         var_conditions = []
-        for indentifier in WhileIdentifiers:
-            if indentifier == excluded_varname:
+        for indentifier in self.variables:
+            if indentifier in excluded_varnames:
                 continue
             self_value, self_is_known = self.variables[indentifier]
             other_value, other_is_known = other.variables[indentifier]
@@ -89,6 +103,48 @@ class OperatorRestrictionGetter[T](Protocol):
     def __call__(self, op_name: str, *args: T, other: None | T = None) -> Z3BoolExpression: ...
 
 
+# The program counter doesn't have to be encoded like the values of the variables. The
+# location of state_a is a constant in every disjunct of the transition relation, so the
+# location of state_b is one as well. ArithmeticLocation encodes the location with the
+# IntEncoding and computes it with "+" anyway, the encodings in sat.LOCATION_ENCODINGS
+# assign the constant directly.
+class LocationEncoding[L](Protocol):
+    def create_variable(self, name: str) -> L: ...
+
+    def at(self, variable: L, location: int) -> Z3BoolExpression: ...
+
+    # variable_a is at location, variable_b at location + distance
+    def successor(self, variable_a: L, location: int, distance: int, variable_b: L) -> Z3BoolExpression: ...
+
+    # holds if the variable encodes a location, e.g. exactly one bit for one-hot
+    def valid(self, variable: L) -> Z3BoolExpression: ...
+
+    def evaluate(self, model: z3.ModelRef, variable: L) -> int: ...
+
+
+@dataclasses.dataclass(slots=True, frozen=True)
+class ArithmeticLocation[T: IntEncoding]:
+    Encoding: Type[T]
+    get_operator_restriction: OperatorRestrictionGetter[T]
+
+    def create_variable(self, name: str) -> T:
+        return self.Encoding.create_variable(name)
+
+    def at(self, variable: T, location: int) -> Z3BoolExpression:
+        return variable == self.Encoding.create_literal(location)
+
+    def successor(self, variable_a: T, location: int, distance: int, variable_b: T) -> Z3BoolExpression:
+        return self.get_operator_restriction(
+            "+", variable_a, self.Encoding.create_literal(distance), other=variable_b
+        )
+
+    def valid(self, variable: T) -> Z3BoolExpression:
+        return z3.BoolVal(True)
+
+    def evaluate(self, model: z3.ModelRef, variable: T) -> int:
+        return self.Encoding.evaluate(model, variable)
+
+
 def get_single_transition_formulas[
     T: IntEncoding
 ](
@@ -98,12 +154,25 @@ def get_single_transition_formulas[
     state_b: StateVariable[T],
     create_literal: Callable[[int], T],
     get_operator_restriction: OperatorRestrictionGetter[T],
+    create_variable: Callable[[str], T],
+    location_encoding: LocationEncoding,
 ) -> tuple[Z3BoolExpression, ...]:
     # returns up to four subformulas
 
-    shared_conditions: list[Z3BoolExpression] = [state_a.location == create_literal(location)]
+    shared_conditions: list[Z3BoolExpression] = [location_encoding.at(state_a.location, location)]
 
     match instruction:
+        case (InstructionType.SET_VAR | InstructionType.INPUT, (str(var), *_)) if (
+            var not in state_b.variables
+        ):
+            # the variable is not encoded because it doesn't influence anything, see cone_of_influence
+            transition = z3.And(
+                location_encoding.successor(state_a.location, location, 1, state_b.location),
+                state_a.variables_equal(state_b),
+                *shared_conditions,
+            )
+            return (transition,)
+
         case (InstructionType.SET_VAR, (str(var), Operator(name=op_name), *args)):
             state_a_vars = [state_a.get(typing.cast(int | str, arg), create_literal) for arg in args]
 
@@ -114,7 +183,7 @@ def get_single_transition_formulas[
             )
 
             shared_conditions.append(
-                get_operator_restriction("+", state_a.location, create_literal(1), other=state_b.location)
+                location_encoding.successor(state_a.location, location, 1, state_b.location)
             )
             shared_conditions.append(state_a.variables_equal_except(state_b, var))
 
@@ -129,11 +198,11 @@ def get_single_transition_formulas[
             op_result = get_operator_restriction(op_name, *(v.value for v in state_a_vars))
 
             shared_conditions.append(state_a.variables_equal(state_b))
-            location_restriction_nojump = get_operator_restriction(
-                "+", state_a.location, create_literal(1), other=state_b.location
+            location_restriction_nojump = location_encoding.successor(
+                state_a.location, location, 1, state_b.location
             )
-            location_restriction_jump = get_operator_restriction(
-                "+", state_a.location, create_literal(jump_distance), other=state_b.location
+            location_restriction_jump = location_encoding.successor(
+                state_a.location, location, jump_distance, state_b.location
             )
 
             unknown_nojump_transition = z3.And(
@@ -144,10 +213,10 @@ def get_single_transition_formulas[
             )
 
             known_nojump_transition = z3.And(
-                location_restriction_nojump, a_vars_known, z3.Not(op_result), *shared_conditions
+                location_restriction_nojump, a_vars_known, op_result, *shared_conditions
             )
             known_jump_transition = z3.And(
-                location_restriction_jump, a_vars_known, op_result, *shared_conditions
+                location_restriction_jump, a_vars_known, z3.Not(op_result), *shared_conditions
             )
 
             return (
@@ -159,9 +228,7 @@ def get_single_transition_formulas[
 
         case (InstructionType.JUMP, (int(jump_distance),)):
             transition = z3.And(
-                get_operator_restriction(
-                    "+", state_a.location, create_literal(jump_distance), other=state_b.location
-                ),
+                location_encoding.successor(state_a.location, location, jump_distance, state_b.location),
                 state_a.variables_equal(state_b),
                 *shared_conditions,
             )
@@ -169,8 +236,22 @@ def get_single_transition_formulas[
 
         case (InstructionType.OUTPUT, *_):
             transition = z3.And(
-                get_operator_restriction("+", state_a.location, create_literal(1), other=state_b.location),
+                location_encoding.successor(state_a.location, location, 1, state_b.location),
+                state_a.variables_equal(state_b),
+                *shared_conditions,
+            )
+            return (transition,)
+
+        case (InstructionType.ASSERT, (Operator(name=op_name), *args)):
+            # a failing assertion has no successor, unknown values may pass it
+            state_a_vars = [state_a.get(typing.cast(int | str, arg), create_literal) for arg in args]
+            a_vars_known = z3.And([v.is_known for v in state_a_vars])
+            op_result = get_operator_restriction(op_name, *(v.value for v in state_a_vars))
+
+            transition = z3.And(
+                location_encoding.successor(state_a.location, location, 1, state_b.location),
                 state_a.variables_equal(state_b),
+                z3.Or(z3.Not(a_vars_known), op_result),
                 *shared_conditions,
             )
             return (transition,)
@@ -179,13 +260,65 @@ def get_single_transition_formulas[
             _, b_var_known = state_b.get(var, create_literal)
 
             transition = z3.And(
-                get_operator_restriction("+", state_a.location, create_literal(1), other=state_b.location),
+                location_encoding.successor(state_a.location, location, 1, state_b.location),
                 state_a.variables_equal_except(state_b, var),
                 b_var_known == z3.BoolVal(False),
                 *shared_conditions,
             )
             return (transition,)
 
+        case (InstructionType.ACCELERATED_LOOP, (LoopSummary() as summary, int(exit_distance))):
+            # The loop runs n times, n is the smallest number such that the guard is false after n
+            # iterations. If the loop never terminates, there is no such n and no successor.
+            name = f"{state_a.prefix}_loop_{location}"
+            iterations = create_variable(f"{name}_iterations")
+
+            def add_multiple(value: T, delta: int, result: T, result_name: str) -> Z3BoolExpression:
+                # result = value + n * delta
+                product = create_variable(f"{name}_{result_name}_product")
+                return z3.And(
+                    get_operator_restriction("*", iterations, create_literal(delta), other=product),
+                    get_operator_restriction("+", value, product, other=result),
+                )
+
+            counter, bound = (
+                state_a.get(typing.cast(int | str, arg), create_literal)
+                for arg in (summary.counter, summary.bound)
+            )
+            guard_known = z3.And(counter.is_known, bound.is_known)
+            delta = summary.counter_delta()
+            final_counter = create_variable(f"{name}_final_counter")
+            previous_counter = create_variable(f"{name}_previous_counter")
+            guard_name = summary.guard.name
+            iterations_restriction = z3.And(
+                get_operator_restriction(">=", iterations, create_literal(0)),
+                add_multiple(counter.value, delta, final_counter, "final_counter"),
+                get_operator_restriction("-", final_counter, create_literal(delta), other=previous_counter),
+                z3.Not(get_operator_restriction(guard_name, final_counter, bound.value)),
+                z3.Or(
+                    iterations == create_literal(0),
+                    get_operator_restriction(guard_name, previous_counter, bound.value),
+                ),
+            )
+
+            update_restrictions = []
+            for var, delta in summary.updates:
+                if var not in state_a.variables:
+                    continue
+                a_value, a_known = state_a.get(var, create_literal)
+                b_value, b_known = state_b.get(var, create_literal)
+                update_restrictions.append(b_known == z3.And(guard_known, a_known))
+                update_restrictions.append(z3.Implies(b_known, add_multiple(a_value, delta, b_value, var)))
+
+            transition = z3.And(
+                location_encoding.successor(state_a.location, location, exit_distance, state_b.location),
+                state_a.variables_equal_except(state_b, *(var for var, _ in summary.updates)),
+                z3.Implies(guard_known, iterations_restriction),
+                *update_restrictions,
+                *shared_conditions,
+            )
+            return (transition,)
+
         case _:
             raise ValueError(f"Invalid instruction: {instruction}")
 
@@ -193,22 +326,96 @@ def get_single_transition_formulas[
 def get_transition_relation[
     T: IntEncoding
 ](
-    program: Iterable[Instruction], Encoding: Type[T], get_operator_restriction: OperatorRestrictionGetter[T]
+    program: Iterable[Instruction],
+    Encoding: Type[T],
+    get_operator_restriction: OperatorRestrictionGetter[T],
+    template: bool = False,
+    variables: Iterable[str] | None = None,
+    location_encoding: LocationEncoding | None = None,
 ) -> Callable[[int, int], Z3BoolExpression]:
-    # The original approach was to create a formula with dummy variables first and then substitute them in
-    # is_successor, but this turned out to complicated. Also I'm not sure which is faster.
-
-    def is_successor(state_a_index: int, state_b_index: int) -> Z3BoolExpression:
-        state_a = StateVariable.init(str(state_a_index), Encoding.create_variable)
-        state_b = StateVariable.init(str(state_b_index), Encoding.create_variable)
+    # By default, the formula is built again for every pair of states. With template, it is built
+    # once for two placeholder states and every pair is a substitution of it, see TemplateRelation.
+    # The states contain the given variables (all variables of the program by default), the
+    # variables that are used in a branch or ASSERT have to be part of them, see cone_of_influence.
+    # The location is encoded with location_encoding, ArithmeticLocation by default.
+    program = list(program)
+    variables = sorted(optimizer.program_variables(program) if variables is None else variables)
+    if location_encoding is None:
+        location_encoding = ArithmeticLocation(Encoding, get_operator_restriction)
+    create_location = location_encoding.create_variable
+
+    def is_successor(state_a_index: int | str, state_b_index: int | str) -> Z3BoolExpression:
+        state_a = StateVariable.init(str(state_a_index), Encoding.create_variable, variables, create_location)
+        state_b = StateVariable.init(str(state_b_index), Encoding.create_variable, variables, create_location)
 
         transition_formulas = []
         for loc, inst in enumerate(program):
             transition_formulas.extend(
                 get_single_transition_formulas(
-                    inst, loc, state_a, state_b, Encoding.create_literal, get_operator_restriction
+                    inst,
+                    loc,
+                    state_a,
+                    state_b,
+                    Encoding.create_literal,
+                    get_operator_restriction,
+                    Encoding.create_variable,
+                    location_encoding,
                 )
             )
-        return z3.Or(transition_formulas)
+        valid = location_encoding.valid(state_b.location)
+        if z3.is_true(valid):
+            return z3.Or(transition_formulas)
+        return z3.And(z3.Or(transition_formulas), valid)
 
+    if template:
+        return TemplateRelation(is_successor(TemplateRelation.PREFIX_A, TemplateRelation.PREFIX_B))
     return is_successor
+
+
+class TemplateRelation:
+    """The transition relation between two placeholder states, instantiated for a pair of
+    states with z3.substitute.
+
+    The names of all variables of the formula start with the prefix of the state they
+    belong to (see StateVariable.init), so the placeholders are renamed to the variables
+    that is_successor would create. The helper variables of the encodings (e.g. the
+    carry bits of the SAT adder) are replaced by fresh ones in every step, otherwise
+    all steps would share them."""
+
+    PREFIX_A = "template_a"
+    PREFIX_B = "template_b"
+
+    def __init__(self, formula: Z3BoolExpression):
+        self.formula = formula
+        self.constants = _uninterpreted_constants(formula)
+
+    def __call__(self, state_a_index: int, state_b_index: int) -> Z3BoolExpression:
+        substitutions = []
+        for constant in self.constants:
+            name = constant.decl().name()
+            for prefix, index in (self.PREFIX_A, state_a_index), (self.PREFIX_B, state_b_index):
+                if name.startswith(f"{prefix}_"):
+                    new_constant = z3.Const(f"{index}{name.removeprefix(prefix)}", constant.sort())
+                    break
+            else:
+                new_constant = z3.FreshConst(constant.sort(), prefix=name.split("!")[0])
+            substitutions.append((constant, new_constant))
+        return typing.cast(z3.BoolRef, z3.substitute(self.formula, *substitutions))
+
+
+def _uninterpreted_constants(formula: Z3BoolExpression) -> list[z3.ExprRef]:
+    # every shared subexpression is only visited once
+    constants = []
+    visited = set()
+    # the encodings create no probes, a Python bool has no constants
+    stack = [] if isinstance(formula, bool) else [typing.cast(z3.ExprRef, formula)]
+    while stack:
+        expr = stack.pop()
+        if expr.get_id() in visited:
+            continue
+        visited.add(expr.get_id())
+        if z3.is_const(expr) and expr.decl().kind() == z3.Z3_OP_UNINTERPRETED:
+            constants.append(expr)
+        else:
+            stack.extend(expr.children())
+    return constants
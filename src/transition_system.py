@@ -1,62 +1,113 @@
 # Utilities for unrolling a WHILE program into a transition system with a limited
 # depth
 
-from typing import Iterable, NamedTuple, ClassVar
+from collections.abc import Container, Iterable, Iterator, Mapping, Sequence
+from typing import NamedTuple, ClassVar, Protocol, TextIO
 import itertools as it
+import bisect
+import operator
+import weakref
 import typing
 import dataclasses
 import collections
 import sys
 import argparse
+import concurrent.futures
+import contextlib
+import io
+import os
+import pickle
+import tempfile
+import types
 
-from while_parsing import Instruction, InstructionType, Operator, OperatorFunction
-import while_parsing
+from while_parsing import Instruction, InstructionType, Operator, LoopSummary
+import optimizer
+import acceleration
+import program_cache
+import intervals
+from intervals import Interval
+
+if typing.TYPE_CHECKING:
+    from state_store import StateStore
 
 
-@dataclasses.dataclass(slots=True, kw_only=True, frozen=True)
 class VariableSet:
-    _DATA: dict[str, int | None] = dataclasses.field(default_factory=dict)
+    """Immutable map from variables to values, variables that are not in it are 0.
+
+    The items are stored in a tuple sorted by variable, together with their hash. Equal
+    sets are interned, so the many states that share their variables also share the
+    memory, and comparing them is usually an identity check."""
+
+    __slots__ = ("_items", "_hash", "__weakref__")
+    _items: tuple[tuple[str, intervals.Value], ...]
+    _hash: int
+
+    _INTERNED: ClassVar[weakref.WeakValueDictionary] = weakref.WeakValueDictionary()
+
+    def __new__(cls, *, _DATA: Mapping[str, intervals.Value] = types.MappingProxyType({})) -> "VariableSet":
+        return cls._intern(tuple(sorted((var, value) for var, value in _DATA.items() if value != 0)))
 
-    def get(self, arg: str | int) -> int | None:
+    @classmethod
+    def _intern(cls, items: tuple[tuple[str, intervals.Value], ...]) -> "VariableSet":
+        variable_set = cls._INTERNED.get(items)
+        if variable_set is None:
+            variable_set = object.__new__(cls)
+            variable_set._items = items
+            variable_set._hash = hash(items)
+            cls._INTERNED[items] = variable_set
+        return variable_set
+
+    def get(self, arg: str | int) -> intervals.Value:
         if isinstance(arg, int):
             return arg
-        return self._DATA.get(arg, 0)
+        items = self._items
+        i = bisect.bisect_left(items, arg, key=_variable)
+        if i < len(items) and items[i][0] == arg:
+            return items[i][1]
+        return 0
 
-    def set(self, var, value) -> "VariableSet":
-        new_data = self._DATA.copy()
-        if value == 0:
-            new_data.pop(var, None)
-        else:
-            new_data[var] = value
-        return VariableSet(_DATA=new_data)
+    def set(self, var: str, value: intervals.Value) -> "VariableSet":
+        items = self._items
+        i = bisect.bisect_left(items, var, key=_variable)
+        end = i + 1 if i < len(items) and items[i][0] == var else i
+        new_item = ((var, value),) if value != 0 else ()
+        return VariableSet._intern(items[:i] + new_item + items[end:])
+
+    def items(self) -> tuple[tuple[str, intervals.Value], ...]:
+        return self._items
+
+    def restrict(self, variables: Container[str]) -> "VariableSet":
+        """Returns the set without the variables that are not in variables."""
+
+        items = tuple(item for item in self._items if item[0] in variables)
+        return self if len(items) == len(self._items) else VariableSet._intern(items)
+
+    def contains(self, other: "VariableSet") -> bool:
+        """Checks if every value of other is contained in the value of self (see intervals.py)."""
+
+        variables = {var for var, _ in self._items} | {var for var, _ in other._items}
+        return all(intervals.contains(self.get(var), other.get(var)) for var in variables)
+
+    def __eq__(self, other):
+        if not isinstance(other, VariableSet):
+            return NotImplemented
+        return self is other or self._items == other._items
 
     def __hash__(self):
-        return hash(frozenset(self._DATA.items()))
+        return self._hash
+
+    def __reduce__(self):
+        # unpickled sets are interned as well
+        return VariableSet._intern, (self._items,)
+
+    def __repr__(self):
+        return f"VariableSet(_DATA={dict(self._items)})"
 
     def __str__(self):
-        return ", ".join(f"{k}={v}" for k, v in self._DATA.items())
-
-
-# Alternative implementaion using tuples, it might be worthwhile to test which
-# is faster
-#
-# class VariableSet(tuple[tuple[str, int | None], ...]):
-#    # I use this aa hashable, immutable map
-#    def get_value(self, arg: str | int) -> int | None:
-#        if isinstance(arg, int):
-#            return arg
-#
-#        i = bisect.bisect_left(self, arg, key=lambda t: t[0])
-#        if i < len(self) and self[i][0] == arg:
-#            return self[i][1]
-#        return 0
-#
-#    def replace_var(self, changed_var: str, new_value: int | None) -> "VariableSet":
-#        i = bisect.bisect_left(self, changed_var, key=lambda t: t[0])
-#        if i < len(self) and self[i][0] == changed_var:
-#            return VariableSet(self[:i] + ((changed_var, new_value),) + self[i+1:])
-#        else:
-#            return VariableSet(self[:i] + ((changed_var, new_value),) + self[i:])
+        return ", ".join(f"{k}={v}" for k, v in self._items)
+
+
+_variable = operator.itemgetter(0)
 
 
 class State(NamedTuple):
@@ -75,65 +126,246 @@ class State(NamedTuple):
         data = {}
         for var in rest:
             k, v = var.split("=")
-            data[k] = None if v == "None" else int(v)
+            data[k] = None if v == "None" else Interval.from_string(v) if v.startswith("[") else int(v)
 
         return cls(int(location), VariableSet(_DATA=data))
 
 
-def _init_ts_successor() -> dict[State, tuple[State]]:
-    return collections.defaultdict(lambda: (TransitionSystem.SINK_STATE,))
+class Transitions(Protocol):
+    # what TransitionSystem needs from its transitions: a dict, or e.g. the transitions of a
+    # state_store.DiskStateStore. States without transitions lead to the sink state.
+
+    def __getitem__(self, state: State, /) -> tuple[State, ...]: ...
+
+    def __setitem__(self, state: State, successors: tuple[State, ...], /) -> None: ...
+
+    def __contains__(self, state: object, /) -> bool: ...
+
+    def __len__(self) -> int: ...
+
+    def __iter__(self) -> Iterator[State]: ...
+
+    def items(self) -> Iterable[tuple[State, tuple[State, ...]]]: ...
+
+    def values(self) -> Iterable[tuple[State, ...]]: ...
+
+
+class VisitedStates(Protocol):
+    # what TransitionSystem needs from its visited states: a set or e.g. a bitstate.BitstateSet
+
+    def add(self, state: State, /) -> None: ...
+
+    def __contains__(self, state: object, /) -> bool: ...
+
+    def __len__(self) -> int: ...
+
+    def __iter__(self) -> Iterator[State]: ...
+
+
+def _sink_successors() -> tuple[State, ...]:
+    # a module level function instead of a lambda, so the transitions can be pickled
+    return (TransitionSystem.SINK_STATE,)
+
+
+def _init_ts_successor() -> dict[State, tuple[State, ...]]:
+    return collections.defaultdict(_sink_successors)
+
+
+@dataclasses.dataclass(slots=True)
+class UnrollStats:
+    expanded: int = 0  # states whose successors were computed
+    duplicates: int = 0  # successors that were dropped because they were already visited
+    subsumed: int = 0  # duplicates that were only contained in a visited state
+    frontier_sizes: list[int] = dataclasses.field(default_factory=list)  # new states per depth
+
+    def __str__(self):
+        return (
+            f"Expanded states: {self.expanded}, duplicates dropped: {self.duplicates}"
+            f" ({self.subsumed} subsumed)\n"
+            f"Frontier size per depth: {' '.join(map(str, self.frontier_sizes))}"
+        )
+
+
+# visited states with unknown values by location, by the variables with unknown values
+# and by the other values, see TransitionSystem._subsuming_state
+type AbstractStates = dict[int, dict[frozenset[str], dict[tuple, list[State]]]]
 
 
 @dataclasses.dataclass(slots=True)
 class TransitionSystem:
+    """A program unrolled for depth steps, see unroll_while_program.
+
+    The system remembers its frontier and the visited states, so extend can continue
+    the unrolling. It can be pickled to resume a long unrolling later."""
+
     SINK_STATE: ClassVar[State] = State(-1, VariableSet())
 
     depth: int
     initial_state: State = State(0, VariableSet())
-    transitions: dict[State, tuple[State, ...]] = dataclasses.field(default_factory=_init_ts_successor)
+    # the dict is only listed for the type checker, so dict literals are inferred as transitions
+    transitions: dict[State, tuple[State, ...]] | Transitions = dataclasses.field(
+        default_factory=_init_ts_successor
+    )
+    stats: UnrollStats = dataclasses.field(default_factory=UnrollStats, compare=False)
+    # options of the unrolling, see unroll_while_program
+    project: bool = False
+    use_intervals: bool = False
+    # the states that were reached in the last step, they are expanded next
+    frontier: list[State] = dataclasses.field(default_factory=list, compare=False)
+    # every state is only expanded once, in the first depth it is reached in
+    visited: VisitedStates = dataclasses.field(default_factory=set, compare=False)
+    abstract_states: AbstractStates = dataclasses.field(
+        default_factory=lambda: collections.defaultdict(dict), compare=False
+    )
+
+    def __post_init__(self):
+        if not self.visited:
+            self.visited.add(self.initial_state)
+            self.frontier.append(self.initial_state)
+            if self.use_intervals:
+                self._add_abstract_state(self.initial_state)
 
     def __str__(self):
-        transition_str = "\n".join(
-            f"    {k} -> {' | '.join(map(str, v))}" for k, v in self.transitions.items()
-        )
-        return (
-            f"TransitionSystem(depth={self.depth}, initial_state={self.initial_state},"
-            f" transitions=\n{transition_str}\n)"
-        )
-
-
-def get_next_states(program: list[Instruction], state: State) -> tuple[State, ...]:
+        buffer = io.StringIO()
+        self.write(buffer)
+        return buffer.getvalue()
+
+    def write(self, file: TextIO):
+        """Writes str(self) to the file one transition at a time, see ts_export.py for other formats."""
+
+        file.write(f"TransitionSystem(depth={self.depth}, initial_state={self.initial_state}, transitions=\n")
+        for k, v in self.transitions.items():
+            file.write(f"    {k} -> {' | '.join(map(str, v))}\n")
+        file.write(")" if self.transitions else "\n)")
+
+    def extend(self, program: list[Instruction], extra_depth: int, workers: int = 1) -> "TransitionSystem":
+        """Unrolls extra_depth more steps from the frontier and returns self.
+
+        The program has to be the one the system was unrolled from. With workers > 1,
+        large layers are expanded by a pool of worker processes."""
+
+        live = optimizer.live_variables(program) if self.project else None
+        stats = self.stats
+        visited = self.visited
+        current_states = self.frontier
+
+        with contextlib.ExitStack() as stack:
+            executor = None
+            if workers > 1:
+                executor = stack.enter_context(
+                    concurrent.futures.ProcessPoolExecutor(
+                        workers, initializer=_init_worker, initargs=(program, self.use_intervals)
+                    )
+                )
+
+            for _ in range(extra_depth):
+                if executor is not None and len(current_states) >= MIN_PARALLEL_FRONTIER:
+                    layer_successors = _expand_parallel(executor, workers, current_states)
+                else:
+                    layer_successors = [
+                        get_next_states(program, state, self.use_intervals) for state in current_states
+                    ]
+                stats.expanded += len(current_states)
+
+                next_states = []
+                for state, successor_states in zip(current_states, layer_successors):
+                    if live is not None:
+                        successor_states = tuple(
+                            project_state(live, successor) for successor in successor_states
+                        )
+                    if self.use_intervals:
+                        successor_states = tuple(map(self._subsuming_state, successor_states))
+                    if successor_states:
+                        self.transitions[state] = successor_states
+                    for successor in successor_states:
+                        if successor in visited:
+                            stats.duplicates += 1
+                        else:
+                            visited.add(successor)
+                            next_states.append(successor)
+                            if self.use_intervals:
+                                self._add_abstract_state(successor)
+                stats.frontier_sizes.append(len(next_states))
+                current_states = next_states
+                self.depth += 1
+                self.frontier = current_states
+
+        return self
+
+    # Only visited states with unknown values can subsume other states. They are indexed
+    # by location, the variables with unknown values and the other values, which have to
+    # be the same in the subsumed state.
+
+    @staticmethod
+    def _concrete_items(variables: VariableSet, unknown: frozenset[str]) -> tuple:
+        return tuple(item for item in variables.items() if item[0] not in unknown)
+
+    def _add_abstract_state(self, state: State):
+        unknown = frozenset(var for var, value in state.variables.items() if not isinstance(value, int))
+        if unknown:
+            table = self.abstract_states[state.location].setdefault(unknown, {})
+            table.setdefault(self._concrete_items(state.variables, unknown), []).append(state)
+
+    def _subsuming_state(self, state: State) -> State:
+        if state not in self.visited:
+            for unknown, table in self.abstract_states[state.location].items():
+                for candidate in table.get(self._concrete_items(state.variables, unknown), ()):
+                    if candidate.variables.contains(state.variables):
+                        self.stats.subsumed += 1
+                        return candidate
+        return state
+
+
+def get_next_states(
+    program: list[Instruction], state: State, use_intervals: bool = False
+) -> tuple[State, ...]:
     # returns 0, 1 or 2 states
+    # with use_intervals, unknown values are tracked as intervals, see intervals.py
     location, variables = state
     if location not in range(len(program)):
         return ()
     instruction = program[location]
 
-    def apply_op(op: OperatorFunction, values: Iterable[int | None]) -> int | None:
-        args: list[int] = []
-        for v in values:
-            if v is None:
-                return None
-            args.append(v)
-        return op(*args)
+    def apply_op(op: Operator, args: list[str | int]) -> intervals.Value:
+        values: list[int] = []
+        for v in map(variables.get, args):
+            if v is None or isinstance(v, Interval):
+                return intervals.evaluate(op.name, args, variables.get) if use_intervals else None
+            values.append(v)
+        return op.f(*values)
+
+    def refine(op: Operator, args: list[str | int], holds: bool) -> VariableSet | None:
+        refined = intervals.refine(op.name, args, variables.get, holds)
+        if refined is None:
+            return None
+        new_variables = variables
+        for var, value in refined.items():
+            new_variables = new_variables.set(var, value)
+        return new_variables
 
     match instruction:
-        case (InstructionType.SET_VAR, (str(var), Operator(f=op), *args)):
+        case (InstructionType.SET_VAR, (str(var), Operator() as op, *args)):
             # i cant find a good why to type this in the case statement
-            arg_values = map(variables.get, typing.cast(list[str | int], args))
-            result = apply_op(op, arg_values)
+            result = apply_op(op, typing.cast(list[str | int], args))
             return (State(location + 1, variables.set(var, result)),)
 
-        case (InstructionType.JUMP_IF_NOT, (Operator(f=op), *args, int(jump_distance))):
-            arg_values = map(variables.get, typing.cast(list[str | int], args))
-            result = apply_op(op, arg_values)
-
-            if result is None:
-                return State(location + 1, variables), State(location + jump_distance, variables)
+        case (InstructionType.JUMP_IF_NOT, (Operator() as op, *args, int(jump_distance))):
+            args = typing.cast(list[str | int], args)
+            result = apply_op(op, args)
+
+            if result is None or isinstance(result, Interval):
+                if not use_intervals:
+                    return State(location + 1, variables), State(location + jump_distance, variables)
+                # only the feasible branches, with the values refined by the condition
+                return tuple(
+                    State(next_location, refined)
+                    for next_location, holds in [(location + 1, True), (location + jump_distance, False)]
+                    if (refined := refine(op, args, holds)) is not None
+                )
             if result == 0:
-                return (State(location + 1, variables),)
-            else:
                 return (State(location + jump_distance, variables),)
+            else:
+                return (State(location + 1, variables),)
 
         case (InstructionType.JUMP, (int(jump_distance),)):
             return (State(location + jump_distance, variables),)
@@ -145,23 +377,146 @@ def get_next_states(program: list[Instruction], state: State) -> tuple[State, ..
         case (InstructionType.OUTPUT, _):
             return (State(location + 1, variables),)
 
+        case (InstructionType.ASSERT, (Operator() as op, *args)):
+            # a failing assertion stops the program, if it may fail we continue with
+            # the values for which it holds
+            args = typing.cast(list[str | int], args)
+            result = apply_op(op, args)
+            if result is None or isinstance(result, Interval):
+                refined = refine(op, args, True) if use_intervals else variables
+                return () if refined is None else (State(location + 1, refined),)
+            return (State(location + 1, variables),) if result else ()
+
+        case (InstructionType.ACCELERATED_LOOP, (LoopSummary() as summary, int(exit_distance))):
+            counter, bound = variables.get(summary.counter), variables.get(summary.bound)
+            if not isinstance(counter, int) or not isinstance(bound, int):
+                # we don't know how often the loop runs
+                for var, _ in summary.updates:
+                    variables = variables.set(var, None)
+                return (State(location + exit_distance, variables),)
+
+            iterations = summary.iterations(counter, bound)
+            if iterations is None:
+                return (state,)  # the loop never terminates
+            for var, delta in summary.updates:
+                value = variables.get(var)
+                if isinstance(value, Interval):
+                    value = intervals.to_value(
+                        Interval(value.low + iterations * delta, value.high + iterations * delta)
+                    )
+                elif value is not None:
+                    value += iterations * delta
+                variables = variables.set(var, value)
+            return (State(location + exit_distance, variables),)
+
         case _:
             raise ValueError(f"Invalid instruction: {instruction}")
 
 
-def unroll_while_program(program: list[Instruction], depth: int) -> TransitionSystem:
-    ts = TransitionSystem(depth)
-    current_states: list[State] = [ts.initial_state]
+def project_state(live: Sequence[frozenset[str]], state: State) -> State:
+    """Drops the variables that are dead at the location of the state.
+
+    live is the result of optimizer.live_variables. Dead variables are written before
+    they are read again, so states that only differ in them behave the same."""
+
+    location, variables = state
+    if location < 0:
+        return state
+    return State(location, variables.restrict(live[min(location, len(live) - 1)]))
+
+
+# Parallel unrolling: every worker process gets the program once, then the layers are
+# split into chunks by the hash of the states. The successors are merged in the order
+# of the layer, so the result is the same as without workers.
+
+# smaller layers are expanded in the main process, sending them to the workers takes longer
+MIN_PARALLEL_FRONTIER = 256
+_worker_program: list[Instruction] = []
+_worker_use_intervals = False
+
+
+def _init_worker(program: list[Instruction], use_intervals: bool):
+    global _worker_program, _worker_use_intervals
+    _worker_program = program
+    _worker_use_intervals = use_intervals
+
+
+def _expand_states(states: list[State]) -> list[tuple[State, ...]]:
+    return [get_next_states(_worker_program, state, _worker_use_intervals) for state in states]
+
+
+def _expand_parallel(
+    executor: concurrent.futures.Executor, num_chunks: int, states: list[State]
+) -> list[tuple[State, ...]]:
+    chunks: list[list[State]] = [[] for _ in range(num_chunks)]
+    for state in states:
+        chunks[hash(state) % num_chunks].append(state)
+
+    successors: dict[State, tuple[State, ...]] = {}
+    for chunk, chunk_successors in zip(chunks, executor.map(_expand_states, chunks)):
+        successors.update(zip(chunk, chunk_successors))
+    return [successors[state] for state in states]
+
+
+def unroll_while_program(
+    program: list[Instruction],
+    depth: int,
+    initial_state: State | None = None,
+    workers: int = 1,
+    project: bool = False,
+    use_intervals: bool = False,
+    store: "StateStore | None" = None,
+) -> TransitionSystem:
+    """Unrolls the program breadth first for depth steps.
+
+    With workers > 1, large layers are expanded by a pool of worker processes. With
+    project, the variables that are dead at the location of a state are dropped from
+    it (see project_state), which merges states that only differ in them.
+
+    With use_intervals, unknown values are intervals that are refined by the branches,
+    and infeasible branches are dropped. A successor that is contained in a visited
+    state at the same location (see VariableSet.contains) is replaced by that state.
+
+    The transitions and visited states are kept in the store, if it is given (see
+    state_store.py). Use TransitionSystem.extend to unroll the result further."""
+
+    if initial_state is None:
+        initial_state = State(0, VariableSet())
+    if project:
+        initial_state = project_state(optimizer.live_variables(program), initial_state)
+    if store is None:
+        ts = TransitionSystem(0, initial_state, project=project, use_intervals=use_intervals)
+    else:
+        ts = TransitionSystem(
+            0,
+            initial_state,
+            transitions=store.transitions,
+            visited=store.visited,
+            project=project,
+            use_intervals=use_intervals,
+        )
+    return ts.extend(program, depth, workers)
+
+
+def save_checkpoint(path: str | os.PathLike, program: list[Instruction], ts: TransitionSystem):
+    """Pickles the transition system together with its program, see load_checkpoint."""
+
+    directory = os.path.dirname(os.path.abspath(path))
+    # write to a temporary file first, so an interrupted run doesn't destroy the old checkpoint
+    with tempfile.NamedTemporaryFile(dir=directory, suffix=".tmp", delete=False) as file:
+        pickle.dump((program, ts), file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(file.name, path)
 
-    for _ in range(ts.depth):
-        next_states = []
-        for state in current_states:
-            successor_states = get_next_states(program, state)
-            if successor_states:
-                ts.transitions[state] = successor_states
-            next_states.extend(s for s in successor_states if s not in ts.transitions)
-        current_states = next_states
 
+def load_checkpoint(path: str | os.PathLike, program: list[Instruction]) -> TransitionSystem:
+    """Loads a transition system saved by save_checkpoint, it can be unrolled further with extend.
+
+    Raises a ValueError if it was unrolled from a different program."""
+
+    with open(path, "rb") as file:
+        saved_program, ts = pickle.load(file)
+    if saved_program != program:
+        raise ValueError(f"The checkpoint {path} belongs to a different program")
     return ts
 
 
@@ -169,18 +524,146 @@ def main():
     parser = argparse.ArgumentParser(description="Unroll a WHILE program for a given number of steps and show the resulting transition system.")
     parser.add_argument("input_file", help="The input file containing the WHILE program.")
     parser.add_argument("steps", type=int, help="The number of steps to unroll the WHILE program.")
-    
+    parser.add_argument(
+        "-O", "--optimize", action="store_true", help="Optimize the program before unrolling it."
+    )
+    parser.add_argument(
+        "--accelerate", action="store_true", help="Replace simple counting loops by a single step."
+    )
+    parser.add_argument(
+        "--cache", action="store_true", help="Cache the parsed and optimized program on disk."
+    )
+    parser.add_argument(
+        "--project",
+        action="store_true",
+        help="Drop dead variables from the states and compare the number of states to the full unrolling.",
+    )
+    parser.add_argument(
+        "--intervals",
+        action="store_true",
+        help="Track intervals for unknown values and only follow the feasible branches.",
+    )
+    parser.add_argument(
+        "--checkpoint",
+        metavar="FILE",
+        help="Continue the unrolling saved in FILE (if it exists) and save the result to it.",
+    )
+    parser.add_argument(
+        "--store",
+        metavar="DIR",
+        help="Keep the states and transitions in memory mapped files in DIR instead of in memory.",
+    )
+    parser.add_argument(
+        "--bitstate",
+        type=int,
+        metavar="BYTES",
+        help="Only store a few bits per visited state in a bit array of this size (see bitstate.py).",
+    )
+    parser.add_argument(
+        "--hash-functions", type=int, default=3, help="Number of bits per state for --bitstate."
+    )
+    parser.add_argument(
+        "-j", "--workers", type=int, default=1, help="Number of processes that expand the states."
+    )
+    parser.add_argument(
+        "-f",
+        "--format",
+        choices=["text", "jsonl", "dot"],
+        default="text",
+        help="Format of the transitions, see ts_export.py.",
+    )
+    parser.add_argument(
+        "-o", "--output", metavar="FILE", help="Write the transitions to FILE instead of stdout."
+    )
+    parser.add_argument(
+        "--csr",
+        metavar="FILE",
+        help="Also save the transitions as NumPy arrays in FILE (.npz), see ts_export.py.",
+    )
+
     args = parser.parse_args()
-    
+    if args.store and (args.checkpoint or args.intervals):
+        parser.error("--store can't be combined with --checkpoint or --intervals")
+    if args.bitstate and (args.store or args.checkpoint):
+        parser.error("--bitstate can't be combined with --store or --checkpoint")
+
     with open(args.input_file) as file:
         source = file.read().splitlines()
 
-    program = while_parsing.parse_program(source)
-    ts = unroll_while_program(list(program), args.steps)
-    
-    print(ts)
-    print(f"Total states: {1 + len(set(it.chain.from_iterable(ts.transitions.values())))}")
+    passes = [
+        *(optimizer.DEFAULT_PASSES if args.optimize else ()),
+        *([acceleration.accelerate_loops] if args.accelerate else ()),
+    ]
+    cache = program_cache.ProgramCache() if args.cache else None
+    program = program_cache.load_program(source, passes, cache)
+
+    with contextlib.ExitStack() as stack:
+        store: "StateStore | None" = None
+        bitstate_store = None
+        if args.store:
+            import state_store  # it imports this module
+
+            # closed at the end of the with block, also on errors
+            store = stack.enter_context(
+                state_store.DiskStateStore(state_store.state_variables(program), args.store)
+            )
+        if args.bitstate:
+            import bitstate  # it imports this module
+
+            store = bitstate_store = bitstate.BitstateStore.with_memory(args.bitstate, args.hash_functions)
+
+        if args.checkpoint and os.path.exists(args.checkpoint):
+            ts = load_checkpoint(args.checkpoint, program)
+            if (ts.project, ts.use_intervals) != (args.project, args.intervals):
+                parser.error("--project and --intervals have to be the same as for the checkpoint")
+            ts.extend(program, max(args.steps - ts.depth, 0), args.workers)
+        else:
+            ts = unroll_while_program(
+                program,
+                args.steps,
+                workers=args.workers,
+                project=args.project,
+                use_intervals=args.intervals,
+                store=store,
+            )
+        if args.checkpoint:
+            save_checkpoint(args.checkpoint, program, ts)
+
+        if bitstate_store is not None:
+            # the transitions were not stored
+            print(f"Transitions: {bitstate_store.transitions.count}")
+            print(ts.stats)
+            print(bitstate_store.visited.report())
+            return
+
+        import ts_export  # it imports this module
+
+        if args.output:
+            with open(args.output, "w") as file:
+                ts_export.FORMATS[args.format](ts, file)
+        else:
+            ts_export.FORMATS[args.format](ts, sys.stdout)
+            if args.format == "text":
+                print()
+        if args.csr:
+            ts_export.write_csr(ts, args.csr)
+
+        # every state that was reached is visited, also the states at the maximum depth
+        if args.project:
+            full_ts = unroll_while_program(
+                program, args.steps, workers=args.workers, use_intervals=args.intervals
+            )
+            print(
+                f"Total states: {len(ts.visited)} (without dropping dead variables: {len(full_ts.visited)})"
+            )
+        else:
+            print(f"Total states: {len(ts.visited)}")
+        print(ts.stats)
 
 
 if __name__ == "__main__":
-    main()
+    # state_store, bitstate and ts_export import transition_system, so we run main from the imported module to
+    # make sure that everything uses the same State class
+    import transition_system
+
+    transition_system.main()
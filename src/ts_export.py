@@ -0,0 +1,236 @@
+# Export of transition systems
+#
+# The text exporters write one transition at a time, so a large transition system
+# never has to be turned into one string:
+#
+#   - jsonl: a header line with the options of the unrolling, then one line per
+#     transition. A state is {"location": 3, "variables": {"x": 5, "y": null, "z": [0, null]}},
+#     unknown values are null and intervals are [low, high] with null for an infinite
+#     bound. read_jsonl reads it back.
+#   - dot: a graphviz digraph, the states are numbered in the order they are first
+#     reached
+#
+# write_csr saves the graph as NumPy arrays in a .npz file: the successors in
+# compressed sparse row form and a table with the location and the values of every
+# state. load_csr reads it back without parsing any text:
+#
+#     graph = load_csr("unrolled.npz")
+#     graph.targets[graph.offsets[i] : graph.offsets[i + 1]]  # successors of state i
+#     graph.state(i)
+
+from collections.abc import Callable, Iterable, Iterator
+from typing import NamedTuple, TextIO
+import array
+import json
+import math
+import os
+
+import numpy as np
+
+from transition_system import State, TransitionSystem, VariableSet
+from intervals import Interval, Value
+
+
+def _value_to_json(value: Value) -> int | list[int | None] | None:
+    match value:
+        case None:
+            return None
+        case Interval(low, high):
+            return [None if math.isinf(low) else int(low), None if math.isinf(high) else int(high)]
+    return int(value)  # comparisons assign bools
+
+
+def _value_from_json(value: int | list[int | None] | None) -> Value:
+    match value:
+        case [low, high]:
+            return Interval(-math.inf if low is None else low, math.inf if high is None else high)
+        case int() | None:
+            return value
+    raise ValueError(f"Invalid value: {value}")
+
+
+def _state_to_json(state: State) -> dict:
+    variables = {var: _value_to_json(value) for var, value in state.variables.items()}
+    return {"location": state.location, "variables": variables}
+
+
+def _state_from_json(state: dict) -> State:
+    variables = {var: _value_from_json(value) for var, value in state["variables"].items()}
+    return State(state["location"], VariableSet(_DATA=variables))
+
+
+def write_jsonl(ts: TransitionSystem, file: TextIO):
+    header = {
+        "depth": ts.depth,
+        "initial_state": _state_to_json(ts.initial_state),
+        "project": ts.project,
+        "use_intervals": ts.use_intervals,
+    }
+    file.write(json.dumps(header) + "\n")
+    for state, successors in ts.transitions.items():
+        transition = {"state": _state_to_json(state), "successors": list(map(_state_to_json, successors))}
+        file.write(json.dumps(transition) + "\n")
+
+
+def _parse_transitions(lines: Iterator[str]) -> Iterator[tuple[State, tuple[State, ...]]]:
+    for line in lines:
+        transition = json.loads(line)
+        yield _state_from_json(transition["state"]), tuple(map(_state_from_json, transition["successors"]))
+
+
+def iter_jsonl(file: Iterable[str]) -> Iterator[tuple[State, tuple[State, ...]]]:
+    """Yields the transitions of a file written by write_jsonl one by one."""
+
+    lines = iter(file)
+    next(lines, None)  # the header
+    return _parse_transitions(lines)
+
+
+def read_jsonl(file: Iterable[str]) -> TransitionSystem:
+    """Reads a transition system written by write_jsonl.
+
+    The frontier is not exported, so the result can't be extended, use
+    save_checkpoint for that."""
+
+    lines = iter(file)
+    header = json.loads(next(lines))
+    initial_state = _state_from_json(header["initial_state"])
+    visited = {initial_state}
+    ts = TransitionSystem(
+        header["depth"],
+        initial_state,
+        project=header["project"],
+        use_intervals=header["use_intervals"],
+        visited=visited,
+    )
+    for state, successors in _parse_transitions(lines):
+        ts.transitions[state] = successors
+        visited.update(successors)
+    return ts
+
+
+def write_dot(ts: TransitionSystem, file: TextIO):
+    ids: dict[State, int] = {}
+
+    def node(state: State) -> str:
+        if state not in ids:
+            ids[state] = len(ids)
+            file.write(f'    n{ids[state]} [label="{state}"];\n')
+        return f"n{ids[state]}"
+
+    file.write("digraph TransitionSystem {\n")
+    file.write(f"    // depth {ts.depth}\n")
+    node(ts.initial_state)
+    file.write("    n0 [peripheries=2];\n")
+    for state, successors in ts.transitions.items():
+        source = node(state)
+        for successor in successors:
+            file.write(f"    {source} -> {node(successor)};\n")
+    file.write("}\n")
+
+
+FORMATS: dict[str, Callable[[TransitionSystem, TextIO], None]] = {
+    "text": TransitionSystem.write,
+    "jsonl": write_jsonl,
+    "dot": write_dot,
+}
+
+
+class CSRGraph(NamedTuple):
+    """A transition system as arrays, the state with id i has the successors
+    targets[offsets[i]:offsets[i + 1]]. The initial state has id 0."""
+
+    depth: int
+    offsets: np.ndarray  # int64, number of states + 1
+    targets: np.ndarray  # int64 ids
+    locations: np.ndarray  # int64, for every state
+    values: np.ndarray  # int64, number of states x number of variables
+    unknown: np.ndarray  # bool, like values, True for the unknown (None) values
+    variables: tuple[str, ...]
+
+    @property
+    def num_states(self) -> int:
+        return len(self.locations)
+
+    def successors(self, state_id: int) -> np.ndarray:
+        return self.targets[self.offsets[state_id] : self.offsets[state_id + 1]]
+
+    def state(self, state_id: int) -> State:
+        values, unknown = self.values[state_id], self.unknown[state_id]
+        items = tuple(
+            (var, None if unknown[i] else int(values[i]))
+            for i, var in enumerate(self.variables)
+            if values[i] != 0 or unknown[i]
+        )
+        return State(int(self.locations[state_id]), VariableSet._intern(items))
+
+    def to_transition_system(self) -> TransitionSystem:
+        # like read_jsonl, the result can't be extended
+        states = [self.state(i) for i in range(self.num_states)]
+        ts = TransitionSystem(self.depth, states[0], visited=set(states))
+        for i, state in enumerate(states):
+            successors = self.successors(i)
+            if len(successors):
+                ts.transitions[state] = tuple(states[j] for j in successors)
+        return ts
+
+
+def write_csr(ts: TransitionSystem, path: str | os.PathLike):
+    """Saves the transition system as a CSRGraph in a .npz file.
+
+    Only states with int and None values can be saved, so not the intervals of
+    use_intervals, and the values have to fit into 64 bits."""
+
+    # the edges are collected in compact arrays and sorted by their source at the end
+    ids: dict[State, int] = {ts.initial_state: 0}
+    sources, targets = array.array("q"), array.array("q")
+    for state, successors in ts.transitions.items():
+        source = ids.setdefault(state, len(ids))
+        for successor in successors:
+            sources.append(source)
+            targets.append(ids.setdefault(successor, len(ids)))
+
+    variables = sorted({var for state in ids for var, _ in state.variables.items()})
+    indices = {var: i for i, var in enumerate(variables)}
+    locations = np.fromiter((state.location for state in ids), np.int64, len(ids))
+    values = np.zeros((len(ids), len(variables)), np.int64)
+    unknown = np.zeros((len(ids), len(variables)), bool)
+    for state_id, state in enumerate(ids):
+        for var, value in state.variables.items():
+            if value is None:
+                unknown[state_id, indices[var]] = True
+            elif isinstance(value, int):
+                try:
+                    values[state_id, indices[var]] = value
+                except OverflowError:
+                    raise ValueError(f"A value of {state} doesn't fit into 64 bits") from None
+            else:
+                raise ValueError(f"Only int and None values can be saved, not {value}")
+
+    sources_array = np.frombuffer(sources, np.int64)
+    order = np.argsort(sources_array, kind="stable")  # keeps the order of the successors
+    offsets = np.zeros(len(ids) + 1, np.int64)
+    np.cumsum(np.bincount(sources_array, minlength=len(ids)), out=offsets[1:])
+    np.savez(
+        path,
+        depth=np.int64(ts.depth),
+        offsets=offsets,
+        targets=np.frombuffer(targets, np.int64)[order],
+        locations=locations,
+        values=values,
+        unknown=unknown,
+        variables=np.array(variables, dtype=str),
+    )
+
+
+def load_csr(path: str | os.PathLike) -> CSRGraph:
+    with np.load(path) as data:
+        return CSRGraph(
+            int(data["depth"]),
+            data["offsets"],
+            data["targets"],
+            data["locations"],
+            data["values"],
+            data["unknown"],
+            tuple(map(str, data["variables"])),
+        )
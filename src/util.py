@@ -1,6 +1,9 @@
-import z3
+from typing import Literal, Callable, Protocol, TYPE_CHECKING
 
-from typing import Literal, Callable, Protocol
+# z3 is slow to import and only needed for the encodings, the type aliases below are
+# evaluated lazily, so the interpreter and the unroller never load it
+if TYPE_CHECKING:
+    import z3
 
 type Z3Expression = z3.ExprRef | z3.Tactic
 type Z3BoolExpression = z3.BoolRef | Literal[True] | Literal[False] | z3.Probe
@@ -13,11 +16,3 @@ class Variadic[Arg, Ret](Protocol):  # new python 3.12 generic type syntax
 type OperatorFunction[Arg, Ret] = (  # new python 3.12 type alias syntax
     Callable[[], Ret] | Callable[[Arg], Ret] | Callable[[Arg, Arg], Ret] | Variadic[Arg, Ret]
 )
-
-
-def to_z3_bool(z3_var: Z3Expression) -> Z3BoolExpression:
-    return z3_var != z3.IntVal(0)
-
-
-def to_z3_int(z3_bool: Z3BoolExpression) -> Z3Expression:
-    return z3.If(z3_bool, z3.IntVal(1), z3.IntVal(0))
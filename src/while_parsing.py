@@ -20,13 +20,15 @@
 #             | "WHILE ", expression, " DO\n", while_program, "END WHILE\n"
 #             | "INPUT ", var
 #             | "OUTPUT ", expression
+#             | "ASSERT ", expression
 #             | comment;
 #
 #   while_program = {statement};
 #
-# TODO: add ASSERT statement
+# A failing ASSERT stops the program with an AssertionError. The model checkers
+# (see bmc.py) search for a trace to a failing ASSERT.
 
-from collections.abc import Sequence, Iterator, Iterable
+from collections.abc import Callable, Sequence, Iterator, Iterable
 from typing import NamedTuple
 from enum import Enum
 import argparse
@@ -34,20 +36,30 @@ import itertools as it
 import math
 import inspect
 import collections
+import dataclasses
+import typing
 
 from util import OperatorFunction
 
+if typing.TYPE_CHECKING:
+    from profiler import Profile
+
 
 class Operator(NamedTuple):
     name: str
     is_infix: bool
     f: OperatorFunction[int, int]  # changed to Any for compaitibly with z3.BitVec
 
+    def __reduce__(self):
+        # operators are pickled by name (lambdas can't be pickled), see program_cache.py
+        return get_operator, (self.name,)
+
 
 OPERATORS: dict[str, Operator] = {
     op.name: op
     for op in [
         Operator("FALSE", False, lambda: 0),
+        Operator("TRUE", False, lambda: 1),
         Operator("NOT", False, lambda n: n == 0),
         Operator("--", False, lambda n: -n),
         Operator("ID", False, lambda n: n),
@@ -63,7 +75,7 @@ OPERATORS: dict[str, Operator] = {
         Operator("-", True, lambda a, b: a - b),
         Operator("*", True, lambda a, b: a * b),
         Operator("/", True, lambda a, b: a // b),
-        Operator("%", True, lambda a, b: a // b),
+        Operator("%", True, lambda a, b: a % b),
         Operator("^", True, lambda a, b: a**b),
         Operator("ALL", False, lambda *args: all(args)),
         Operator("ANY", False, lambda *args: any(args)),
@@ -72,75 +84,128 @@ OPERATORS: dict[str, Operator] = {
     ]
 }
 
+
+def get_operator(name: str) -> Operator:
+    return OPERATORS[name]
+
+
 InstructionType = Enum(
     "InstructionType",
-    ["SET_VAR", "JUMP_IF_NOT", "JUMP", "INPUT", "OUTPUT"],
+    ["SET_VAR", "JUMP_IF_NOT", "JUMP", "INPUT", "OUTPUT", "ACCELERATED_LOOP", "ASSERT"],
     # the jump instructions use relative addresses
+    # ACCELERATED_LOOP is never created by the parser, see acceleration.py
 )
 
-KEYWORDS = [":=", "IF", "THEN", "ELSE", "END", "INPUT", "OUTPUT", "WHILE", "DO"]
+KEYWORDS = [":=", "IF", "THEN", "ELSE", "END", "INPUT", "OUTPUT", "WHILE", "DO", "ASSERT"]
+
+# tables for the parser, so it doesn't have to inspect the operators for every line
+# number of arguments of every operator, None for variadic operators
+OPERATOR_ARITIES: dict[str, int | None] = {
+    name: None if any(p.kind == p.VAR_POSITIONAL for p in params.values()) else len(params)
+    for name, op in OPERATORS.items()
+    for params in [inspect.signature(op.f).parameters]
+}
+# variables must not start with any of these, str.startswith checks all of them at once
+RESERVED_PREFIXES = (*KEYWORDS, *OPERATORS, *"+-0123456789")
+
+
+class LoopSummary[T: (str, int)](NamedTuple):
+    """Closed form of a loop of the form
+
+        WHILE counter guard bound DO
+            var := var + delta  (for all variables in updates)
+        END WHILE
+
+    where bound doesn't change in the loop. T is str for variables, or int for slots."""
+
+    guard: Operator  # one of <, <=, >, >=, !=
+    counter: T
+    bound: T | int
+    updates: tuple[tuple[T, int], ...]  # the variables changed in the loop and their change per iteration
+
+    def counter_delta(self) -> int:
+        return sum(delta for var, delta in self.updates if var == self.counter)
+
+    def iterations(self, counter_value: int, bound_value: int) -> int | None:
+        """Returns how often the loop body is executed, None if the loop never terminates."""
+
+        delta = self.counter_delta()
+        guard = typing.cast(Callable[[int, int], int], self.guard.f)  # the guards are infix operators
+        if not guard(counter_value, bound_value):
+            return 0
+        distance = bound_value - counter_value
+        match self.guard.name:
+            case "<" if delta > 0:
+                return -(-distance // delta)
+            case "<=" if delta > 0:
+                return distance // delta + 1
+            case ">" if delta < 0:
+                return -(-distance // delta)
+            case ">=" if delta < 0:
+                return distance // delta + 1
+            case "!=" if delta != 0 and distance % delta == 0 and distance // delta > 0:
+                return distance // delta
+        return None
 
 
 class Instruction(NamedTuple):
     instruction_type: InstructionType
-    args: tuple[str | int | Operator, ...]
+    args: tuple[str | int | Operator | LoopSummary[str], ...]
 
 
-def parse_program(source_code: Iterable[str]) -> Iterator[Instruction]:
+def parse_program(source_code: Iterable[str], line_numbers: list[int] | None = None) -> Iterator[Instruction]:
     """Lazily parses the the source_code line by line.
 
     If an if statement is encountered, the instructions are stored in a buffer,
-    so the jump distance can be determined"""
+    so the jump distance can be determined. If line_numbers is given, the source
+    line (starting at 1) of every instruction is appended to it."""
 
+    num_yielded = 0
     if_else_stack = []
     while_stack = []
     program_buffer = []
 
-    def is_int(arg):
-        try:
-            int(arg)
-            return True
-        except ValueError:
-            return False
-
-    def is_valid_var(var: str) -> bool:
-        return not any(var.startswith(s) for s in it.chain(KEYWORDS, OPERATORS, "+-01233456789"))
-
-    def are_valid_args(args) -> bool:
-        return all(is_int(arg) or is_valid_var(arg) for arg in args)
-
-    def is_valid(var: str = "_", op_name: str = "ID", args: Sequence[str] = ()) -> bool:
-        return is_valid_var(var) and op_name in OPERATORS and are_valid_args(args)
-
-    def to_int(valid_args: tuple[str, ...]) -> Iterator[int | str]:
-        for arg in valid_args:
-            try:
-                yield int(arg)
-            except ValueError:
-                yield arg
+    def parse_args(args: Iterable[str]) -> tuple[int | str, ...] | None:
+        # converts the args to ints or variables in a single pass, None if one is invalid
+        parsed = []
+        for arg in args:
+            # int() also accepts non-ascii digits
+            if arg.startswith(RESERVED_PREFIXES) or arg[0].isdecimal():
+                try:
+                    parsed.append(int(arg))
+                except ValueError:
+                    return None
+            else:
+                parsed.append(arg)
+        return tuple(parsed)
+
+    def checked(args: Iterable[str], op_name: str = "ID", var: str = "_") -> tuple[int | str, ...] | None:
+        if var.startswith(RESERVED_PREFIXES) or op_name not in OPERATORS:
+            return None
+        return parse_args(args)
 
     def check_signature(op_name: str, num_args: int, is_infix: bool) -> None:
         if is_infix != OPERATORS[op_name].is_infix:
             raise ValueError(
                 f'In "{line}":\n{op_name} is a {"in" if OPERATORS[op_name].is_infix else "pre"}fix operator.'
             )
-        sig = inspect.signature(OPERATORS[op_name].f)
-        try:
-            sig.bind(*(0,) * num_args)
-        except TypeError:
-            raise ValueError(f'In "{line}":\n{op_name} takes {len(sig.parameters)} arguments.') from TypeError
+        arity = OPERATOR_ARITIES[op_name]
+        if arity is not None and arity != num_args:
+            raise ValueError(f'In "{line}":\n{op_name} takes {arity} arguments.')
 
-    def parse_set_var(var: str, op_name: str, *args: str, is_infix: bool = False):
+    def parse_set_var(var: str, op_name: str, args: tuple[int | str, ...], is_infix: bool = False):
         check_signature(op_name, len(args), is_infix)
-        instruction = Instruction(InstructionType.SET_VAR, (var, OPERATORS[op_name], *to_int(args)))
+        instruction = Instruction(InstructionType.SET_VAR, (var, OPERATORS[op_name], *args))
         program_buffer.append(instruction)
 
-    def parse_if(op_name: str, *args: str, is_infix: bool = False):
+    def parse_assert(op_name: str, args: tuple[int | str, ...], is_infix: bool = False):
+        check_signature(op_name, len(args), is_infix)
+        program_buffer.append(Instruction(InstructionType.ASSERT, (OPERATORS[op_name], *args)))
+
+    def parse_if(op_name: str, args: tuple[int | str, ...], is_infix: bool = False):
         check_signature(op_name, len(args), is_infix)
         if_else_stack.append(len(program_buffer))
-        instruction = Instruction(
-            InstructionType.JUMP_IF_NOT, (OPERATORS[op_name], *to_int(args), "placeholder")
-        )
+        instruction = Instruction(InstructionType.JUMP_IF_NOT, (OPERATORS[op_name], *args, "placeholder"))
         program_buffer.append(instruction)
 
     def parse_else():
@@ -160,12 +225,10 @@ def parse_program(source_code: Iterable[str]) -> Iterator[Instruction]:
         )
         # we dont need an instruction in the program for this, as it does nothing
 
-    def parse_while(op_name: str, *args: str, is_infix: bool = False):
+    def parse_while(op_name: str, args: tuple[int | str, ...], is_infix: bool = False):
         check_signature(op_name, len(args), is_infix)
         while_stack.append(len(program_buffer))
-        instruction = Instruction(
-            InstructionType.JUMP_IF_NOT, (OPERATORS[op_name], *to_int(args), "placeholder")
-        )
+        instruction = Instruction(InstructionType.JUMP_IF_NOT, (OPERATORS[op_name], *args, "placeholder"))
         program_buffer.append(instruction)
 
     def parse_end_while():
@@ -176,43 +239,55 @@ def parse_program(source_code: Iterable[str]) -> Iterator[Instruction]:
         )
         program_buffer.append(Instruction(InstructionType.JUMP, (while_position - len(program_buffer),)))
 
-    for line in source_code:
+    for line_number, line in enumerate(source_code, 1):
         tokens = line.strip().split()
         match tokens:
-            case [var, ":=", arg] if is_valid(var, args=(arg,)):
-                parse_set_var(var, "ID", arg, is_infix=False)
-            case [var, ":=", arg_1, op_name, arg_2] if is_valid(var, op_name, (arg_1, arg_2)):
-                parse_set_var(var, op_name, arg_1, arg_2, is_infix=True)
-            case [var, ":=", op_name, *args] if is_valid(var, op_name, args):
-                parse_set_var(var, op_name, *args)
-            case ["IF", arg, "THEN"] if is_valid(args=(arg,)):
-                parse_if("ID", arg)
-            case ["IF", arg_1, op_name, arg_2, "THEN"] if is_valid(op_name=op_name, args=(arg_1, arg_2)):
-                parse_if(op_name, arg_1, arg_2, is_infix=True)
-            case ["IF", op_name, *args, "THEN"] if is_valid(op_name=op_name, args=args):
-                parse_if(op_name, *args)
+            # the guards also convert the arguments, args is None if they are invalid
+            case [var, ":=", arg] if (args := checked((arg,), "ID", var)) is not None:
+                parse_set_var(var, "ID", args, is_infix=False)
+            case [var, ":=", a, op_name, b] if (args := checked((a, b), op_name, var)) is not None:
+                parse_set_var(var, op_name, args, is_infix=True)
+            case [var, ":=", op_name, *rest] if (args := checked(rest, op_name, var)) is not None:
+                parse_set_var(var, op_name, args)
+            case ["IF", arg, "THEN"] if (args := checked((arg,))) is not None:
+                parse_if("ID", args)
+            case ["IF", a, op_name, b, "THEN"] if (args := checked((a, b), op_name)) is not None:
+                parse_if(op_name, args, is_infix=True)
+            case ["IF", op_name, *rest, "THEN"] if (args := checked(rest, op_name)) is not None:
+                parse_if(op_name, args)
             case ["ELSE"]:
                 parse_else()
             case ["END", "IF"]:
                 parse_end_if()
-            case ["WHILE", arg, "DO"] if is_valid(args=(arg,)):
-                parse_while("ID", arg)
-            case ["WHILE", arg_1, op_name, arg_2, "DO"] if is_valid(op_name=op_name, args=(arg_1, arg_2)):
-                parse_while(op_name, arg_1, arg_2, is_infix=True)
-            case ["WHILE", op_name, *args, "DO"] if is_valid(op_name=op_name, args=args):
-                parse_while(op_name, *args)
+            case ["WHILE", arg, "DO"] if (args := checked((arg,))) is not None:
+                parse_while("ID", args)
+            case ["WHILE", a, op_name, b, "DO"] if (args := checked((a, b), op_name)) is not None:
+                parse_while(op_name, args, is_infix=True)
+            case ["WHILE", op_name, *rest, "DO"] if (args := checked(rest, op_name)) is not None:
+                parse_while(op_name, args)
             case ["END", "WHILE"]:
                 parse_end_while()
-            case ["INPUT", var] if is_valid(var):
+            case ["INPUT", var] if not var.startswith(RESERVED_PREFIXES):
                 program_buffer.append(Instruction(InstructionType.INPUT, (var,)))
-            case ["OUTPUT", arg] if is_valid(args=(arg,)):
-                program_buffer.append(Instruction(InstructionType.OUTPUT, (arg,)))
+            case ["OUTPUT", arg] if (args := parse_args((arg,))) is not None:
+                program_buffer.append(Instruction(InstructionType.OUTPUT, args))
+            case ["ASSERT", arg] if (args := checked((arg,))) is not None:
+                parse_assert("ID", args)
+            case ["ASSERT", a, op_name, b] if (args := checked((a, b), op_name)) is not None:
+                parse_assert(op_name, args, is_infix=True)
+            case ["ASSERT", op_name, *rest] if (args := checked(rest, op_name)) is not None:
+                parse_assert(op_name, args)
             case ["//", *_] | []:
                 pass  # comments and empty lines
             case _:
                 raise ValueError(f'Could not parse line "{line}"')
 
+        # every line creates at most one instruction
+        if line_numbers is not None and len(line_numbers) < num_yielded + len(program_buffer):
+            line_numbers.append(line_number)
+
         if not if_else_stack and not while_stack:
+            num_yielded += len(program_buffer)
             yield from program_buffer
             program_buffer.clear()
 
@@ -222,13 +297,102 @@ def parse_program(source_code: Iterable[str]) -> Iterator[Instruction]:
         raise ValueError(f'WHILE statement "{program_buffer[while_stack[-1]]}" was not closed')
 
 
+class ResolvedInstruction(NamedTuple):
+    # same as Instruction, but variables and constants are replaced by slot indices
+    instruction_type: InstructionType
+    args: tuple[int | Operator | LoopSummary[int], ...]
+
+
+@dataclasses.dataclass(slots=True)
+class SlotTable:
+    """Assigns a register index (slot) to every variable and constant of a program.
+
+    Constants get their own slot that is initialized with their value, so reading an
+    operand is always a plain index into the register file. Once no instruction that
+    uses them can run anymore, release_constants frees the slots of the constants for
+    new constants, so a streamed program does not need a slot for every constant it has."""
+
+    operands: list[str | int] = dataclasses.field(default_factory=list)  # the operand of each slot
+    indices: dict[str | int, int] = dataclasses.field(default_factory=dict)
+    constants: list[int] = dataclasses.field(default_factory=list)  # constant slots since the last release
+    free: list[int] = dataclasses.field(default_factory=list)  # released slots
+    reused: list[int] = dataclasses.field(default_factory=list)  # released slots given to a new constant
+
+    def slot(self, operand: str | int) -> int:
+        index = self.indices.get(operand)
+        if index is None:
+            if isinstance(operand, str) or not self.free:
+                index = len(self.operands)
+                self.operands.append(operand)
+            else:
+                index = self.free.pop()
+                self.operands[index] = operand
+                self.reused.append(index)
+            self.indices[operand] = index
+            if not isinstance(operand, str):
+                self.constants.append(index)
+        return index
+
+    def release_constants(self):
+        for index in self.constants:
+            del self.indices[self.operands[index]]
+        self.free.extend(self.constants)
+        self.constants.clear()
+
+    def is_constant(self, slot: int) -> bool:
+        return not isinstance(self.operands[slot], str)
+
+    def initial_registers(self, start: int = 0) -> list[int]:
+        return [0 if isinstance(operand, str) else operand for operand in self.operands[start:]]
+
+
+def resolve_program(program: Iterable[Instruction], slots: SlotTable) -> Iterator[ResolvedInstruction]:
+    """Lazily replaces the variables and constants in the instructions with slots."""
+
+    for instruction in program:
+        match instruction:
+            case (InstructionType.SET_VAR, (str(x), Operator() as op, *args)):
+                resolved_args = (slots.slot(x), op, *map(slots.slot, typing.cast(list[str | int], args)))
+                yield ResolvedInstruction(InstructionType.SET_VAR, resolved_args)
+            case (InstructionType.JUMP_IF_NOT, (Operator() as op, *args, int(jump_distance))):
+                resolved_args = (op, *map(slots.slot, typing.cast(list[str | int], args)), jump_distance)
+                yield ResolvedInstruction(InstructionType.JUMP_IF_NOT, resolved_args)
+            case (InstructionType.JUMP, (int(),)):
+                yield ResolvedInstruction(*instruction)
+            case (InstructionType.INPUT | InstructionType.OUTPUT as instruction_type, (str() | int() as x,)):
+                yield ResolvedInstruction(instruction_type, (slots.slot(x),))
+            case (InstructionType.ASSERT, (Operator() as op, *args)):
+                yield ResolvedInstruction(
+                    InstructionType.ASSERT, (op, *map(slots.slot, typing.cast(list[str | int], args)))
+                )
+            case (InstructionType.ACCELERATED_LOOP, (LoopSummary() as summary, int(exit_distance))):
+                resolved_summary = LoopSummary[int](
+                    summary.guard,
+                    slots.slot(summary.counter),
+                    slots.slot(summary.bound),
+                    tuple((slots.slot(var), delta) for var, delta in summary.updates),
+                )
+                yield ResolvedInstruction(InstructionType.ACCELERATED_LOOP, (resolved_summary, exit_distance))
+            case _:
+                raise ValueError(f"Invalid instruction: {instruction}")
+
+
 def run_program(
-    program: Iterable[Instruction], input_function=input, output_function=print
+    program: Iterable[Instruction],
+    input_function=input,
+    output_function=print,
+    profile: "Profile | None" = None,
 ) -> dict[str, int]:
-    """Executes instructions provided by an iterable."""
+    """Executes instructions provided by an iterable, returns the variables that were assigned.
+
+    If a profile is given, the whole program is compiled (see compiler.py) and the
+    executed instructions are counted in profile. Otherwise the profiler costs nothing."""
+
+    if profile is not None:
+        import compiler
 
-    def get_value(arg) -> int:
-        return variables[arg] if isinstance(arg, str) else arg
+        variables = compiler.compile_program(program).run(input_function, output_function, profile)
+        return collections.defaultdict(int, variables)
 
     def get_input(var: str):
         while True:
@@ -237,36 +401,104 @@ def run_program(
             except ValueError:
                 output_function("Invalid input.")
 
-    variables: dict[str, int] = collections.defaultdict(int)
+    slots = SlotTable()
+    registers: list[int] = []
+    written = bytearray()  # written[i] is set once slot i was assigned
+
+    def fetch(program_it: Iterator[ResolvedInstruction]) -> ResolvedInstruction | None:
+        instruction = next(program_it, None)
+        # new slots only appear in new instructions, so this is the only place where
+        # the register file needs to grow
+        if len(registers) < len(slots.operands):
+            written.extend(bytes(len(slots.operands) - len(registers)))
+            registers.extend(slots.initial_registers(len(registers)))
+        for slot in slots.reused:
+            registers[slot] = typing.cast(int, slots.operands[slot])
+        slots.reused.clear()
+        return instruction
+
+    def jump_reach(instruction: ResolvedInstruction, location: int) -> int:
+        # the last argument of the jump instructions is the distance of the (forward) jump
+        if instruction.instruction_type in (InstructionType.JUMP_IF_NOT, InstructionType.ACCELERATED_LOOP):
+            return location + typing.cast(int, instruction.args[-1])
+        return location
+
+    def get_variables() -> dict[str, int]:
+        variables = collections.defaultdict(int)
+        for i, operand in enumerate(slots.operands):
+            if written[i]:
+                variables[typing.cast(str, operand)] = registers[i]
+        return variables
+
+    # We store the program in a buffer in order to be able to jump back. Programs from
+    # parse_program only jump back to the header of a WHILE loop they are in, so once
+    # the program counter passed all forward jumps of the buffered instructions, none
+    # of them can be reached anymore and the buffer is cleared, together with the slots
+    # of its constants. This keeps the memory flat for long streamed programs. Sequences are kept completely, as they can jump
+    # anywhere (e.g. after jump threading) and are in memory anyway.
+    # program_counter is relative to the start of the buffer.
+    buffer_start = 0
+    reach = math.inf if isinstance(program, Sequence) else 0  # the furthest forward jump target
     program_counter = 0
-    program_it = iter(program)
-    # we store the program in a buffer in order to be able to jump back
-    # an improvement would be to only do this when we are in a while statement
-    program_buffer = [next(program_it)]
+    program_it = resolve_program(program, slots)
+    first_instruction = fetch(program_it)
+    if first_instruction is None:
+        return get_variables()
+    program_buffer = [first_instruction]
+    reach = max(reach, jump_reach(first_instruction, 0))
+
+    def dropped_error() -> ValueError:
+        return ValueError(f"Jump to instruction {buffer_start + program_counter}, which was already dropped")
 
     while True:
         instruction = program_buffer[program_counter]
         match instruction:
-            case (InstructionType.SET_VAR, (str(x), Operator(f=op), *args)):
-                variables[x] = op(*map(get_value, args))
+            case (InstructionType.SET_VAR, (int(x), Operator(f=op), *args)):
+                registers[x] = op(*[registers[arg] for arg in typing.cast(list[int], args)])
+                written[x] = 1
             case (InstructionType.JUMP_IF_NOT, (Operator(f=op), *args, int(jump_distance))):
-                if not op(*map(get_value, args)):
+                if not op(*[registers[arg] for arg in typing.cast(list[int], args)]):
                     program_counter += jump_distance - 1
+                    if program_counter < -1:
+                        raise dropped_error()
             case (InstructionType.JUMP, (int(jump_distance),)):
                 program_counter += jump_distance - 1
-            case (InstructionType.INPUT, (str(x),)):
-                variables[x] = get_input(x)
-            case (InstructionType.OUTPUT, (x,)):
-                output_function(str(get_value(x)))
+                if program_counter < -1:
+                    raise dropped_error()
+            case (InstructionType.INPUT, (int(x),)):
+                registers[x] = get_input(typing.cast(str, slots.operands[x]))
+                written[x] = 1
+            case (InstructionType.OUTPUT, (int(x),)):
+                output_function(str(registers[x]))
+            case (InstructionType.ASSERT, (Operator(f=op), *args)):
+                if not op(*[registers[arg] for arg in typing.cast(list[int], args)]):
+                    raise AssertionError(f"Assertion at instruction {buffer_start + program_counter} failed")
+            case (InstructionType.ACCELERATED_LOOP, (LoopSummary() as summary, int(exit_distance))):
+                iterations = summary.iterations(registers[summary.counter], registers[summary.bound])
+                if iterations is None:
+                    program_counter -= 1  # the loop never terminates, so we stay here
+                else:
+                    for x, delta in summary.updates if iterations else ():
+                        registers[x] += iterations * delta
+                        written[x] = 1
+                    program_counter += exit_distance - 1
             case _:
                 raise ValueError(f"Invalid instruction: {instruction}")
 
         program_counter += 1
         while program_counter >= len(program_buffer):
-            next_instruction = next(program_it, None)
+            buffer_end = buffer_start + len(program_buffer)
+            if reach <= buffer_end:
+                # no jump can reach the buffered instructions anymore
+                program_counter -= len(program_buffer)
+                buffer_start = buffer_end
+                program_buffer.clear()
+                slots.release_constants()
+            next_instruction = fetch(program_it)
             if next_instruction is None:
-                return variables
+                return get_variables()
             program_buffer.append(next_instruction)
+            reach = max(reach, jump_reach(next_instruction, buffer_end))
 
 
 def run_interactive_shell(
@@ -296,7 +528,21 @@ def main():
         help="Input file containing the source code to be interpreted",
     )
     parser.add_argument("-i", "--interactive", action="store_true", help="Run in interactive shell mode")
+    parser.add_argument(
+        "-O", "--optimize", action="store_true", help="Optimize the program before running it"
+    )
+    parser.add_argument(
+        "--accelerate", action="store_true", help="Compute simple counting loops in a single step"
+    )
+    parser.add_argument("--cache", action="store_true", help="Cache the parsed and optimized program on disk")
+    parser.add_argument(
+        "--profile", action="store_true", help="Count the executed instructions and print a report to stderr"
+    )
     args = parser.parse_args()
+    if (args.optimize or args.accelerate or args.cache) and args.interactive:
+        parser.error("the interactive shell can't be optimized")
+    if args.profile and args.interactive:
+        parser.error("the interactive shell can't be profiled")
 
     source_code = None
     if args.inputfile:
@@ -305,11 +551,46 @@ def main():
 
     if args.interactive:
         run_interactive_shell(source_code)
+    elif source_code and (args.optimize or args.accelerate or args.cache):
+        # imported here, so running a program without these options starts faster
+        import optimizer
+        import acceleration
+        import program_cache
+
+        passes = [
+            *(optimizer.DEFAULT_PASSES if args.optimize else ()),
+            *([acceleration.accelerate_loops] if args.accelerate else ()),
+        ]
+        cache = program_cache.ProgramCache() if args.cache else None
+        program = program_cache.load_program(source_code, passes, cache)
+        if args.profile:
+            # the optimized instructions don't correspond to source lines anymore
+            run_profiled(program, None, source_code)
+        else:
+            run_program(program)
+    elif source_code and args.profile:
+        line_numbers: list[int] = []
+        run_profiled(list(parse_program(source_code, line_numbers)), line_numbers, source_code)
     elif source_code:
         run_program(parse_program(source_code))
     else:
         parser.print_help()
 
 
+def run_profiled(program: list[Instruction], line_numbers: list[int] | None, source_code: list[str]):
+    import profiler
+
+    profile = profiler.Profile()
+    try:
+        run_program(program, profile=profile)
+    finally:
+        # also report where a program that crashed or was interrupted spent its time
+        profiler.print_report(profile, program, line_numbers, source_code)
+
+
 if __name__ == "__main__":
-    main()
+    # other modules (e.g. the optimizer) import while_parsing, so we run main from the imported
+    # module to make sure that everything uses the same InstructionType
+    import while_parsing
+
+    while_parsing.main()
@@ -0,0 +1,10 @@
+# Helpers shared by the tests, import them with "from conftest import ..."
+import pathlib
+
+from while_parsing import Instruction, parse_program
+
+PROGRAM_DIR = pathlib.Path(__file__).parent.parent / "while_programs"
+
+
+def load(name: str) -> list[Instruction]:
+    return list(parse_program((PROGRAM_DIR / name).read_text().splitlines()))
@@ -0,0 +1,99 @@
+from hypothesis import given, strategies as st
+import operator
+import z3
+from acceleration import *
+from compiler import compile_program
+from transition_system import State, VariableSet, get_next_states
+from while_parsing import parse_program, run_program, LoopSummary
+import transition_relation
+import smt
+
+
+def accelerate(source: list[str]) -> tuple[list[Instruction], list[Instruction]]:
+    program = list(parse_program(source))
+    accelerated, _ = accelerate_loops(program)
+    return program, accelerated
+
+
+def test_summarize_loop():
+    _, accelerated = accelerate(["INPUT x", "WHILE 10 > a DO", "a := a + 2", "b := 3 + b", "END WHILE"])
+    assert accelerated[1] == Instruction(
+        InstructionType.ACCELERATED_LOOP, (LoopSummary(OPERATORS["<"], "a", 10, (("a", 2), ("b", 3))), 1)
+    )
+    # the bound changes in the loop
+    _, accelerated = accelerate(["WHILE a < b DO", "a := a + 2", "b := b + 1", "END WHILE"])
+    assert accelerated[0].instruction_type == InstructionType.JUMP_IF_NOT
+    # the body is not affine
+    _, accelerated = accelerate(["WHILE a < 10 DO", "a := a * 2", "END WHILE"])
+    assert accelerated[0].instruction_type == InstructionType.JUMP_IF_NOT
+
+
+@given(
+    st.sampled_from(["<", "<=", ">", ">=", "!="]),
+    st.integers(-20, 20),
+    st.integers(-20, 20),
+    st.integers(-3, 3).filter(lambda n: n != 0),
+)
+def test_iterations(op_name: str, counter: int, bound: int, delta: int):
+    summary = LoopSummary(OPERATORS[op_name], "a", "x", (("a", delta),))
+    iterations = summary.iterations(counter, bound)
+    comparisons = {
+        "<": operator.lt,
+        "<=": operator.le,
+        ">": operator.gt,
+        ">=": operator.ge,
+        "!=": operator.ne,
+    }
+    expected = 0
+    while comparisons[op_name](counter, bound) and expected <= 100:
+        counter += delta
+        expected += 1
+    assert iterations == (None if expected > 100 else expected)
+
+
+@given(st.integers(-50, 50), st.integers(-50, 50))
+def test_run_accelerated(x: int, y: int):
+    source = ["INPUT x", "INPUT y", "WHILE a < x DO", "a := a + 1", "WHILE y DO", "y := y - 1", "END WHILE"]
+    source += ["s := s + 3", "END WHILE", "OUTPUT s"]
+    program, accelerated = accelerate(source)
+    if y < 0 and x > 0:
+        return  # the inner loop never terminates
+
+    def run(run_function, program):
+        outputs = []
+        input_it = iter([str(x), str(y)])
+        variables = run_function(program, lambda _: next(input_it), outputs.append)
+        return variables, outputs
+
+    expected = run(run_program, program)
+    assert run(run_program, accelerated) == expected
+    assert run(lambda p, i, o: compile_program(p).run(i, o), accelerated) == expected
+
+
+def test_unroll_accelerated():
+    _, program = accelerate(["WHILE a < x DO", "a := a + 2", "b := b + 1", "END WHILE", "OUTPUT b"])
+    (state,) = get_next_states(program, State(0, VariableSet(_DATA={"x": 7})))
+    assert state == State(1, VariableSet(_DATA={"x": 7, "a": 8, "b": 4}))
+    (state,) = get_next_states(program, State(0, VariableSet(_DATA={"x": None})))
+    assert state == State(1, VariableSet(_DATA={"x": None, "a": None, "b": None}))
+    # never terminates
+    _, program = accelerate(["WHILE a < x DO", "b := b + 1", "END WHILE"])
+    state = State(0, VariableSet(_DATA={"x": 1}))
+    assert get_next_states(program, state) == (state,)
+
+
+def test_smt_accelerated():
+    _, program = accelerate(["WHILE a < x DO", "a := a + 2", "b := b + 1", "END WHILE", "OUTPUT b"])
+    T = transition_relation.get_transition_relation(program, smt.Z3Int, smt.get_operator_restriction)
+    state_0 = transition_relation.StateVariable.init("0", smt.Z3Int.create_variable)
+    state_1 = transition_relation.StateVariable.init("1", smt.Z3Int.create_variable)
+    solver = z3.Solver()
+    solver.add(T(0, 1), state_0.location == 0)
+    for name, variable in state_0.variables.items():
+        solver.add(variable.is_known, variable.value == {"x": 7}.get(name, 0))
+    assert solver.check() == z3.sat
+    model = solver.model()
+    assert smt.Z3Int.evaluate(model, state_1.location) == 1
+    assert [smt.Z3Int.evaluate(model, state_1.variables[var].value) for var in "xab"] == [7, 8, 4]
+    solver.add(state_1.variables["a"].value != 8)
+    assert solver.check() == z3.unsat
@@ -0,0 +1,67 @@
+from hypothesis import given, strategies as st
+import numpy as np
+import pytest
+from batch import *
+from while_parsing import parse_program, run_program
+from conftest import load
+
+
+def run_single(program, row):
+    outputs = []
+    input_it = iter(map(str, row))
+    variables = run_program(program, lambda _: next(input_it), outputs.append)
+    return variables, outputs
+
+
+@given(st.lists(st.tuples(st.integers(-50, 50), st.integers(0, 8)), min_size=1, max_size=20))
+def test_matches_run_program(rows: list[tuple[int, int]]):
+    source = """
+    INPUT x
+    INPUT n
+    IF x < 0 THEN
+        x := -- x
+    END IF
+    WHILE i < n DO
+        s := s + x
+        OUTPUT s
+        i := i + 1
+    END WHILE
+    q := s / 7
+    r := s % 7
+    """
+    program = list(parse_program(source.splitlines()))
+    result = run_batched(program, rows)
+    for lane, row in enumerate(rows):
+        variables, outputs = run_single(program, row)
+        assert result.lane_outputs(lane) == list(map(int, outputs))
+        for var, values in result.variables.items():
+            assert values[lane] == variables.get(var, 0)
+
+
+def test_all_lane_outputs():
+    program = load("prime_factors.while")
+    rows = [[n] for n in range(2, 300)]
+    result = run_batched(program, rows)
+    expected = [list(map(int, run_single(program, row)[1])) for row in rows]
+    assert result.all_lane_outputs() == expected
+    assert [result.lane_outputs(lane) for lane in range(len(rows))] == expected
+    assert run_batched(program, [[1], [1]]).all_lane_outputs() == [[], []]
+
+
+def test_prime_factors():
+    program = load("prime_factors.while")
+    result = run_batched(program, [[12], [35], [97]])
+    assert [result.lane_outputs(lane) for lane in range(3)] == [[2, 2, 3], [5, 7], [97]]
+
+
+def test_missing_inputs():
+    program = list(parse_program(["INPUT x", "INPUT y"]))
+    with pytest.raises(ValueError):
+        run_batched(program, np.zeros((3, 1)))
+
+
+def test_assert():
+    program = list(parse_program(["INPUT x", "ASSERT x < 10", "y := x + 1"]))
+    assert run_batched(program, [[1], [9]]).variables["y"].tolist() == [2, 10]
+    with pytest.raises(AssertionError, match=r"rows \[1, 3\]"):
+        run_batched(program, [[1], [10], [2], [11]])
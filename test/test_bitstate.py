@@ -0,0 +1,39 @@
+from bitstate import *
+from transition_system import State, VariableSet, unroll_while_program
+import pytest
+from conftest import load
+
+
+def test_bitstate_set():
+    states = BitstateSet(memory=2**16, hash_functions=4)
+    added = [State(i, VariableSet(_DATA={"x": i * i})) for i in range(1000)]
+    for state in added:
+        states.add(state)
+    assert all(state in states for state in added)
+    assert len(states) == 1000
+    others = [State(i, VariableSet(_DATA={"x": -i - 1})) for i in range(1000)]
+    assert sum(state in states for state in others) < 10
+    assert 0 < states.fill_ratio() < 0.01
+    assert states.estimated_coverage() > 0.9999
+    with pytest.raises(TypeError):
+        list(states)
+    with pytest.raises(ValueError):
+        BitstateSet(memory=0)
+
+
+def test_unroll_bitstate():
+    program = load("3_nested_loops.while")
+    full_ts = unroll_while_program(program, 40)
+
+    store = BitstateStore.with_memory(2**16)
+    ts = unroll_while_program(program, 40, store=store)
+    # with enough memory, no state is skipped
+    assert ts.stats == full_ts.stats
+    assert len(store.visited) == len(full_ts.visited)
+    assert store.transitions.count == len(ts.transitions) == len(full_ts.transitions)
+    assert not list(ts.transitions) and not ts.transitions.items()
+
+    small_store = BitstateStore.with_memory(64)
+    unroll_while_program(program, 40, store=small_store)
+    assert len(small_store.visited) < len(full_ts.visited)
+    assert small_store.visited.estimated_coverage() < 0.99
@@ -0,0 +1,86 @@
+from bmc import *
+from transition_system import get_next_states
+from while_parsing import parse_program
+import reachability
+import pytest
+from conftest import load
+
+ENCODINGS = [(smt.Z3Int, smt.get_operator_restriction), (sat.BitVector, sat.get_operator_restriction)]
+
+
+def assert_valid_trace(program: list, trace: list[State]):
+    assert trace[0] == State(0, VariableSet())
+    for state, successor in zip(trace, trace[1:]):
+        assert successor in get_next_states(program, state)
+    assert reachability.assertion_fails(program)(trace[-1])
+
+
+@pytest.mark.parametrize("encoding", ENCODINGS)
+@pytest.mark.parametrize("incremental, template", [(True, True), (False, True), (True, False)])
+def test_counterexample(encoding, incremental, template):
+    program = load("assert_loop.while")
+    result = check_assertions(program, 20, *encoding, incremental=incremental, template=template)
+    assert result.trace is not None and result.bound == 14
+    assert result.trace[-1] == State(4, VariableSet(_DATA={"a": 12}))
+    assert_valid_trace(program, result.trace)
+    assert len(result.check_times) == 15
+    # the shortest trace, like the one of the breadth first search
+    bfs_result = reachability.find_state(program, reachability.assertion_fails(program))
+    assert bfs_result.trace is not None and len(bfs_result.trace) == len(result.trace)
+
+    assert not check_assertions(program, 13, *encoding, incremental=incremental, template=template).violated
+
+
+@pytest.mark.parametrize("encoding", ENCODINGS)
+def test_assertion_holds(encoding):
+    source = ["WHILE a < 5 DO", "a := a + 1", "END WHILE", "ASSERT a == 5", "b := a + 2", "ASSERT b > a"]
+    result = check_assertions(list(parse_program(source)), 30, *encoding)
+    assert not result.violated and result.bound == 30
+
+
+def test_unknown_values():
+    # x depends on the input, so the assertion may fail
+    program = list(
+        parse_program(["INPUT x", "y := x + 1", "IF y > 3 THEN", "ASSERT 1 < 2", "ASSERT y > 0", "END IF"])
+    )
+    result = check_assertions(program, 10)
+    assert result.trace is not None and result.bound == 4
+    assert result.trace[-1] == State(4, VariableSet(_DATA={"x": None, "y": None}))
+    assert_valid_trace(program, result.trace)
+
+
+def test_no_assertions():
+    with pytest.raises(ValueError):
+        check_assertions(load("abs.while"), 5)
+
+
+def test_cone_of_influence():
+    # y doesn't influence the assertion, so it isn't encoded
+    source = [
+        "INPUT y",
+        "WHILE a < 10 DO",
+        "a := a + 3",
+        "y := y + a",
+        "END WHILE",
+        "ASSERT a == 10",
+        "OUTPUT y",
+    ]
+    program = list(parse_program(source))
+    full = check_assertions(program, 30)
+    cone = check_assertions(program, 30, cone=True)
+    assert full.trace is not None and cone.trace is not None
+    assert full.bound == cone.bound == 18
+    assert [state.location for state in full.trace] == [state.location for state in cone.trace]
+    assert all(state.variables.restrict({"a"}) == state.variables for state in cone.trace)
+    assert_valid_trace(program, full.trace)
+
+
+@pytest.mark.parametrize("encoding", ENCODINGS)
+@pytest.mark.parametrize("location", ["onehot", "binary", "unary"])
+def test_location_encodings(encoding, location):
+    program = load("assert_loop.while")
+    result = check_assertions(program, 20, *encoding, location=location)
+    assert result.trace is not None and result.bound == 14
+    assert result.trace[-1] == State(4, VariableSet(_DATA={"a": 12}))
+    assert_valid_trace(program, result.trace)
+    assert not check_assertions(program, 13, *encoding, location=location).violated
@@ -0,0 +1,74 @@
+from cnf import *
+import itertools as it
+import pathlib
+import pytest
+from conftest import load
+
+
+def solve(path: pathlib.Path) -> list[str]:
+    # solves a DIMACS file with z3 (its variables are called k!1, k!2, ...) and
+    # returns the output like a SAT solver
+    solver = z3.Solver()
+    solver.from_file(str(path))
+    if solver.check() == z3.unsat:
+        return ["s UNSATISFIABLE"]
+    model = solver.model()
+    true_variables = [decl.name().removeprefix("k!") for decl in model.decls() if z3.is_true(model[decl])]
+    return ["s SATISFIABLE", "v " + " ".join(true_variables) + " 0"]
+
+
+def test_tseitin(tmp_path):
+    a, b, c = z3.Bools("a b c")
+    formulas = [
+        z3.Or(z3.And(a, b), z3.Xor(a, c)),
+        z3.Implies(a == b, z3.Not(c)),
+        z3.If(a, b, c) != z3.And(a, z3.BoolVal(True)),
+        z3.And(z3.Or(a, z3.BoolVal(False)), z3.Not(a)),
+        z3.Or(a == a, b),
+    ]
+    for formula, values in it.product(formulas, it.product([False, True], repeat=3)):
+        with DimacsWriter(tmp_path / "formula.cnf") as writer:
+            writer.add(formula)
+            for name, value in zip("abc", values):
+                variable = writer.variables.get(name)
+                if variable is not None:
+                    writer.add_clause([variable if value else -variable])
+        substituted = z3.substitute(formula, *zip((a, b, c), map(z3.BoolVal, values)))
+        expected = z3.is_true(z3.simplify(substituted))
+        assert (read_solution(solve(tmp_path / "formula.cnf")) is not None) == expected
+
+
+@pytest.mark.parametrize("location", ["binary", "onehot", "arithmetic"])
+def test_unrolling(tmp_path, location):
+    program = load("assert_loop.while")
+    path = tmp_path / "assert_loop.cnf"
+    write_unrolling(program, 13, path, location)
+    assert read_solution(solve(path)) is None
+
+    writer = write_unrolling(program, 14, path, location)
+    text = path.read_text()
+    assert f"p cnf {writer.num_variables} {writer.num_clauses}\n" in text
+    assert text.count(" 0\n") == writer.num_clauses
+    variables = read_variable_map(text.splitlines())
+    assert "14_a_value_b0" in variables and any(name.startswith("14_location_") for name in variables)
+
+    solution = read_solution(solve(path))
+    assert solution is not None
+    trace = decode_trace(program, 14, variables, solution, location)
+    assert trace == bmc.check_assertions(program, 14, sat.BitVector, sat.get_operator_restriction).trace
+
+
+def test_clause_template(tmp_path):
+    # renumbering the clauses of the template is the same as converting every step
+    program = load("2_nested_loops.while")
+    relation = transition_relation.get_transition_relation(
+        program, sat.BitVector, sat.get_operator_restriction, template=True
+    )
+    assert isinstance(relation, transition_relation.TemplateRelation)
+    with DimacsWriter(tmp_path / "template.cnf") as template_writer:
+        ClauseTemplate(relation).add_to(template_writer, 3, 4)
+    with DimacsWriter(tmp_path / "step.cnf") as step_writer:
+        step_writer.add(relation(3, 4))
+    assert template_writer.num_clauses == step_writer.num_clauses
+    state_names = {name for name in step_writer.variables if name.startswith(("3_", "4_"))}
+    assert template_writer.variables.keys() == state_names
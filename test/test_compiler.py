@@ -0,0 +1,61 @@
+from hypothesis import given, strategies as st
+import pytest
+from compiler import *
+from while_parsing import parse_program, run_program, OPERATORS
+from conftest import PROGRAM_DIR
+
+
+def run_both(source: list[str], inputs: list[int]):
+    program = list(parse_program(source))
+    interpreter_outputs, compiled_outputs = [], []
+    input_it = iter(map(str, inputs))
+    interpreter_variables = run_program(program, lambda _: next(input_it), interpreter_outputs.append)
+    input_it = iter(map(str, inputs))
+    compiled_variables = compile_program(program).run(lambda _: next(input_it), compiled_outputs.append)
+    return interpreter_variables, compiled_variables, interpreter_outputs, compiled_outputs
+
+
+@pytest.mark.parametrize(
+    "name, inputs",
+    [
+        ("abs.while", [-3]),
+        ("fib.while", [1000]),
+        ("prime_factors.while", [60]),
+        ("2_nested_loops.while", [5, 7]),
+        ("3_nested_loops.while", [3, 2, 4]),
+        ("4_nested_loops.while", [2, 3, 1, 1]),
+    ],
+)
+def test_example_programs(name: str, inputs: list[int]):
+    source = (PROGRAM_DIR / name).read_text().splitlines()
+    interpreter_variables, compiled_variables, interpreter_outputs, compiled_outputs = run_both(
+        source, inputs
+    )
+    assert interpreter_outputs == compiled_outputs
+    assert interpreter_variables == compiled_variables
+
+
+@given(x=..., op_name=st.sampled_from(["<", "+", "*", "--", "NOT", "OR", "SUM"]))
+def test_operators(x: int, op_name: str):
+    if OPERATORS[op_name].is_infix:
+        expression = f"x {op_name} 3"
+    else:
+        expression = f"{op_name} x"
+    source = ["INPUT x", f"y := {expression}", "IF y THEN", "OUTPUT y", "ELSE", "OUTPUT x", "END IF"]
+    interpreter_variables, compiled_variables, interpreter_outputs, compiled_outputs = run_both(source, [x])
+    assert interpreter_outputs == compiled_outputs
+    assert interpreter_variables == compiled_variables
+
+
+def test_invalid_instruction():
+    with pytest.raises(ValueError):
+        compile_program([Instruction(InstructionType.JUMP, ("nowhere",))])
+
+
+def test_assert():
+    program = compile_program(parse_program(["INPUT x", "ASSERT x != 2", "OUTPUT x"]))
+    outputs = []
+    program.run(lambda _: "1", outputs.append)
+    assert outputs == ["1"]
+    with pytest.raises(AssertionError, match="instruction 1"):
+        program.run(lambda _: "2", outputs.append)
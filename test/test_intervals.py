@@ -0,0 +1,38 @@
+from intervals import *
+import math
+
+
+def test_evaluate():
+    values = {"x": None, "y": Interval(2, 5), "z": 3}
+    get = lambda arg: values[arg] if isinstance(arg, str) else arg
+    assert evaluate("+", ["y", "z"], get) == Interval(5, 8)
+    assert evaluate("-", ["z", "y"], get) == Interval(-2, 1)
+    assert evaluate("*", ["x", "x"], get) == Interval(0, math.inf)
+    assert evaluate("*", ["x", "y"], get) is None
+    assert evaluate("<", ["y", 6], get) == 1
+    assert evaluate("<", ["y", 4], get) == Interval(0, 1)
+    assert evaluate("==", ["y", "z"], get) == Interval(0, 1)
+    assert evaluate("%", ["x", "y"], get) == Interval(0, 4)
+    assert evaluate("/", ["x", 2], get) is None
+    assert evaluate("/", ["y", 2], get) == Interval(1, 2)
+    assert evaluate("^", ["y", 2], get) == Interval(4, 25)
+
+
+def test_refine():
+    values = {"x": None, "y": Interval(0, 5)}
+    get = lambda arg: values[arg] if isinstance(arg, str) else arg
+    assert refine("<", ["x", 0], get, True) == {"x": Interval(-math.inf, -1)}
+    assert refine("<", ["x", 0], get, False) == {"x": Interval(0, math.inf)}
+    assert refine("<=", ["x", "y"], get, True) == {"x": Interval(-math.inf, 5), "y": Interval(0, 5)}
+    assert refine(">", ["y", 5], get, True) is None
+    assert refine("!=", ["y", 0], get, True) == {"y": Interval(1, 5)}
+    assert refine("==", ["y", 7], get, True) is None
+    assert refine("NOT", ["y"], get, True) == {"y": 0}
+    assert refine("ID", ["y"], get, True) == {"y": Interval(1, 5)}
+    assert refine("%", ["x", 2], get, True) == {}
+
+
+def test_interval_string():
+    assert str(Interval(-math.inf, 3)) == "[-inf,3]"
+    assert Interval.from_string("[-inf,3]") == Interval(-math.inf, 3)
+    assert Interval.from_string("[-2,inf]") == Interval(-2, math.inf)
@@ -0,0 +1,101 @@
+from hypothesis import given, strategies as st
+import pytest
+from optimizer import *
+from while_parsing import parse_program, run_program, OPERATORS
+from conftest import load
+
+
+def outputs(program, inputs: list[int]) -> list[str]:
+    outputs = []
+    input_it = iter(map(str, inputs))
+    run_program(program, lambda _: next(input_it), outputs.append)
+    return outputs
+
+
+def test_constant_folding():
+    source = ["a := 3", "b := a + 4", "IF b > 5 THEN", "OUTPUT b", "ELSE", "OUTPUT a", "END IF"]
+    program, reports = optimize(parse_program(source))
+    assert program == [Instruction(InstructionType.OUTPUT, (7,))]
+    assert sum(report.removed for report in reports) == 5
+
+
+def test_jump_threading():
+    source = ["INPUT x", "IF x THEN", "IF x > 1 THEN", "OUTPUT 2", "ELSE", "OUTPUT 1", "END IF", "END IF"]
+    program = list(parse_program(source))
+    # the jump at the end of the inner IF goes directly to the end of the program
+    threaded, rewritten = thread_jumps(program)
+    assert rewritten == 0 and len(threaded) == len(program)
+    program.insert(5, Instruction(InstructionType.JUMP, (1,)))
+    threaded, _ = thread_jumps(program)
+    assert len(threaded) == len(program) - 1
+
+
+def test_dead_stores():
+    source = ["INPUT x", "y := x * 2", "z := x / 0", "y := 3", "OUTPUT y"]
+    program, _ = optimize(parse_program(source))
+    # division by zero has to happen at runtime
+    assert program == [
+        Instruction(InstructionType.INPUT, ("x",)),
+        Instruction(InstructionType.SET_VAR, ("z", OPERATORS["/"], "x", 0)),
+        Instruction(InstructionType.OUTPUT, (3,)),
+    ]
+
+
+def test_live_variables():
+    program = list(parse_program(["INPUT x", "WHILE x DO", "x := x - 1", "OUTPUT y", "END WHILE"]))
+    live = live_variables(program)
+    assert live[0] == {"y"}
+    assert live[1] == {"x", "y"}
+    assert live[-1] == frozenset()
+
+
+@pytest.mark.parametrize(
+    "name, input_values",
+    [
+        ("abs.while", st.tuples(st.integers())),
+        ("fib.while", st.tuples(st.integers(-10, 1000))),
+        ("prime_factors.while", st.tuples(st.integers(2, 200))),
+        ("2_nested_loops.while", st.tuples(st.integers(-5, 20), st.integers(-5, 20))),
+    ],
+)
+def test_example_programs(name: str, input_values):
+    program = load(name)
+    optimized, _ = optimize(program)
+
+    @given(input_values)
+    def check(inputs):
+        assert outputs(program, inputs) == outputs(optimized, inputs)
+
+    check()
+
+
+def test_assert():
+    source = ["a := 3", "ASSERT a > 2", "INPUT x", "ASSERT x > a", "ASSERT a == 4"]
+    program, _ = optimize(parse_program(source))
+    # assertions that always hold are removed, the others are kept with the known values
+    assert program == [
+        Instruction(InstructionType.INPUT, ("x",)),
+        Instruction(InstructionType.ASSERT, (OPERATORS[">"], "x", 3)),
+        Instruction(InstructionType.ASSERT, (OPERATORS["=="], 3, 4)),
+    ]
+
+
+def test_cone_of_influence():
+    program = load("abs.while")
+    assert program_variables(program) == {"x", "y"}
+    # y is only written and printed
+    assert cone_of_influence(program) == {"x"}
+    assert cone_of_influence(program, ["y"]) == {"x", "y"}
+
+    source = [
+        "INPUT n",
+        "a := n + 1",
+        "b := a * 2",
+        "c := b",
+        "d := 5",
+        "WHILE c < 10 DO",
+        "c := c + d",
+        "e := c",
+    ]
+    source += ["END WHILE", "ASSERT f", "OUTPUT e"]
+    assert cone_of_influence(parse_program(source)) == {"n", "a", "b", "c", "d", "f"}
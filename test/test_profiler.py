@@ -0,0 +1,45 @@
+import io
+from profiler import *
+from while_parsing import parse_program, run_program
+
+SOURCE = """
+INPUT x
+// count down
+WHILE x > 0 DO
+  x := x - 1
+  IF x % 2 THEN
+    y := y + 1
+  END IF
+END WHILE
+OUTPUT y
+""".splitlines()
+
+
+def test_line_numbers():
+    line_numbers = []
+    program = list(parse_program(SOURCE, line_numbers))
+    assert line_numbers == [2, 4, 5, 6, 7, 9, 10]
+    assert len(line_numbers) == len(program)
+
+
+def test_profile():
+    line_numbers = []
+    program = list(parse_program(SOURCE, line_numbers))
+    profile = Profile()
+    outputs = []
+    variables = run_program(program, lambda _: "5", outputs.append, profile)
+    assert variables == run_program(program, lambda _: "5", lambda _: None)
+    assert outputs == ["2"]
+
+    assert profile.executions == [1, 6, 5, 5, 2, 5, 1]
+    assert profile.steps() == 25
+    assert profile.branches(program) == [BranchProfile(1, 1, 5), BranchProfile(3, 3, 2)]
+    assert profile.loops(program) == [LoopProfile(1, 5, 5, 23)]
+
+    # the counters accumulate over several runs
+    run_program(program, lambda _: "1", lambda _: None, profile)
+    assert profile.executions[1] == 8
+
+    report = io.StringIO()
+    print_report(profile, program, line_numbers, SOURCE, file=report)
+    assert "4  WHILE x > 0 DO" in report.getvalue()
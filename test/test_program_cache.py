@@ -0,0 +1,62 @@
+import os
+import pathlib
+from program_cache import *
+from while_parsing import parse_program, Operator, OPERATORS
+import acceleration
+from conftest import PROGRAM_DIR, load
+
+
+def test_serialize_program():
+    for path in PROGRAM_DIR.glob("*.while"):
+        program = list(parse_program(path.read_text().splitlines()))
+        accelerated, _ = acceleration.accelerate_loops(program)
+        for p in program, accelerated:
+            loaded = deserialize_program(serialize_program(p))
+            assert loaded == p
+            # the operators are rebound, not copied
+            assert all(
+                arg is OPERATORS[arg.name] for _, args in loaded for arg in args if isinstance(arg, Operator)
+            )
+
+
+def test_cache_key():
+    source = ["INPUT x", "OUTPUT x"]
+    assert cache_key(source) == cache_key([line + "\n" for line in source])
+    assert cache_key(source) != cache_key(source[:1])
+    assert cache_key(source) != cache_key(source, optimizer.DEFAULT_PASSES)
+    assert cache_key(source, optimizer.DEFAULT_PASSES) != cache_key(source, optimizer.DEFAULT_PASSES[:1])
+
+
+def test_module_dependencies():
+    # accelerate_loops uses optimizer.remove_instructions, so a change in optimizer.py has to
+    # invalidate the programs cached with only the acceleration pass
+    files = module_dependencies([acceleration])
+    assert {acceleration.__file__, optimizer.__file__, while_parsing.__file__} <= files
+    assert not any("site-packages" in file or file.endswith("pathlib.py") for file in files)
+
+
+def test_load_program(tmp_path):
+    cache = ProgramCache(tmp_path)
+    source = (PROGRAM_DIR / "abs.while").read_text().splitlines()
+    program = load_program(source, optimizer.DEFAULT_PASSES, cache)
+    assert len(list(tmp_path.iterdir())) == 1
+    assert load_program(source, optimizer.DEFAULT_PASSES, cache) == program
+    assert load_program(source, (), cache) == list(parse_program(source))
+    assert len(list(tmp_path.iterdir())) == 2
+
+
+def test_eviction(tmp_path):
+    cache = ProgramCache(tmp_path)
+    program = load("fib.while")
+    cache.put("a", program)
+    cache.put("b", program)
+    os.utime(cache.path("a"), (0, 0))
+    os.utime(cache.path("b"), (1, 1))
+    assert cache.get("a") == program  # a is now the most recently used entry
+    cache.max_size = cache.path("a").stat().st_size
+    cache.put("c", program)
+    assert {path.stem for path in tmp_path.iterdir()} == {"c"}
+    cache.max_size *= 2
+    cache.put("a", program)
+    assert cache.get("b") is None
+    assert cache.get("c") == cache.get("a") == program
@@ -0,0 +1,51 @@
+from reachability import *
+from transition_system import get_next_states, unroll_while_program
+import pytest
+from conftest import load
+
+
+def check_trace(program, trace):
+    assert trace[0] == State(0, VariableSet())
+    for state, successor in zip(trace, trace[1:]):
+        assert successor in get_next_states(program, state)
+
+
+@pytest.mark.parametrize("strategy", STRATEGIES)
+def test_find_state(strategy):
+    program = load("3_nested_loops.while")
+    predicate = lambda state: state.location == 9 and state.variables.get("c") == 2
+    result = find_state(program, predicate, 50, strategy)
+    assert result.trace is not None and predicate(result.trace[-1])
+    check_trace(program, result.trace)
+    if strategy != "dfs":
+        bfs_trace = find_state(program, predicate, 50, "bfs").trace
+        assert bfs_trace is not None and len(result.trace) == len(bfs_trace)
+
+
+@pytest.mark.parametrize("strategy", STRATEGIES)
+def test_find_state_depth_limit(strategy):
+    program = load("3_nested_loops.while")
+    trace = find_state(program, at_location(9)).trace
+    assert trace is not None
+    shortest = len(trace) - 1
+    assert not find_state(program, at_location(9), shortest - 1, strategy).found
+    assert find_state(program, at_location(9), shortest, strategy).found
+    assert find_state(program, at_location(0), 0, strategy).trace == [State(0, VariableSet())]
+
+
+@pytest.mark.parametrize("strategy", STRATEGIES)
+def test_find_state_unreachable(strategy):
+    program = load("abs.while")
+    # all states are visited, then the search stops even without a limit
+    result = find_state(program, has_value("y", 5), strategy=strategy)
+    assert not result.found
+    assert result.expanded >= len(unroll_while_program(program, 20).transitions)
+
+
+def test_find_state_shortest():
+    # the first loop exit is reached earlier than the longest path there
+    program = load("2_nested_loops.while")
+    bfs_trace = find_state(program, at_location(len(program))).trace
+    assert bfs_trace is not None and len(bfs_trace) == 4  # INPUT x, INPUT y, JUMP_IF_NOT
+    with pytest.raises(ValueError):
+        find_state(program, at_location(0), strategy="astar")  # type: ignore[arg-type]
@@ -0,0 +1,60 @@
+from state_store import *
+from transition_system import State, VariableSet, TransitionSystem, unroll_while_program
+from intervals import Interval
+import pytest
+from conftest import load
+
+
+def test_encode_decode():
+    with DiskStateStore(["a", "b", "x"]) as store:
+        for state in [
+            State(0, VariableSet()),
+            State(-1, VariableSet(_DATA={"a": -5, "x": None})),
+            State(12, VariableSet(_DATA={"a": 2**62, "b": None, "x": 1})),
+        ]:
+            assert store.decode(store.encode(state)) == state
+        with pytest.raises(ValueError):
+            store.encode(State(0, VariableSet(_DATA={"a": 2**64})))
+        with pytest.raises(ValueError):
+            store.encode(State(0, VariableSet(_DATA={"a": Interval(0, 5)})))
+        with pytest.raises(ValueError):
+            store.encode(State(0, VariableSet(_DATA={"y": 1})))
+
+
+def test_disk_state_store():
+    store = DiskStateStore(["x"], initial_capacity=1)
+    states = [State(i % 7, VariableSet(_DATA={"x": i})) for i in range(1000)]
+    assert [store.add(state) for state in states] == list(range(1000))
+    assert [store.add(state) for state in states] == list(range(1000))  # after growing the index
+    assert store.state(123) == states[123]
+
+    store.visited.add(states[5])
+    assert states[5] in store.visited and states[6] not in store.visited
+    assert list(store.visited) == [states[5]]
+
+    store.transitions[states[0]] = (states[1], states[2000 % 1000])
+    assert store.transitions[states[0]] == (states[1], states[0])
+    assert states[1] not in store.transitions
+    assert store.transitions[states[1]] == (TransitionSystem.SINK_STATE,)
+    assert len(store.transitions) == 1
+
+    directory = store.directory
+    assert (directory / "states.bin").exists()
+    store.close()
+    assert not directory.exists()
+
+
+@pytest.mark.parametrize("options", [{}, {"project": True}])
+def test_unroll_with_store(options, tmp_path):
+    program = load("3_nested_loops.while")
+    full_ts = unroll_while_program(program, 40, **options)
+    with DiskStateStore(state_variables(program), tmp_path, initial_capacity=4) as store:
+        ts = unroll_while_program(program, 30, store=store, **options).extend(program, 10)
+        assert ts == full_ts
+        assert str(ts) == str(full_ts)
+        assert ts.stats == full_ts.stats
+        assert set(ts.visited) == full_ts.visited
+    assert (tmp_path / "states.bin").exists()
+
+    memory_ts = unroll_while_program(program, 40, store=MemoryStateStore(), **options)
+    assert memory_ts == full_ts
@@ -0,0 +1,107 @@
+from transition_relation import *
+from while_parsing import parse_program
+import acceleration
+import pytest
+import smt
+import sat
+import z3
+from conftest import load
+
+
+def constant_names(formula) -> set[str]:
+    return {constant.decl().name() for constant in TemplateRelation(formula).constants}
+
+
+def identical(formula_a, formula_b) -> bool:
+    return formula_a.eq(formula_b)
+
+
+@pytest.mark.parametrize("name", ["4_nested_loops.while", "abs.while", "fib.while"])
+def test_template(name):
+    program = load(name)
+    T = get_transition_relation(program, smt.Z3Int, smt.get_operator_restriction)
+    template = get_transition_relation(program, smt.Z3Int, smt.get_operator_restriction, template=True)
+    assert isinstance(template, TemplateRelation)
+    # the same variables, z3 shares equal subexpressions, so the formulas are identical
+    assert identical(template(3, 4), T(3, 4))
+    assert identical(template(0, 7), T(0, 7))
+
+
+def test_template_accelerated():
+    program, _ = acceleration.accelerate_loops(load("2_nested_loops.while"))
+    T = get_transition_relation(program, smt.Z3Int, smt.get_operator_restriction)
+    template = get_transition_relation(program, smt.Z3Int, smt.get_operator_restriction, template=True)
+    assert any(name.startswith("5_loop_") for name in constant_names(template(5, 6)))
+    assert identical(template(5, 6), T(5, 6))
+
+
+def test_template_fresh_helpers():
+    program = load("2_nested_loops.while")
+    T = get_transition_relation(program, sat.BitVector, sat.get_operator_restriction, template=True)
+    assert isinstance(T, TemplateRelation)
+    step_0, step_1 = constant_names(T(0, 1)), constant_names(T(1, 2))
+    # the carry bits of the adders are different in every step, only state 1 is shared
+    shared = step_0 & step_1
+    assert shared and all(name.startswith("1_") for name in shared)
+    assert len(step_0) == len(step_1) == len(T.constants)
+
+
+def test_program_variables():
+    program = list(parse_program(["INPUT value", "IF value < 0 THEN", "result := 0 - value", "END IF"]))
+    T = get_transition_relation(program, smt.Z3Int, smt.get_operator_restriction)
+    names = constant_names(T(0, 1))
+    assert "0_value_value" in names and "1_result_is_known" in names
+    assert not any(name.startswith("0_a_") for name in names)
+
+    full = get_transition_relation(program, smt.Z3Int, smt.get_operator_restriction, variables="abcdefg")
+    with pytest.raises(ValueError):
+        full(0, 1)  # value is not part of the state
+
+
+def test_cone_of_influence():
+    program = load("abs.while")
+    T = get_transition_relation(program, smt.Z3Int, smt.get_operator_restriction)
+    cone = get_transition_relation(program, smt.Z3Int, smt.get_operator_restriction, variables=["x"])
+    assert {name for name in constant_names(cone(0, 1)) if name.startswith("1_")} == {
+        "1_location",
+        "1_x_value",
+        "1_x_is_known",
+    }
+    assert len(constant_names(cone(0, 1))) < len(constant_names(T(0, 1)))
+
+
+@pytest.mark.parametrize("name", sat.LOCATION_ENCODINGS)
+def test_location_encodings(name):
+    encoding = sat.get_location_encoding(name, 6, sat.BitVector, sat.get_operator_restriction)
+    variable = encoding.create_variable("0_location")
+    for location in range(6):
+        solver = z3.Solver()
+        solver.add(encoding.valid(variable), encoding.at(variable, location))
+        assert solver.check() == z3.sat
+        assert encoding.evaluate(solver.model(), variable) == location
+        solver.add(z3.Or([encoding.at(variable, other) for other in range(7) if other != location]))
+        assert solver.check() == z3.unsat
+    assert z3.is_false(encoding.at(variable, 6))
+
+
+def test_onehot_valid_linear():
+    # the at-most-one constraint doesn't compare all pairs of bits
+    sizes = []
+    for num_locations in [50, 100]:
+        encoding = sat.OneHotLocation(num_locations)
+        valid = encoding.valid(encoding.create_variable("0_location"))
+        assert isinstance(valid, z3.BoolRef)
+        sizes.append(len(valid.children()))
+    assert sizes[1] < 2.5 * sizes[0]
+
+
+def test_location_literal_targets():
+    # the targets are assigned directly, so there are no adder carry bits
+    program = load("2_nested_loops.while")
+    location_encoding = sat.BinaryLocation(len(program) + 1)
+    T = get_transition_relation(
+        program, sat.BitVector, sat.get_operator_restriction, location_encoding=location_encoding
+    )
+    arithmetic = get_transition_relation(program, sat.BitVector, sat.get_operator_restriction)
+    assert "0_location_b4" not in constant_names(T(0, 1))
+    assert len(constant_names(T(0, 1))) < len(constant_names(arithmetic(0, 1)))
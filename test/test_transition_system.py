@@ -1,5 +1,16 @@
 from transition_system import *
 from while_parsing import parse_program
+from intervals import Interval
+import collections
+import itertools as it
+import math
+import optimizer
+import pathlib
+import pickle
+import pytest
+import subprocess
+import sys
+from conftest import load
 
 
 def test_variable_set():
@@ -14,6 +25,15 @@ def test_variable_set():
     assert hash(s1) == hash(s3)
 
 
+def test_variable_set_interning():
+    s1 = VariableSet(_DATA={"b": 2, "a": None, "c": 0})
+    s2 = VariableSet().set("a", None).set("b", 2)
+    assert s1 is s2
+    assert s1.items() == (("a", None), ("b", 2))
+    assert s1.set("b", 0) is VariableSet(_DATA={"a": None})
+    assert pickle.loads(pickle.dumps(s1)) is s1
+
+
 def test_get_next_states():
     source = """
     y := 1
@@ -108,3 +128,138 @@ def test_unroll_while_program_loop():
         },
     )
     assert ts == expected_ts
+
+
+def test_unroll_stats():
+    # both branches end in the same state, which is only expanded once
+    source = ["INPUT x", "IF x THEN", "y := 1", "ELSE", "y := 1", "END IF", "OUTPUT y"]
+    ts = unroll_while_program(list(parse_program(source)), 10)
+    assert ts.stats.frontier_sizes == [1, 2, 2, 1, 0, 0, 0, 0, 0, 0]
+    assert ts.stats.duplicates == 1
+    assert ts.stats.expanded == 7
+    assert len(ts.transitions) == 6
+
+
+def test_get_next_states_known_condition():
+    program = list(parse_program(["x := 1", "IF x THEN", "y := 1", "END IF"]))
+    (s1,) = get_next_states(program, State(1, VariableSet(_DATA={"x": 1})))
+    assert s1.location == 2
+    (s1,) = get_next_states(program, State(1, VariableSet()))
+    assert s1.location == 3
+
+
+def test_no_z3_import():
+    # the interpreter and the unroller are started a lot, z3 would slow down their startup
+    code = "import sys, while_parsing, transition_system; assert 'z3' not in sys.modules"
+    subprocess.run([sys.executable, "-c", code], cwd=pathlib.Path(__file__).parent.parent / "src", check=True)
+
+
+def test_unroll_parallel(monkeypatch):
+    monkeypatch.setattr("transition_system.MIN_PARALLEL_FRONTIER", 2)
+    program = load("3_nested_loops.while")
+    serial = unroll_while_program(program, 30)
+    parallel = unroll_while_program(program, 30, workers=2)
+    assert parallel == serial
+    assert str(parallel) == str(serial)
+    assert parallel.stats == serial.stats
+
+
+def test_unroll_project_dead_variables():
+    source = """
+    INPUT x
+    IF x < 0 THEN
+        y := 1
+    ELSE
+        y := 2
+    END IF
+    OUTPUT x
+    """
+    program = list(parse_program(source.splitlines()))
+    full_ts = unroll_while_program(program, 10)
+    ts = unroll_while_program(program, 10, project=True)
+    # y is never read, so both branches end in the same state
+    assert len(full_ts.transitions) == 7
+    assert len(ts.transitions) == 6
+    live = optimizer.live_variables(program)
+    for state in ts.transitions:
+        assert {var for var, _ in state.variables.items()} <= live[state.location]
+    assert project_state(live, State(len(program), VariableSet(_DATA={"x": 1}))).variables == VariableSet()
+
+
+def test_unroll_intervals():
+    source = """
+    INPUT x
+    IF x < 0 THEN
+        x := -1 * x
+    END IF
+    IF x < 0 THEN
+        OUTPUT x
+    END IF
+    """
+    program = list(parse_program(source.splitlines()))
+    ts = unroll_while_program(program, 10, use_intervals=True)
+    x_negative = State(2, VariableSet(_DATA={"x": Interval(-math.inf, -1)}))
+    x_not_negative = State.from_string("<3, x=[0,inf]>")
+    assert ts.transitions[State(1, VariableSet(_DATA={"x": None}))] == (x_negative, x_not_negative)
+    # x is [1,inf] after the assignment, that is contained in [0,inf]
+    assert ts.transitions[x_negative] == (x_not_negative,)
+    assert ts.stats.subsumed == 1
+    # the second condition is always false
+    assert ts.transitions[x_not_negative] == (State(5, x_not_negative.variables),)
+    assert len(unroll_while_program(program, 10).transitions) > len(ts.transitions)
+
+
+def test_unroll_subsumption():
+    source = """
+    INPUT x
+    IF x < 0 THEN
+        x := 0
+    END IF
+    WHILE x < 3 DO
+        x := x + 1
+    END WHILE
+    """
+    program = list(parse_program(source.splitlines()))
+    ts = unroll_while_program(program, 20, use_intervals=True)
+    assert ts.stats.subsumed > 0
+    # every successor was either expanded or is at the end of the program
+    for successor in it.chain.from_iterable(ts.transitions.values()):
+        assert successor in ts.transitions or successor.location == len(program)
+
+
+@pytest.mark.parametrize("options", [{}, {"project": True}, {"use_intervals": True}])
+def test_extend(options):
+    program = load("3_nested_loops.while")
+    full_ts = unroll_while_program(program, 40, **options)
+    ts = unroll_while_program(program, 15, **options).extend(program, 25)
+    assert ts == full_ts
+    assert str(ts) == str(full_ts)
+    assert ts.stats == full_ts.stats
+    assert ts.frontier == full_ts.frontier
+
+
+def test_checkpoint(tmp_path):
+    program = load("2_nested_loops.while")
+    path = tmp_path / "checkpoint.pickle"
+    save_checkpoint(path, program, unroll_while_program(program, 20, use_intervals=True))
+    ts = load_checkpoint(path, program)
+    transitions = ts.transitions
+    assert isinstance(transitions, collections.defaultdict)
+    assert transitions[State(-5, VariableSet())] == (TransitionSystem.SINK_STATE,)
+    del transitions[State(-5, VariableSet())]
+    assert ts.extend(program, 20) == unroll_while_program(program, 40, use_intervals=True)
+    with pytest.raises(ValueError):
+        load_checkpoint(path, program[1:])
+
+
+def test_get_next_states_assert():
+    program = list(parse_program(["INPUT x", "ASSERT x < 3", "ASSERT x >= 3"]))
+    state = State(1, VariableSet(_DATA={"x": 2}))
+    assert get_next_states(program, state) == (State(2, state.variables),)
+    assert get_next_states(program, State(2, state.variables)) == ()  # the assertion fails
+    # unknown values may pass, with intervals they are refined
+    unknown = State(1, VariableSet(_DATA={"x": None}))
+    assert get_next_states(program, unknown) == (State(2, unknown.variables),)
+    (refined,) = get_next_states(program, unknown, use_intervals=True)
+    assert refined.variables.get("x") == Interval(-math.inf, 2)
+    assert get_next_states(program, State(2, refined.variables), use_intervals=True) == ()
@@ -0,0 +1,88 @@
+from ts_export import *
+from transition_system import State, VariableSet, unroll_while_program
+from while_parsing import parse_program
+from intervals import Interval
+import io
+import math
+import pytest
+from conftest import load
+
+
+def test_text():
+    ts = unroll_while_program(load("3_nested_loops.while"), 10)
+    buffer = io.StringIO()
+    ts.write(buffer)
+    assert buffer.getvalue() == str(ts)
+    assert str(ts).count(" -> ") == len(ts.transitions)
+
+
+@pytest.mark.parametrize("use_intervals", [False, True])
+def test_jsonl(use_intervals):
+    ts = unroll_while_program(load("3_nested_loops.while"), 30, use_intervals=use_intervals)
+    buffer = io.StringIO()
+    write_jsonl(ts, buffer)
+    assert buffer.getvalue().count("\n") == len(ts.transitions) + 1
+
+    buffer.seek(0)
+    loaded = read_jsonl(buffer)
+    assert loaded == ts
+    assert loaded.visited == ts.visited
+    buffer.seek(0)
+    assert dict(iter_jsonl(buffer)) == ts.transitions
+
+
+def test_jsonl_values():
+    # comparisons assign bools, unknown values and intervals have their own encoding
+    program = list(
+        parse_program(["INPUT x", "y := x < 3", "z := 3 < 5", "IF x < 0 THEN", "OUTPUT x", "END IF"])
+    )
+    for use_intervals in [False, True]:
+        ts = unroll_while_program(program, 10, use_intervals=use_intervals)
+        ts.transitions[State(1, VariableSet(_DATA={"x": Interval(-math.inf, 4)}))] = (
+            State(2, VariableSet(_DATA={"x": Interval(0, math.inf), "y": True})),
+        )
+        buffer = io.StringIO()
+        write_jsonl(ts, buffer)
+        _, transitions = buffer.getvalue().split("\n", 1)
+        assert "true" not in transitions
+        buffer.seek(0)
+        assert read_jsonl(buffer) == ts
+
+
+def test_dot():
+    ts = unroll_while_program(load("3_nested_loops.while"), 20)
+    buffer = io.StringIO()
+    write_dot(ts, buffer)
+    dot = buffer.getvalue()
+    assert dot.startswith("digraph") and dot.endswith("}\n")
+    assert dot.count(" -> ") == sum(map(len, ts.transitions.values()))
+    assert dot.count("[label=") == len(ts.visited)
+
+
+def test_csr(tmp_path):
+    ts = unroll_while_program(load("4_nested_loops.while"), 40)
+    write_csr(ts, tmp_path / "ts.npz")
+    graph = load_csr(tmp_path / "ts.npz")
+    assert graph.num_states == len(ts.visited)
+    assert graph.state(0) == ts.initial_state
+    assert len(graph.targets) == sum(map(len, ts.transitions.values()))
+    for i in range(0, graph.num_states, 97):
+        state = graph.state(i)
+        successors = tuple(map(graph.state, graph.successors(i)))
+        assert successors == (ts.transitions[state] if state in ts.transitions else ())
+    assert graph.to_transition_system() == ts
+
+
+def test_csr_values(tmp_path):
+    ts = unroll_while_program(load("3_nested_loops.while"), 10)
+    ts.transitions[State(5, VariableSet(_DATA={"x": -(2**63)}))] = (State(6, VariableSet(_DATA={"y": None})),)
+    write_csr(ts, tmp_path / "ts.npz")
+    assert load_csr(tmp_path / "ts.npz").to_transition_system().transitions == ts.transitions
+
+    ts = unroll_while_program(load("3_nested_loops.while"), 10, use_intervals=True)
+    with pytest.raises(ValueError):
+        write_csr(ts, tmp_path / "intervals.npz")
+    ts = unroll_while_program(load("3_nested_loops.while"), 10)
+    ts.transitions[State(5, VariableSet(_DATA={"x": 2**63}))] = (State(6, VariableSet()),)
+    with pytest.raises(ValueError):
+        write_csr(ts, tmp_path / "large.npz")
@@ -129,3 +129,82 @@ def test_while():
         )
     )
     assert run_program(program) == {"X": 100}
+
+
+def test_resolve_program():
+    program = parse_program(["INPUT X", "Y := X + 1", "IF Y THEN", "OUTPUT 1", "END IF"])
+    slots = SlotTable()
+    resolved = list(resolve_program(program, slots))
+    assert slots.operands == ["X", "Y", 1]
+    assert [slots.is_constant(i) for i in range(3)] == [False, False, True]
+    assert slots.initial_registers() == [0, 0, 1]
+    assert resolved == [
+        ResolvedInstruction(InstructionType.INPUT, (0,)),
+        ResolvedInstruction(InstructionType.SET_VAR, (1, OPERATORS["+"], 0, 2)),
+        ResolvedInstruction(InstructionType.JUMP_IF_NOT, (ID, 1, 2)),
+        ResolvedInstruction(InstructionType.OUTPUT, (2,)),
+    ]
+
+    # released constant slots are reused for new constants, but not for variables
+    slots.release_constants()
+    assert [slots.slot(operand) for operand in [5, "Z", 1]] == [2, 3, 4]
+    assert slots.reused == [2]
+
+
+def test_run_program_variables():
+    # only assigned variables are part of the result, but reading others still gives 0
+    variables = run_program(parse_program(["Y := X + 1"]))
+    assert variables == {"Y": 1}
+    assert variables["X"] == 0
+    assert run_program([]) == {}
+
+
+def test_parse_errors():
+    with pytest.raises(ValueError, match="NOT takes 1 arguments"):
+        list(parse_program(["x := NOT 1 2"]))
+    with pytest.raises(ValueError, match="NOT is a prefix operator"):
+        list(parse_program(["IF 1 NOT 2 THEN", "END IF"]))
+    with pytest.raises(ValueError, match='Could not parse line "INPUT 1x"'):
+        list(parse_program(["INPUT 1x"]))
+    # variables must not start with an operator or a keyword
+    with pytest.raises(ValueError):
+        list(parse_program(["IDx := 1"]))
+
+
+def test_run_streamed_program():
+    source = ["INPUT n", "a := 1", "WHILE i < n DO", "i := i + 1", "IF i % 2 THEN", "a := a * 3", "ELSE"]
+    source += ["a := a + 1", "END IF", "END WHILE", "OUTPUT a", "WHILE a > 10 DO", "a := a / 2", "END WHILE"]
+    program = list(parse_program(source))
+    outputs = []
+    # a generator is executed with a bounded buffer, the list is kept completely
+    streamed = run_program(parse_program(source), lambda _: "7", outputs.append)
+    assert streamed == run_program(program, lambda _: "7", outputs.append)
+    assert outputs[0] == outputs[1]
+
+    # the slots of the constants of dropped instructions are reused
+    source = [f"x := x + {i}" for i in range(1000)]
+    assert run_program(parse_program(source)) == {"x": sum(range(1000))}
+
+    # a jump back to an instruction that isn't in a WHILE loop can't be streamed
+    program = [
+        Instruction(InstructionType.SET_VAR, ("a", OPERATORS["+"], "a", 1)),
+        Instruction(InstructionType.JUMP_IF_NOT, (OPERATORS["<"], "a", 2, 2)),
+        Instruction(InstructionType.JUMP, (-2,)),
+    ]
+    assert run_program(program) == {"a": 2}
+    with pytest.raises(ValueError, match="already dropped"):
+        run_program(iter(program))
+
+
+def test_assert():
+    program = list(parse_program(["INPUT x", "ASSERT x < 3", "ASSERT NOT x", "ASSERT x"]))
+    assert program[1:] == [
+        Instruction(InstructionType.ASSERT, (OPERATORS["<"], "x", 3)),
+        Instruction(InstructionType.ASSERT, (OPERATORS["NOT"], "x")),
+        Instruction(InstructionType.ASSERT, (OPERATORS["ID"], "x")),
+    ]
+    with pytest.raises(AssertionError, match="instruction 3"):
+        run_program(program, lambda _: "0")
+    with pytest.raises(AssertionError, match="instruction 1"):
+        run_program(program, lambda _: "5")
+    assert run_program(program[:3], lambda _: "0") == {"x": 0}